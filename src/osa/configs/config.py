@@ -12,7 +12,7 @@ from osa.utils.logging import myLogger
 
 log = myLogger(logging.getLogger(__name__))
 
-__all__ = ["read_config", "cfg", "DEFAULT_CFG"]
+__all__ = ["read_config", "LazyConfig", "cfg", "DEFAULT_CFG"]
 
 
 DEFAULT_CFG = files("osa").joinpath("configs/sequencer.cfg")
@@ -28,12 +28,11 @@ def read_config():
         Configuration file cfg
     """
 
-    for idx, arg in enumerate(sys.argv):
-        if arg in ["-c", "--config"]:
+    options.configfile = DEFAULT_CFG
+    for idx, arg in enumerate(sys.argv[1:], start=1):
+        if arg in ["-c", "--config"] and idx + 1 < len(sys.argv):
             options.configfile = sys.argv[idx + 1]
             break
-        else:
-            options.configfile = DEFAULT_CFG
 
     file = options.configfile
 
@@ -49,4 +48,32 @@ def read_config():
     return config
 
 
-cfg = read_config()
+class LazyConfig:
+    """
+    Proxy of the lstosa configuration which reads the config file
+    (given in the command line or the default one) only the first
+    time any of its values is accessed instead of at import time.
+    """
+
+    def __init__(self):
+        self._config = None
+
+    def _load(self) -> configparser.ConfigParser:
+        if self._config is None:
+            self._config = read_config()
+        return self._config
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __getitem__(self, section):
+        return self._load()[section]
+
+    def __contains__(self, section):
+        return section in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+cfg = LazyConfig()
@@ -0,0 +1,407 @@
+"""
+Structured store of the history of the analysis steps.
+
+Every time an analysis stage finishes, besides the line appended to the
+sequence .history file, a record is inserted in a per-night SQLite database
+so that the history of all the runs and subruns can be queried at once.
+The history files remain the reference: each record stores the size of the
+history file once its line was appended, so the database is only used for the
+runs/subruns whose history file still has the size of their last record.
+"""
+
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable
+
+from osa.configs import options
+from osa.utils.logging import myLogger
+
+log = myLogger(logging.getLogger(__name__))
+
+__all__ = [
+    "HISTORY_DB",
+    "history_db_file",
+    "open_history_db",
+    "upgrade_history_db",
+    "record_history",
+    "split_sequence",
+    "parse_history_line",
+    "migrate_history_files",
+    "get_history_entries",
+    "get_failed_twice",
+    "get_history_sizes",
+]
+
+# History database (in the log directory of the analysis directory)
+HISTORY_DB = "history.db"
+
+# Seconds to wait for the database to be unlocked by concurrent jobs
+HISTORY_DB_TIMEOUT = 60
+
+# Version of the schema of the history database (PRAGMA user_version)
+HISTORY_SCHEMA_VERSION = 2
+
+HISTORY_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sequence TEXT NOT NULL,
+        run TEXT NOT NULL,
+        run_id INTEGER,
+        subrun INTEGER,
+        stage TEXT NOT NULL,
+        prod_id TEXT,
+        rc INTEGER NOT NULL,
+        timestamp TEXT,
+        input_file TEXT,
+        config TEXT,
+        wall_time REAL,
+        cpu_time REAL,
+        max_rss INTEGER,
+        failure TEXT,
+        file_size INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS history_sequence ON history (sequence)",
+    "CREATE INDEX IF NOT EXISTS history_run ON history (run_id, subrun)",
+    "CREATE INDEX IF NOT EXISTS history_stage ON history (stage, rc)",
+    """
+    CREATE TABLE IF NOT EXISTS migrated_files (
+        file TEXT PRIMARY KEY,
+        n_lines INTEGER NOT NULL
+    )
+    """,
+]
+
+# Statements upgrading a database of the previous schema version to each
+# version, e.g. {3: ["ALTER TABLE history ADD COLUMN <column> <type>"]}
+HISTORY_MIGRATIONS = {
+    2: ["ALTER TABLE history ADD COLUMN file_size INTEGER"],
+}
+
+
+def history_db_file(analysis_dir: Path = None) -> Path:
+    """Path of the history database of a given (by default, the current) analysis directory."""
+    return Path(analysis_dir or options.directory) / "log" / HISTORY_DB
+
+
+@contextmanager
+def open_history_db(db_file: Path = None):
+    """Open (creating it if needed) the history database as a context manager."""
+    db_file = Path(db_file or history_db_file())
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+
+    connection = sqlite3.connect(db_file, timeout=HISTORY_DB_TIMEOUT)
+    try:
+        upgrade_history_db(connection)
+        yield connection
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def upgrade_history_db(connection: sqlite3.Connection) -> None:
+    """
+    Create the history tables, or upgrade those created by previous versions, unless
+    the database already has the current schema version. It is done once, in a single
+    transaction holding the write lock, so that concurrent jobs do not apply it twice.
+    """
+    if connection.execute("PRAGMA user_version").fetchone()[0] >= HISTORY_SCHEMA_VERSION:
+        return
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        # Check it again once locked, since a concurrent job may have done it meanwhile
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            # New database, created directly with the current schema
+            for statement in HISTORY_SCHEMA:
+                connection.execute(statement)
+            version = HISTORY_SCHEMA_VERSION
+            connection.execute(f"PRAGMA user_version = {HISTORY_SCHEMA_VERSION}")
+        for new_version in range(version + 1, HISTORY_SCHEMA_VERSION + 1):
+            for statement in HISTORY_MIGRATIONS.get(new_version, []):
+                try:
+                    connection.execute(statement)
+                except sqlite3.OperationalError as error:
+                    if "duplicate column name" not in str(error):
+                        raise
+            connection.execute(f"PRAGMA user_version = {new_version}")
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+
+def split_sequence(sequence: str):
+    """
+    Get the run and subrun numbers from the name of a history file
+    (e.g. sequence_LST1_01807.0011 or sequence_LST1_01809).
+    """
+    run_id, _, subrun = str(sequence).rsplit("_", 1)[-1].partition(".")
+    try:
+        return int(run_id), int(subrun) if subrun else None
+    except ValueError:
+        return None, None
+
+
+def record_history(
+    history_file: Path,
+    run: str,
+    prod_id: str,
+    stage: str,
+    return_code: int,
+    input_file=None,
+    config_file=None,
+    timestamp: str = None,
+    wall_time: float = None,
+    cpu_time: float = None,
+    max_rss: int = None,
+    failure: str = None,
+    file_size: int = None,
+    db_file: Path = None,
+) -> None:
+    """
+    Insert a record with the outcome of an analysis stage in the history database.
+
+    Parameters
+    ----------
+    history_file : pathlib.Path
+        History file of the run/subrun, whose name identifies its entries.
+    run : str
+        Run/sequence analyzed, e.g. 01807.0011
+    prod_id : str
+        Prod ID of the run analyzed.
+    stage : str
+        Stage of the analysis pipeline.
+    return_code : int
+        Return code of the lstchain executable.
+    input_file : str, optional
+    config_file : str, optional
+    timestamp : str, optional
+        UTC time of the record. Now by default.
+    wall_time : float, optional
+        Elapsed time of the stage in seconds.
+    cpu_time : float, optional
+        User + system CPU time of the stage in seconds.
+    max_rss : int, optional
+        Maximum resident set size of the stage in kB.
+    failure : str, optional
+        Class of the failure (transient, permanent or unknown), which
+        determines whether and when the stage is retried.
+    file_size : int, optional
+        Size in bytes of the history file once the line of this entry was
+        appended, which tells whether the database is up to date with it.
+    db_file : pathlib.Path, optional
+        History database. By default, the one of the analysis directory.
+    """
+    if timestamp is None:
+        timestamp = datetime.utcnow().isoformat(sep=" ", timespec="minutes")
+
+    sequence = Path(history_file).stem
+    run_id, subrun = split_sequence(sequence)
+
+    with open_history_db(db_file) as connection:
+        connection.execute(
+            "INSERT INTO history "
+            "(sequence, run, run_id, subrun, stage, prod_id, rc, timestamp, input_file, config, "
+            "wall_time, cpu_time, max_rss, failure, file_size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                sequence,
+                str(run),
+                run_id,
+                subrun,
+                stage,
+                prod_id,
+                int(return_code),
+                timestamp,
+                None if input_file is None else str(input_file),
+                None if config_file is None else str(config_file),
+                wall_time,
+                cpu_time,
+                max_rss,
+                failure,
+                file_size,
+            ),
+        )
+
+
+def parse_history_line(line: str) -> dict:
+    """
+    Parse a line of a .history file written by `osa.report.history`:
+    run stage prod_id timestamp input_file config_file return_code
+
+    The timestamp may contain spaces, since its format changed over time.
+
+    Returns
+    -------
+    entry : dict
+        Keys of the columns of the history table.
+
+    Raises
+    ------
+    ValueError
+        If the line is malformed.
+    """
+    words = line.split()
+    if len(words) < 7:
+        raise ValueError(f"Malformed history line: {line}")
+
+    run, stage, prod_id = words[:3]
+    input_file, config_file, return_code = words[-3:]
+    return {
+        "run": run,
+        "stage": stage,
+        "prod_id": prod_id,
+        "rc": int(return_code),
+        "timestamp": " ".join(words[3:-3]),
+        "input_file": None if input_file == "None" else input_file,
+        "config": None if config_file == "None" else config_file,
+    }
+
+
+def migrate_history_files(history_files: Iterable[Path], db_file: Path = None) -> int:
+    """
+    Import the lines of existing .history files into the history database.
+    Only the lines added since a previous migration of a file, and not recorded
+    already by the analysis stages (same history file size once appended), are
+    imported, so that it can be run several times over the same directory, also
+    for nights still being processed.
+
+    Returns
+    -------
+    n_entries : int
+        Number of entries imported.
+    """
+    n_entries = 0
+
+    with open_history_db(db_file) as connection:
+        for history_file in history_files:
+            lines = Path(history_file).read_bytes().splitlines(keepends=True)
+            row = connection.execute(
+                "SELECT n_lines FROM migrated_files WHERE file = ?", (str(history_file),)
+            ).fetchone()
+            n_migrated = row[0] if row else 0
+
+            sequence = Path(history_file).stem
+            run_id, subrun = split_sequence(sequence)
+            recorded_sizes = {
+                size
+                for (size,) in connection.execute(
+                    "SELECT file_size FROM history WHERE sequence = ? AND file_size IS NOT NULL",
+                    (sequence,),
+                )
+            }
+            file_size = sum(len(line) for line in lines[:n_migrated])
+            entries = []
+            for line in lines[n_migrated:]:
+                file_size += len(line)
+                if file_size in recorded_sizes:
+                    continue
+                try:
+                    entry = parse_history_line(line.decode())
+                except ValueError as error:
+                    log.warning(f"{history_file}: {error}")
+                    continue
+                entries.append(
+                    {
+                        **entry,
+                        "sequence": sequence,
+                        "run_id": run_id,
+                        "subrun": subrun,
+                        "file_size": file_size,
+                    }
+                )
+
+            connection.executemany(
+                "INSERT INTO history "
+                "(sequence, run, run_id, subrun, stage, prod_id, rc, timestamp, input_file, config, "
+                "file_size) "
+                "VALUES (:sequence, :run, :run_id, :subrun, :stage, :prod_id, :rc, :timestamp, "
+                ":input_file, :config, :file_size)",
+                entries,
+            )
+            connection.execute(
+                "INSERT INTO migrated_files (file, n_lines) VALUES (?, ?) "
+                "ON CONFLICT(file) DO UPDATE SET n_lines = excluded.n_lines",
+                (str(history_file), len(lines)),
+            )
+            n_entries += len(entries)
+
+    return n_entries
+
+
+def get_history_entries(db_file: Path = None) -> dict:
+    """
+    Get the history entries of every run/subrun of the night in
+    chronological order with a single query. The entries of a run/subrun
+    are sorted as the lines of its history file (by the file size once
+    they were appended), since migrated lines may be inserted after
+    those recorded by the analysis stages.
+
+    Parameters
+    ----------
+    db_file : pathlib.Path, optional
+
+    Returns
+    -------
+    entries : dict
+        Lists of (stage, prod_id, rc) tuples keyed by run number and
+        the name of the history file, e.g. entries[1807]["sequence_LST1_01807.0011"]
+    """
+    query = "SELECT run_id, sequence, stage, prod_id, rc FROM history ORDER BY file_size, id"
+
+    entries = {}
+    with open_history_db(db_file) as connection:
+        for run_id, sequence, stage, prod_id, rc in connection.execute(query):
+            entries.setdefault(run_id, {}).setdefault(sequence, []).append((stage, prod_id, rc))
+
+    return entries
+
+
+def get_history_sizes(db_file: Path = None) -> dict:
+    """
+    Size of the history file of each run/subrun when its last entry was recorded,
+    keyed by the name of the history file. The database is up to date with a history
+    file if its current size is the same, which is checked without reading it.
+    """
+    query = "SELECT sequence, MAX(file_size) FROM history GROUP BY sequence"
+    with open_history_db(db_file) as connection:
+        return dict(connection.execute(query).fetchall())
+
+
+def get_failed_twice(db_file: Path = None) -> list:
+    """
+    Get the history file names of the runs/subruns whose last two entries are
+    identical (same run, stage, prod ID, timestamp, input file and configuration)
+    with a non-zero exit status, i.e. the same check of `osa.veto.failed_history`
+    for all the runs of the night at once.
+    """
+    columns = ["run", "stage", "prod_id", "timestamp", "input_file", "config", "rc"]
+    previous = ",\n".join(
+        f"LAG({column}) OVER (PARTITION BY sequence ORDER BY file_size, id) AS previous_{column}"
+        for column in columns
+    )
+    same = " AND ".join(f"{column} IS previous_{column}" for column in columns)
+    query = f"""
+        SELECT sequence FROM (
+            SELECT
+                sequence,
+                {", ".join(columns)},
+                {previous},
+                ROW_NUMBER() OVER (
+                    PARTITION BY sequence ORDER BY file_size DESC, id DESC
+                ) AS attempt
+            FROM history
+        )
+        WHERE attempt = 1
+            AND rc != 0
+            AND {same}
+        ORDER BY sequence
+    """
+    with open_history_db(db_file) as connection:
+        return [sequence for (sequence,) in connection.execute(query)]
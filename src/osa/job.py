@@ -1,20 +1,29 @@
 """Functions to handle the interaction with the job scheduler."""
 
+import csv
 import datetime
 import logging
+import os
+import shlex
 import shutil
+import sqlite3
 import subprocess as sp
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import StringIO
 from pathlib import Path
-from textwrap import dedent
-from typing import Iterable
-
-import matplotlib.pyplot as plt
-import pandas as pd
+from textwrap import dedent, indent
+from typing import Iterable, TYPE_CHECKING
 
 from osa.configs import options
 from osa.configs.config import cfg
+from osa.history import (
+    get_history_entries,
+    get_history_sizes,
+    history_db_file,
+    split_sequence,
+)
 from osa.paths import (
     pedestal_ids_file_exists,
     get_drive_file,
@@ -24,12 +33,21 @@ from osa.paths import (
 from osa.utils.iofile import write_to_file
 from osa.utils.logging import myLogger
 from osa.utils.utils import date_to_dir, time_to_seconds, stringify, date_to_iso
+from osa.workflow.dag import Step
+
+if TYPE_CHECKING:
+    # pandas and matplotlib are imported only where needed to keep
+    # the start-up of the command line scripts fast
+    import pandas as pd
 
 log = myLogger(logging.getLogger(__name__))
 
 __all__ = [
     "are_all_jobs_correctly_finished",
     "historylevel",
+    "level_from_history",
+    "history_program_levels",
+    "get_history_levels",
     "prepare_jobs",
     "sequence_filenames",
     "set_queue_values",
@@ -38,14 +56,22 @@ __all__ = [
     "scheduler_env_variables",
     "set_cache_dirs",
     "submit_jobs",
+    "submit_job_array",
+    "job_array_script",
+    "job_array_step",
     "check_history_level",
     "get_sacct_output",
     "get_squeue_output",
     "filter_jobs",
     "run_sacct",
+    "update_sacct_cache",
+    "read_sacct_cache",
+    "get_jobs_state",
+    "wait_for_jobs",
     "run_squeue",
     "calibration_sequence_job_template",
     "data_sequence_job_template",
+    "data_sequence_bash_template",
     "save_job_information",
 ]
 
@@ -62,6 +88,24 @@ FORMAT_SLURM = [
     "ExitCode",
 ]
 
+# File caching the sacct records of a given night and minutes of overlap
+# between consecutive incremental sacct polls
+SACCT_CACHE_FILE = "sacct_cache.db"
+SACCT_CACHE_MARGIN_MINUTES = 5
+
+# SLURM states of jobs which are not going to change anymore
+JOB_FINAL_STATES = {
+    "COMPLETED",
+    "FAILED",
+    "CANCELLED",
+    "TIMEOUT",
+    "OUT_OF_MEMORY",
+    "NODE_FAIL",
+    "BOOT_FAIL",
+    "DEADLINE",
+    "PREEMPTED",
+}
+
 PYTHON_IMPORTS = dedent(
     """\
 
@@ -76,8 +120,8 @@ PYTHON_IMPORTS = dedent(
 
 def are_all_jobs_correctly_finished(sequence_list):
     """
-    Check if all jobs are correctly finished by looking
-    at the history file.
+    Check if all jobs are correctly finished by looking at the level
+    reached by every run/subrun according to its history.
 
     Parameters
     ----------
@@ -89,32 +133,109 @@ def are_all_jobs_correctly_finished(sequence_list):
     flag: bool
     """
     # FIXME: check based on sequence.jobid exit status
-    flag = True
-    analysis_directory = Path(options.directory)
-    for sequence in sequence_list:
-        history_files_list = analysis_directory.rglob(f"*{sequence.seq}*.history")
-        for history_file in history_files_list:
-            # TODO: s.history should be SubRunObj attribute not RunObj
-            # s.history only working for CALIBRATION sequence (run-wise), since it is
-            # looking for .../sequence_LST1_04180.history files
-            # we need to check all the subrun wise history files
-            # .../sequence_LST1_04180.XXXX.history
-            out, _ = historylevel(history_file, sequence.type)
-            if out == 0:
-                log.debug(f"Job {sequence.seq} ({sequence.type}) correctly finished")
-                continue
-            if out == 1 and options.no_dl2:
-                log.debug(
-                    f"Job {sequence.seq} ({sequence.type}) correctly "
-                    f"finished up to DL1ab, but --no-dl2 option selected"
-                )
-                continue
+    levels = get_history_levels(sequence_list)
+
+    finished = levels["level"] == 0
+    if options.no_dl2:
+        # Correctly finished up to DL1ab, but --no-dl2 option selected
+        finished |= levels["level"] == 1
 
+    summary = levels.assign(finished=finished).groupby(["seq", "run", "type"]).agg(
+        histories=("level", "size"),
+        finished=("finished", "sum"),
+        max_level=("level", "max"),
+    )
+    for (seq, run, data_type), row in summary.iterrows():
+        if row.finished == row.histories:
+            log.debug(f"Job {seq} ({data_type}) correctly finished")
+        else:
             log.warning(
-                f"Job {sequence.seq} (run {sequence.run}) not correctly finished [level {out}]"
+                f"Job {seq} (run {run}) not correctly finished: {row.histories - row.finished} "
+                f"of {row.histories} subruns unfinished [level {row.max_level}]"
             )
-            flag = False
-    return flag
+
+    return bool(finished.all())
+
+
+def get_history_levels(sequence_list, n_threads: int = None) -> "pd.DataFrame":
+    """
+    Build a table with the level reached by every run/subrun of the given
+    sequences according to their history files. The entries of the history
+    database are used instead of parsing a history file if they match it
+    (same file size as when its last entry was recorded), otherwise the
+    history file is used (e.g. for nights processed before the database
+    was introduced, records lost or a database that cannot be read).
+
+    The analysis directory is walked only once, and the history files
+    are read and evaluated concurrently by a pool of threads.
+
+    Parameters
+    ----------
+    sequence_list: list
+        List of sequence objects
+    n_threads: int, optional
+        Number of threads used to read the history files.
+        LSTOSA HISTORY_THREADS by default.
+
+    Returns
+    -------
+    levels: pd.DataFrame
+        One row per run/subrun history (seq, run, type, history, level, exit_status).
+    """
+    import pandas as pd
+
+    analysis_directory = Path(options.directory)
+    history_db = history_db_file(analysis_directory)
+    sequences = {sequence.run: sequence for sequence in sequence_list}
+    program_levels = history_program_levels()
+
+    # A single query with the history of all the runs and subruns
+    indexed_entries, history_sizes = {}, {}
+    if history_db.exists():
+        try:
+            indexed_entries = {
+                name: entries
+                for run_entries in get_history_entries(history_db).values()
+                for name, entries in run_entries.items()
+            }
+            history_sizes = get_history_sizes(history_db)
+        except sqlite3.Error as error:
+            log.warning(f"Could not read the history database, using the history files: {error}")
+            indexed_entries, history_sizes = {}, {}
+
+    # A single walk of the analysis directory
+    history_files = [
+        (sequences[run_id], Path(root) / file)
+        for root, _, files in os.walk(analysis_directory)
+        for file in files
+        if file.endswith(".history")
+        and (run_id := split_sequence(Path(file).stem)[0]) in sequences
+    ]
+
+    def history_file_level(sequence_file):
+        sequence, history_file = sequence_file
+        entries = indexed_entries.get(history_file.stem)
+        # The history file is the reference, e.g. if a record could not be inserted in the database
+        up_to_date = history_sizes.get(history_file.stem) == history_file.stat().st_size
+        if entries is not None and up_to_date:
+            level = level_from_history(entries, sequence.type, program_levels)
+        else:
+            level = historylevel(history_file, sequence.type, program_levels)
+        return sequence, history_file.stem, level
+
+    if n_threads is None:
+        n_threads = cfg.getint("LSTOSA", "HISTORY_THREADS", fallback=8)
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        results = list(executor.map(history_file_level, history_files))
+
+    return pd.DataFrame(
+        [
+            (sequence.seq, sequence.run, sequence.type, name, level, exit_status)
+            for sequence, name, (level, exit_status) in results
+        ],
+        columns=["seq", "run", "type", "history", "level", "exit_status"],
+    )
 
 
 def check_history_level(history_file: Path, program_levels: dict):
@@ -153,7 +274,7 @@ def check_history_level(history_file: Path, program_levels: dict):
         return level, exit_status
 
 
-def historylevel(history_file: Path, data_type: str):
+def historylevel(history_file: Path, data_type: str, program_levels: dict = None):
     """
     Returns the level from which the analysis should begin and
     the rc of the last executable given a certain history file.
@@ -177,6 +298,42 @@ def historylevel(history_file: Path, data_type: str):
     history_file: pathlib.Path
     data_type: str
         Type of the sequence, either 'DATA' or 'PEDCALIB'
+    program_levels: dict, optional
+        Levels of each program, see `history_program_levels`.
+
+    Returns
+    -------
+    level : int
+    exit_status : int
+    """
+
+    entries = []
+    if history_file.exists():
+        for line in history_file.read_text().splitlines():
+            words = line.split()
+            try:
+                entries.append((words[1], words[2], int(words[-1])))
+            except (IndexError, ValueError) as err:
+                log.exception(f"Malformed history file {history_file}, {err}")
+
+    return level_from_history(entries, data_type, program_levels)
+
+
+def level_from_history(entries: Iterable[tuple], data_type: str, program_levels: dict = None):
+    """
+    Returns the level from which the analysis should begin and the rc of
+    the last executable given the history entries of a run/subrun, either
+    read from its history file or queried from the history database.
+
+    Parameters
+    ----------
+    entries: Iterable[tuple]
+        (program, prod_id, exit_status) of each analysis step in chronological order.
+    data_type: str
+        Type of the sequence, either 'DATA' or 'PEDCALIB'
+    program_levels: dict, optional
+        Levels of each program, see `history_program_levels`. Pass it
+        when evaluating many histories to build it only once.
 
     Returns
     -------
@@ -194,51 +351,47 @@ def historylevel(history_file: Path, data_type: str):
     else:
         raise ValueError(f"Type {data_type} not expected")
 
+    if program_levels is None:
+        program_levels = history_program_levels()
+
     exit_status = 0
 
-    if history_file.exists():
-        for line in history_file.read_text().splitlines():
-            words = line.split()
-            try:
-                program = words[1]
-                prod_id = words[2]
-                exit_status = int(words[-1])
-                log.debug(f"{program}, finished with error {exit_status} and prod ID {prod_id}")
-            except (IndexError, ValueError) as err:
-                log.exception(f"Malformed history file {history_file}, {err}")
-            else:
-                # Calibration sequence
-                if program == cfg.get("lstchain", "drs4_baseline"):
-                    level = 1 if exit_status == 0 else 2
-                elif program == cfg.get("lstchain", "charge_calibration"):
-                    level = 0 if exit_status == 0 else 1
-                # Data sequence
-                elif program == cfg.get("lstchain", "r0_to_dl1"):
-                    level = 3 if exit_status == 0 else 4
-                elif program == cfg.get("lstchain", "dl1ab"):
-                    if (exit_status == 0) and (prod_id == options.dl1_prod_id):
-                        log.debug(f"DL1ab prod ID: {options.dl1_prod_id} already produced")
-                        level = 2
-                    else:
-                        level = 3
-                        log.debug(f"DL1ab prod ID: {options.dl1_prod_id} not produced yet")
-                        break
-                elif program == cfg.get("lstchain", "check_dl1"):
-                    level = 1 if exit_status == 0 else 2
-                elif program == cfg.get("lstchain", "dl1_to_dl2"):
-                    if (exit_status == 0) and (prod_id == options.dl2_prod_id):
-                        log.debug(f"DL2 prod ID: {options.dl2_prod_id} already produced")
-                        level = 0
-                    else:
-                        level = 1
-                        log.debug(f"DL2 prod ID: {options.dl2_prod_id} not produced yet")
-
-                else:
-                    log.warning(f"Program name not identified: {program}")
+    for program, prod_id, exit_status in entries:
+        try:
+            level_done, level_not_done, required_prod_id, restart = program_levels[program]
+        except KeyError:
+            log.warning(f"Program name not identified: {program}")
+            continue
+
+        if exit_status == 0 and required_prod_id in (None, prod_id):
+            level = level_done
+        else:
+            level = level_not_done
+            if restart:
+                log.debug(f"{program} prod ID: {required_prod_id} not produced yet")
+                break
 
     return level, exit_status
 
 
+def history_program_levels() -> dict:
+    """
+    Map each lstchain program to the levels reached when it is done or not
+    (failed or run with another prod ID), the prod ID its products must have
+    to be considered done, and whether the analysis must restart from it.
+    """
+    return {
+        # Calibration sequence
+        cfg.get("lstchain", "drs4_baseline"): (1, 2, None, False),
+        cfg.get("lstchain", "charge_calibration"): (0, 1, None, False),
+        # Data sequence
+        cfg.get("lstchain", "r0_to_dl1"): (3, 4, None, False),
+        cfg.get("lstchain", "dl1ab"): (2, 3, options.dl1_prod_id, True),
+        cfg.get("lstchain", "check_dl1"): (1, 2, None, False),
+        cfg.get("lstchain", "dl1_to_dl2"): (0, 1, options.dl2_prod_id, False),
+    }
+
+
 def prepare_jobs(sequence_list):
     """Prepare job file template for each sequence."""
     if not options.simulate:
@@ -257,7 +410,8 @@ def prepare_jobs(sequence_list):
 def sequence_filenames(sequence):
     """Build names of the script, veto and history files."""
     basename = f"sequence_{sequence.jobname}"
-    sequence.script = Path(options.directory) / f"{basename}.py"
+    script_suffix = ".sh" if sequence.type == "DATA" and bash_pilot_enabled() else ".py"
+    sequence.script = Path(options.directory) / f"{basename}{script_suffix}"
     sequence.veto = Path(options.directory) / f"{basename}.veto"
     sequence.history = Path(options.directory) / f"{basename}.history"
 
@@ -272,7 +426,7 @@ def save_job_information():
     log_directory.mkdir(exist_ok=True, parents=True)
     file_path = log_directory / "job_information.csv"
 
-    sacct_output = run_sacct()
+    sacct_output = read_sacct_cache()
     jobs_df = get_sacct_output(sacct_output)
 
     # Fetch sacct output and prepare the data
@@ -284,7 +438,7 @@ def save_job_information():
     jobs_df_filtered.to_csv(file_path, index=False, sep=",")
 
 
-def plot_job_statistics(sacct_output: pd.DataFrame, directory: Path):
+def plot_job_statistics(sacct_output: "pd.DataFrame", directory: Path):
     """
     Get statistics of the jobs. Check elapsed time used,
     the memory used, the number of jobs completed, the number of jobs failed,
@@ -297,6 +451,8 @@ def plot_job_statistics(sacct_output: pd.DataFrame, directory: Path):
     directory: Path
         Directory to save the plot.
     """
+    import matplotlib.pyplot as plt
+
     # TODO: this function will be called in the closer loop after all
     #  the jobs are done for a given production.
 
@@ -338,7 +494,9 @@ def scheduler_env_variables(sequence, scheduler="slurm"):
     # Depending on the type of sequence, we need to set
     # different sbatch environment variables
     if sequence.type == "DATA":
-        sbatch_parameters.append(f"--array=0-{subruns}")
+        sbatch_parameters.append(f"--array=0-{subruns // subruns_per_task()}")
+        if task_processes() > 1:
+            sbatch_parameters.append(f"--cpus-per-task={task_processes()}")
 
     sbatch_parameters.append(f"--partition={cfg.get('SLURM', f'PARTITION_{sequence.type}')}")
     sbatch_parameters.append(f"--mem-per-cpu={cfg.get('SLURM', f'MEMSIZE_{sequence.type}')}")
@@ -346,7 +504,7 @@ def scheduler_env_variables(sequence, scheduler="slurm"):
     return ["#SBATCH " + line for line in sbatch_parameters]
 
 
-def job_header_template(sequence):
+def job_header_template(sequence, shebang: str = "#!/bin/env python"):
     """
     Returns a string with the job header template
     including SBATCH environment variables for sequencerXX.py script
@@ -354,43 +512,62 @@ def job_header_template(sequence):
     Parameters
     ----------
     sequence: sequence object
+    shebang: str
+        Interpreter of the pilot job script
 
     Returns
     -------
     header: str
         String with job header template
     """
-    python_shebang = "#!/bin/env python"
     if options.test:
-        return python_shebang
+        return shebang
     sbatch_parameters = "\n".join(scheduler_env_variables(sequence))
-    return python_shebang + 2 * "\n" + sbatch_parameters
+    return shebang + 2 * "\n" + sbatch_parameters
+
+
+def bash_pilot_enabled() -> bool:
+    """Whether DATA sequences use a bash pilot job script instead of a python one."""
+    return cfg.get("SLURM", "PILOT_SCRIPT", fallback="python") == "bash"
+
 
+def subruns_per_task() -> int:
+    """Number of consecutive subruns processed by each job array task of DATA sequences."""
+    return max(cfg.getint("SLURM", "SUBRUNS_PER_TASK", fallback=1), 1)
 
-def set_cache_dirs():
+
+def task_processes() -> int:
+    """Number of subruns processed in parallel within a job array task."""
+    return max(cfg.getint("SLURM", "TASK_PROCESSES", fallback=1), 1)
+
+
+def set_cache_dirs(bash: bool = False):
     """
     Export cache directories for the jobs provided they
     are defined in the config file.
 
+    Parameters
+    ----------
+    bash: bool
+        Export them with bash syntax instead of python.
+
     Returns
     -------
     content: string
         String with the command to export the cache directories
     """
-
-    ctapipe_cache = cfg.get("CACHE", "CTAPIPE_CACHE")
-    ctapipe_svc_path = cfg.get("CACHE", "CTAPIPE_SVC_PATH")
-    mpl_config_path = cfg.get("CACHE", "MPLCONFIGDIR")
+    cache_dirs = {
+        "CTAPIPE_CACHE": cfg.get("CACHE", "CTAPIPE_CACHE"),
+        "CTAPIPE_SVC_PATH": cfg.get("CACHE", "CTAPIPE_SVC_PATH"),
+        "MPLCONFIGDIR": cfg.get("CACHE", "MPLCONFIGDIR"),
+    }
 
     content = []
-    if ctapipe_cache:
-        content.append(f"os.environ['CTAPIPE_CACHE'] = '{ctapipe_cache}'")
-
-    if ctapipe_svc_path:
-        content.append(f"os.environ['CTAPIPE_SVC_PATH'] = '{ctapipe_svc_path}'")
-
-    if mpl_config_path:
-        content.append(f"os.environ['MPLCONFIGDIR'] = '{mpl_config_path}'")
+    for variable, directory in cache_dirs.items():
+        if directory and bash:
+            content.append(f"export {variable}='{directory}'")
+        elif directory:
+            content.append(f"os.environ['{variable}'] = '{directory}'")
 
     return "\n".join(content)
 
@@ -409,9 +586,6 @@ def data_sequence_job_template(sequence):
     """
     # TODO: refactor this function creating wrappers that handle slurm part
 
-    # Get the job header template.
-    job_header = job_header_template(sequence)
-
     flat_date = date_to_dir(options.date)
 
     commandargs = ["datasequence"]
@@ -438,37 +612,200 @@ def data_sequence_job_template(sequence):
         )
     )
 
+    # Pedestal IDs file name with the subrun index to be filled by the pilot job
+    pedestal_ids_file = None
+    if pedestal_ids_file_exists(sequence.run):
+        pedestal_ids_file = get_pedestal_ids_file(sequence.run, flat_date)
+
+    if bash_pilot_enabled():
+        return data_sequence_bash_template(sequence, commandargs, pedestal_ids_file)
+
+    # Get the job header template.
+    job_header = job_header_template(sequence)
+
     content = job_header + "\n" + PYTHON_IMPORTS
 
+    if subruns_per_task() > 1:
+        content += data_sequence_chunk_template(sequence, commandargs, pedestal_ids_file)
+    else:
+        if not options.test:
+            content += set_cache_dirs()
+            content += "\n"
+            # Use the SLURM env variables
+            content += "subruns = int(os.getenv('SLURM_ARRAY_TASK_ID'))\n"
+        else:
+            # Just process the first subrun without SLURM
+            content += "subruns = 0\n"
+
+        content += "\n"
+
+        content += "with tempfile.TemporaryDirectory() as tmpdirname:\n"
+        content += TAB + "os.environ['NUMBA_CACHE_DIR'] = tmpdirname\n"
+
+        content += TAB + "proc = subprocess.run([\n"
+        content += datasequence_arguments(sequence, commandargs, pedestal_ids_file, TAB * 2)
+        content += TAB + "])\n"
+        content += "\n"
+        content += "sys.exit(proc.returncode)"
+
+    if not options.simulate:
+        write_to_file(sequence.script, content)
+
+    return content
+
+
+def datasequence_arguments(sequence, commandargs: list, pedestal_ids_file: Path, prefix: str):
+    """Python list items with the datasequence command line of the subrun given by `subruns`."""
+    content = ""
+    for arg in commandargs:
+        content += prefix + f"'{arg}',\n"
+
+    if pedestal_ids_file is not None:
+        content += prefix + f"f'--pedestal-ids-file={pedestal_ids_file}',\n"
+
+    content += prefix + f"f'{sequence.run:05d}.{{subruns:04d}}',\n"
+    content += prefix + f"'{options.tel_id}'\n"
+    return content
+
+
+def data_sequence_chunk_template(sequence, commandargs: list, pedestal_ids_file: Path = None) -> str:
+    """
+    Body of the python pilot job script processing a chunk of consecutive
+    subruns ([SLURM] SUBRUNS_PER_TASK) in a single job array task. The subruns
+    are processed by independent datasequence calls, so their history and
+    veto are still handled per subrun, either one after the other or with a
+    pool of [SLURM] TASK_PROCESSES processes. All of them share the same
+    numba cache directory in the local scratch of the node. The time at which
+    each subrun is launched is passed in OSA_PILOT_START, so that datasequence
+    reports its own overhead and not the time since the task started.
+
+    Parameters
+    ----------
+    sequence : sequence object
+    commandargs : list
+        datasequence command and its arguments, except the run and telescope
+    pedestal_ids_file : pathlib.Path
+        Pedestal IDs file with the {subruns:04d} placeholder, if any
+
+    Returns
+    -------
+    content : string
+    """
+    chunk_size = subruns_per_task()
+
+    content = "import time\n"
+    content += "from concurrent.futures import ThreadPoolExecutor\n\n"
+
     if not options.test:
         content += set_cache_dirs()
         content += "\n"
         # Use the SLURM env variables
-        content += "subruns = int(os.getenv('SLURM_ARRAY_TASK_ID'))\n"
+        content += "task = int(os.getenv('SLURM_ARRAY_TASK_ID'))\n"
     else:
-        # Just process the first subrun without SLURM
-        content += "subruns = 0\n"
+        # Just process the first chunk of subruns without SLURM
+        content += "task = 0\n"
 
-    content += "\n"
+    content += (
+        f"subrun_list = range(task * {chunk_size}, "
+        f"min((task + 1) * {chunk_size}, {sequence.subruns}))\n"
+    )
+    content += "\n\n"
+
+    content += "def process_subrun(subruns):\n"
+    content += TAB + "env = dict(os.environ, OSA_PILOT_START=str(time.time()))\n"
+    content += TAB + "proc = subprocess.run([\n"
+    content += datasequence_arguments(sequence, commandargs, pedestal_ids_file, TAB * 2)
+    content += TAB + "], env=env)\n"
+    content += TAB + "return proc.returncode\n"
+    content += "\n\n"
 
     content += "with tempfile.TemporaryDirectory() as tmpdirname:\n"
     content += TAB + "os.environ['NUMBA_CACHE_DIR'] = tmpdirname\n"
+    content += TAB + f"with ThreadPoolExecutor(max_workers={task_processes()}) as executor:\n"
+    content += TAB * 2 + "return_codes = list(executor.map(process_subrun, subrun_list))\n"
+    content += "\n"
+    content += "sys.exit(next((rc for rc in return_codes if rc != 0), 0))"
 
-    content += TAB + "proc = subprocess.run([\n"
+    return content
 
-    for arg in commandargs:
-        content += TAB * 2 + f"'{arg}',\n"
 
-    if pedestal_ids_file_exists(sequence.run):
-        pedestal_ids_file = get_pedestal_ids_file(sequence.run, flat_date)
-        content += TAB * 2 + f"f'--pedestal-ids-file={pedestal_ids_file}',\n"
+def data_sequence_bash_template(sequence, commandargs: list, pedestal_ids_file: Path = None) -> str:
+    """
+    Lightweight bash version of the pilot job script of DATA sequences.
+    It calls datasequence directly, without starting an additional python
+    interpreter in every array task only to launch it. With [SLURM]
+    SUBRUNS_PER_TASK > 1, each array task processes a chunk of consecutive
+    subruns, at most [SLURM] TASK_PROCESSES of them at a time, exporting the
+    time at which each of them is launched in OSA_PILOT_START. The exit code
+    of the task is the one of the first subrun that failed.
+
+    Parameters
+    ----------
+    sequence : sequence object
+    commandargs : list
+        datasequence command and its arguments, except the run and telescope
+    pedestal_ids_file : pathlib.Path
+        Pedestal IDs file with the {subruns:04d} placeholder, if any
 
-    content += TAB * 2 + f"f'{sequence.run:05d}.{{subruns:04d}}',\n"
+    Returns
+    -------
+    job_template : string
+    """
+    chunk_size = subruns_per_task()
+    content = job_header_template(sequence, shebang="#!/bin/bash") + "\n\n"
 
-    content += TAB * 2 + f"'{options.tel_id}'\n"
-    content += TAB + "])\n"
+    if not options.test:
+        if cache_dirs := set_cache_dirs(bash=True):
+            content += cache_dirs + "\n"
+        # Use the SLURM env variables
+        if chunk_size == 1:
+            content += 'subruns=$(printf "%04d" "${SLURM_ARRAY_TASK_ID}")\n'
+        else:
+            content += "task=${SLURM_ARRAY_TASK_ID}\n"
+    elif chunk_size == 1:
+        # Just process the first subrun without SLURM
+        content += "subruns=0000\n"
+    else:
+        # Just process the first chunk of subruns without SLURM
+        content += "task=0\n"
+
+    content += 'export NUMBA_CACHE_DIR=$(mktemp -d)\n'
+    content += "trap 'rm -rf \"${NUMBA_CACHE_DIR}\"' EXIT\n"
     content += "\n"
-    content += "sys.exit(proc.returncode)"
+
+    command = f"{shlex.quote(str(commandargs[0]))} \\\n"
+    for arg in commandargs[1:]:
+        command += TAB + f"{shlex.quote(str(arg))} \\\n"
+    if pedestal_ids_file is not None:
+        # Quote everything but the subruns of the task, expanded by bash
+        pedestal_ids_arg = f"--pedestal-ids-file={pedestal_ids_file}".split("{subruns:04d}")
+        command += TAB + '"${subruns}"'.join(map(shlex.quote, pedestal_ids_arg)) + " \\\n"
+    command += TAB + f'"{sequence.run:05d}.${{subruns}}" \\\n'
+    command += TAB + shlex.quote(options.tel_id)
+
+    if chunk_size == 1:
+        content += command + "\n"
+    else:
+        last_subrun = sequence.subruns - 1
+        content += f"first=$((task * {chunk_size}))\n"
+        content += f"last=$(((task + 1) * {chunk_size} - 1))\n"
+        content += f"((last > {last_subrun})) && last={last_subrun}\n"
+        content += "rc=0\n"
+        content += "pids=()\n"
+        content += 'for subrun in $(seq "${first}" "${last}"); do\n'
+        content += TAB + 'subruns=$(printf "%04d" "${subrun}")\n'
+        content += TAB + 'export OSA_PILOT_START=$(date +%s.%N)\n'
+        content += indent(command, TAB) + " &\n"
+        content += TAB + "pids+=($!)\n"
+        content += TAB + f"if ((${{#pids[@]}} >= {task_processes()})); then\n"
+        content += TAB * 2 + 'wait "${pids[0]}" || { status=$?; ((rc == 0)) && rc=${status}; }\n'
+        content += TAB * 2 + 'pids=("${pids[@]:1}")\n'
+        content += TAB + "fi\n"
+        content += "done\n"
+        content += 'for pid in "${pids[@]}"; do\n'
+        content += TAB + 'wait "${pid}" || { status=$?; ((rc == 0)) && rc=${status}; }\n'
+        content += "done\n"
+        content += 'exit "${rc}"\n'
 
     if not options.simulate:
         write_to_file(sequence.script, content)
@@ -595,7 +932,8 @@ def submit_jobs(sequence_list, batch_command="sbatch"):
                 log.debug(
                     "TEST launching datasequence scripts for " "first subrun without scheduler"
                 )
-                commandargs = ["python", sequence.script]
+                interpreter = "bash" if sequence.script.suffix == ".sh" else "python"
+                commandargs = [interpreter, sequence.script]
                 sp.check_output(commandargs, shell=False)
             else:
                 log.info("Submitting jobs to the cluster.")
@@ -612,6 +950,115 @@ def submit_jobs(sequence_list, batch_command="sbatch"):
     return job_list
 
 
+def job_array_script(commands: dict, log_prefix: str) -> str:
+    """
+    Bash script of a job array running one command per run. The script carries
+    the manifest mapping each array task index to its run and command, so that
+    it does not depend on any other file once submitted.
+
+    Parameters
+    ----------
+    commands: dict
+        Command (list of arguments) to be executed for each run number.
+    log_prefix: str
+        The output of each task goes to log/<log_prefix>_<run>_<array job ID>.log
+
+    Returns
+    -------
+    content: str
+    """
+    content = "#!/bin/bash\n\n"
+    content += "# Manifest of the job array: run and command of each task index\n"
+    content += "runs=(\n"
+    content += "".join(TAB + f"{run:05d}\n" for run in commands)
+    content += ")\n"
+    content += "commands=(\n"
+    content += "".join(
+        TAB + shlex.quote(shlex.join(map(str, cmd))) + "\n" for cmd in commands.values()
+    )
+    content += ")\n\n"
+    content += "run=${runs[${SLURM_ARRAY_TASK_ID}]}\n"
+    content += f'exec > "log/{log_prefix}_${{run}}_${{SLURM_ARRAY_JOB_ID}}.log" 2>&1\n'
+    content += 'eval "${commands[${SLURM_ARRAY_TASK_ID}]}"\n'
+    return content
+
+
+def job_array_step(name: str, commands: dict, log_prefix: str) -> Step:
+    """
+    Workflow step running the commands of the different runs as a single
+    job array instead of one job per run. Its script is written to
+    log/<log_prefix>_array.sh (see `job_array_script`) only when the step
+    is submitted.
+
+    Parameters
+    ----------
+    name: str
+        Name of the step in the workflow.
+    commands: dict
+        Command (list of arguments) to be executed for each run number.
+    log_prefix: str
+        Prefix of the log files of the job array tasks and its script.
+
+    Returns
+    -------
+    step: osa.workflow.dag.Step
+    """
+    script = Path(options.directory) / "log" / f"{log_prefix}_array.sh"
+
+    # Name the array after the program, as for single jobs
+    program = next(iter(commands.values()))[0]
+    return Step(
+        name=name,
+        command=[str(script)],
+        directory=options.directory,
+        scripts={script: job_array_script(commands, log_prefix)},
+        sbatch_options=[
+            f"--job-name={program}",
+            f"--array=0-{len(commands) - 1}",
+            "-o",
+            f"log/{log_prefix}_array_%A_%a.log",
+        ],
+    )
+
+
+def submit_job_array(
+    commands: dict,
+    log_prefix: str,
+    dependency: Iterable[str] = None,
+    batch_command: str = "sbatch",
+):
+    """
+    Submit the commands of the different runs as a single job array
+    instead of one job per run (see `job_array_step`).
+
+    Parameters
+    ----------
+    commands: dict
+        Command (list of arguments) to be executed for each run number.
+    log_prefix: str
+        Prefix of the log files of the job array tasks and its script.
+    dependency: Iterable[str], optional
+        IDs of the jobs that must finish successfully before the array starts.
+    batch_command: str
+        The batch command to submit the job (Default: sbatch)
+
+    Returns
+    -------
+    job_id: str or None
+        ID of the job array, None if there is nothing to submit.
+    """
+    if not commands:
+        return None
+
+    step = job_array_step(log_prefix, commands, log_prefix)
+    cmd = step.batch_command(dependency or [], batch_command)
+
+    log.debug(f"Submitting {len(commands)} jobs as a job array: {stringify(cmd)}")
+    step.write_scripts()
+    job = sp.run(cmd, encoding="utf-8", capture_output=True, check=True)
+    return job.stdout.strip().split(";")[0]
+
+
 def run_squeue() -> StringIO:
     """Run squeue command to get the status of the jobs."""
     if shutil.which("squeue") is None:
@@ -622,11 +1069,13 @@ def run_squeue() -> StringIO:
     return StringIO(sp.check_output(["squeue", "--me", "-o", out_fmt]).decode())
 
 
-def get_squeue_output(squeue_output: StringIO) -> pd.DataFrame:
+def get_squeue_output(squeue_output: StringIO) -> "pd.DataFrame":
     """
     Obtain the current job information from squeue output
     and return a pandas dataframe.
     """
+    import pandas as pd
+
     df = pd.read_csv(squeue_output, delimiter=";")
     df.rename(
         inplace=True,
@@ -652,8 +1101,16 @@ def get_squeue_output(squeue_output: StringIO) -> pd.DataFrame:
     return df
 
 
-def run_sacct() -> StringIO:
-    """Run sacct to obtain the job information."""
+def run_sacct(starttime: datetime.datetime = None) -> StringIO:
+    """
+    Run sacct to obtain the job information.
+
+    Parameters
+    ----------
+    starttime: datetime.datetime
+        Only report the jobs in any state after this time. If not given,
+        the STARTTIME_DAYS_SACCT window of the configuration file is used.
+    """
     if shutil.which("sacct") is None:
         log.warning("No job info available since sacct command is not available")
         return StringIO()
@@ -667,7 +1124,9 @@ def run_sacct() -> StringIO:
         "-o",
         ",".join(FORMAT_SLURM),
     ]
-    if cfg.get("SLURM", "STARTTIME_DAYS_SACCT"):
+    if starttime is not None:
+        sacct_cmd.extend(["--starttime", starttime.isoformat(timespec="seconds")])
+    elif cfg.get("SLURM", "STARTTIME_DAYS_SACCT"):
         days = int(cfg.get("SLURM", "STARTTIME_DAYS_SACCT"))
         start_date = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
         sacct_cmd.extend(["--starttime", start_date])
@@ -675,7 +1134,131 @@ def run_sacct() -> StringIO:
     return StringIO(sp.check_output(sacct_cmd).decode())
 
 
-def get_sacct_output(sacct_output: StringIO) -> pd.DataFrame:
+def sacct_cache_file() -> Path:
+    """Path of the SQLite file caching the sacct records of the analysis directory."""
+    return Path(options.directory) / "log" / SACCT_CACHE_FILE
+
+
+@contextmanager
+def open_sacct_cache(db_file: Path, read_only: bool = False):
+    """
+    Open (creating it if needed) the sacct cache database as a context manager.
+    A read-only cache must already exist.
+    """
+    if read_only:
+        connection = sqlite3.connect(f"{db_file.resolve().as_uri()}?mode=ro", uri=True, timeout=60)
+        try:
+            yield connection.cursor()
+        finally:
+            connection.close()
+        return
+
+    db_file.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(db_file, timeout=60)
+    try:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "JobID TEXT PRIMARY KEY, JobName TEXT, CPUTime TEXT, CPUTimeRAW TEXT, "
+            "Elapsed TEXT, TotalCPU TEXT, MaxRSS TEXT, State TEXT, ExitCode TEXT)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS polls (id INTEGER PRIMARY KEY, time TEXT)"
+        )
+        yield connection.cursor()
+    finally:
+        connection.commit()
+        connection.close()
+
+
+def update_sacct_cache(db_file: Path = None) -> None:
+    """
+    Query sacct only for the job records changed since the last poll
+    and upsert them into the on-disk cache.
+
+    The first poll covers the STARTTIME_DAYS_SACCT window (if set). Later polls
+    start a few minutes before the previous one, so that jobs still pending or
+    running are refreshed while finished jobs are not queried again.
+
+    Parameters
+    ----------
+    db_file: Path
+        SQLite file of the cache. By default, log/sacct_cache.db in the
+        running analysis directory.
+    """
+    if db_file is None:
+        db_file = sacct_cache_file()
+
+    with open_sacct_cache(db_file) as cursor:
+        cursor.execute("SELECT time FROM polls ORDER BY id DESC LIMIT 1")
+        last_poll = cursor.fetchone()
+
+        poll_time = datetime.datetime.now()
+        if last_poll is None:
+            starttime = None
+        else:
+            margin = datetime.timedelta(minutes=SACCT_CACHE_MARGIN_MINUTES)
+            starttime = datetime.datetime.fromisoformat(last_poll[0]) - margin
+
+        sacct_output = run_sacct(starttime=starttime)
+        records = [
+            (row + [""] * len(FORMAT_SLURM))[: len(FORMAT_SLURM)]
+            for row in csv.reader(sacct_output)
+            if row
+        ]
+        update_columns = ", ".join(f"{col} = excluded.{col}" for col in FORMAT_SLURM[1:])
+        cursor.executemany(
+            f"INSERT INTO jobs ({', '.join(FORMAT_SLURM)}) "
+            f"VALUES ({', '.join('?' * len(FORMAT_SLURM))}) "
+            f"ON CONFLICT(JobID) DO UPDATE SET {update_columns}",
+            records,
+        )
+        cursor.execute(
+            "INSERT INTO polls (time) VALUES (?)", (poll_time.isoformat(timespec="seconds"),)
+        )
+        log.debug(f"{len(records)} sacct records updated in {db_file}")
+
+
+def read_sacct_cache(db_file: Path = None, update: bool = True) -> StringIO:
+    """
+    Return the cached sacct records with the same format as the sacct output
+    so that it can be parsed by `get_sacct_output` or `get_closer_sacct_output`.
+
+    In simulate mode nothing is written: the cache is read without polling
+    sacct if it already exists, and sacct is queried directly otherwise.
+
+    Parameters
+    ----------
+    db_file: Path
+        SQLite file of the cache. By default, log/sacct_cache.db in the
+        running analysis directory.
+    update: bool
+        Poll sacct for new records before reading the cache.
+    """
+    if db_file is None:
+        db_file = sacct_cache_file()
+
+    if options.simulate and not db_file.exists():
+        return run_sacct()
+
+    if update and not options.simulate:
+        if shutil.which("sacct") is None:
+            log.warning("No job info available since sacct command is not available")
+        else:
+            update_sacct_cache(db_file)
+
+    output = StringIO()
+    if not db_file.exists():
+        return output
+
+    with open_sacct_cache(db_file, read_only=options.simulate) as cursor:
+        cursor.execute(f"SELECT {', '.join(FORMAT_SLURM)} FROM jobs ORDER BY rowid")
+        csv.writer(output, lineterminator="\n").writerows(cursor.fetchall())
+
+    output.seek(0)
+    return output
+
+
+def get_sacct_output(sacct_output: StringIO) -> "pd.DataFrame":
     """
     Fetch the information of jobs in the queue using the sacct SLURM output
     and store it in a pandas dataframe.
@@ -684,6 +1267,8 @@ def get_sacct_output(sacct_output: StringIO) -> pd.DataFrame:
     -------
     queue_list: pd.DataFrame
     """
+    import pandas as pd
+
     sacct_output = pd.read_csv(sacct_output, names=FORMAT_SLURM)
 
     # Keep only the jobs corresponding to OSA sequences
@@ -702,7 +1287,7 @@ def get_sacct_output(sacct_output: StringIO) -> pd.DataFrame:
     return sacct_output
 
 
-def get_closer_sacct_output(sacct_output) -> pd.DataFrame:
+def get_closer_sacct_output(sacct_output) -> "pd.DataFrame":
     """
     Fetch the information of jobs in the queue launched by AUTOCLOSER using the sacct 
     SLURM output and store it in a pandas dataframe.
@@ -711,6 +1296,8 @@ def get_closer_sacct_output(sacct_output) -> pd.DataFrame:
     -------
     queue_list: pd.DataFrame
     """
+    import pandas as pd
+
     sacct_output = pd.read_csv(sacct_output, names=FORMAT_SLURM)
 
     # Keep only the jobs corresponding to AUTOCLOSER sequences 
@@ -733,15 +1320,105 @@ def get_closer_sacct_output(sacct_output) -> pd.DataFrame:
     return sacct_output
 
 
-def filter_jobs(job_info: pd.DataFrame, sequence_list: Iterable):
+def get_jobs_state(job_ids: Iterable[str]) -> dict:
+    """
+    Ask sacct for the state of the given jobs. For job arrays, the states
+    of all the array tasks are returned under the array job ID.
+
+    Parameters
+    ----------
+    job_ids: Iterable[str]
+        SLURM job IDs.
+
+    Returns
+    -------
+    states: dict
+        Dictionary with the job ID as key and the list of states as value.
+    """
+    sacct_cmd = [
+        "sacct",
+        "-n",
+        "-X",
+        "--parsable2",
+        "--delimiter=,",
+        "-o",
+        "JobID,State",
+        "-j",
+        ",".join(job_ids),
+    ]
+    states = {job_id: [] for job_id in job_ids}
+    for line in sp.check_output(sacct_cmd, text=True).splitlines():
+        job_id, state = line.split(",")[:2]
+        states.setdefault(job_id.split("_")[0], []).append(state.split()[0])
+
+    return states
+
+
+def wait_for_jobs(job_ids: Iterable[str], timeout: int = None) -> bool:
+    """
+    Wait until the given SLURM jobs have finished, checking their state
+    with an exponential backoff instead of a fixed polling interval.
+
+    The waiting stops as soon as one of the jobs does not finish correctly.
+
+    Parameters
+    ----------
+    job_ids: Iterable[str]
+        SLURM job IDs to wait for.
+    timeout: int
+        Maximum time in seconds to wait for the jobs. By default,
+        JOB_WAIT_TIMEOUT from the SLURM section of the configuration file.
+
+    Returns
+    -------
+    bool
+        True if all jobs finished with COMPLETED state.
+    """
+    job_ids = [str(job_id) for job_id in job_ids if job_id]
+
+    if not job_ids or options.test or options.simulate or shutil.which("sacct") is None:
+        return True
+
+    wait = cfg.getint("SLURM", "JOB_POLL_MIN_WAIT", fallback=30)
+    max_wait = cfg.getint("SLURM", "JOB_POLL_MAX_WAIT", fallback=600)
+    if timeout is None:
+        timeout = cfg.getint("SLURM", "JOB_WAIT_TIMEOUT", fallback=7200)
+
+    deadline = time.monotonic() + timeout
+
+    while True:
+        states = get_jobs_state(job_ids)
+        all_states = [state for job_states in states.values() for state in job_states]
+
+        failed = set(all_states) & (JOB_FINAL_STATES - {"COMPLETED"})
+        if failed:
+            log.warning(f"Jobs {', '.join(job_ids)} did not finish correctly: {failed}")
+            return False
+
+        if all(job_states for job_states in states.values()) and set(all_states) == {"COMPLETED"}:
+            log.info(f"Jobs {', '.join(job_ids)} finished successfully")
+            return True
+
+        if time.monotonic() + wait > deadline:
+            log.warning(f"Timeout reached while waiting for jobs {', '.join(job_ids)}")
+            return False
+
+        log.debug(f"Jobs {', '.join(job_ids)} not finished yet, checking again in {wait} s")
+        time.sleep(wait)
+        wait = min(2 * wait, max_wait)
+
+
+def filter_jobs(job_info: "pd.DataFrame", sequence_list: Iterable):
     """Filter the job info list to get the values of the jobs in the current queue."""
+    import pandas as pd
+
     sequences_info = pd.DataFrame([vars(seq) for seq in sequence_list])
     # Keep the jobs in the sacct output that are present in the sequence list
     return job_info[job_info["JobName"].isin(sequences_info["jobname"])]
 
 
 def set_queue_values(
-    sacct_info: pd.DataFrame, squeue_info: pd.DataFrame, sequence_list: Iterable
+    sacct_info: "pd.DataFrame", squeue_info: "pd.DataFrame", sequence_list: Iterable
 ) -> None:
     """
     Extract job info from sacct output and
@@ -753,6 +1430,8 @@ def set_queue_values(
     squeue_info: pd.DataFrame
     sequence_list: list[Sequence object]
     """
+    import pandas as pd
+
     if sacct_info.empty and squeue_info.empty or sequence_list is None:
         return
 
@@ -780,7 +1459,7 @@ def set_queue_values(
             update_sequence_state(sequence, df_jobid_filtered)
 
 
-def update_sequence_state(sequence, filtered_job_info: pd.DataFrame) -> None:
+def update_sequence_state(sequence, filtered_job_info: "pd.DataFrame") -> None:
     """
     Update the state of the sequence based on the job info.
 
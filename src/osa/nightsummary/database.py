@@ -1,15 +1,18 @@
 """Query the TCU database source name and astronomical coordinates."""
 import logging
 from datetime import datetime
-from typing import Tuple
+from functools import lru_cache
+from typing import Iterable, Tuple
 
+import numpy as np
+from astropy.table import Table
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
 from osa.configs.config import cfg
 from osa.utils.logging import myLogger
 
-__all__ = ["query", "db_available", "get_run_info_from_TCU"]
+__all__ = ["query", "query_source_info", "db_available", "get_run_info_from_TCU"]
 
 
 log = myLogger(logging.getLogger(__name__))
@@ -18,11 +21,31 @@ log = myLogger(logging.getLogger(__name__))
 CACO_DB = cfg.get("database", "caco_db")
 TCU_DB = cfg.get("database", "tcu_db")
 
+# Time to wait for the database servers before raising a ConnectionFailure
+SERVER_SELECTION_TIMEOUT_MS = 3000
+
+# TCU properties with the source name and coordinates of each run
+SOURCE_PROPERTIES = {
+    "DriveControl_SourceName": "source_name",
+    "DriveControl_RA_Target": "source_ra",
+    "DriveControl_Dec_Target": "source_dec",
+}
+
+
+@lru_cache(maxsize=1)
+def get_clients() -> Tuple[MongoClient, MongoClient]:
+    """
+    Return the CaCo and TCU database clients. They are created only once per process,
+    so that all the queries share their pool of connections.
+    """
+    caco_client = MongoClient(CACO_DB, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+    tcu_client = MongoClient(TCU_DB, serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS)
+    return caco_client, tcu_client
+
 
 def db_available():
     """Check the connection to the TCU database."""
-    caco_client = MongoClient(CACO_DB, serverSelectionTimeoutMS=3000)
-    tcu_client = MongoClient(TCU_DB, serverSelectionTimeoutMS=3000)
+    caco_client, tcu_client = get_clients()
     try:
         caco_client.server_info()
         tcu_client.server_info()
@@ -34,6 +57,113 @@ def db_available():
         return True
 
 
+def get_run_time_windows(caco_client: MongoClient, run_ids: Iterable[int]) -> dict:
+    """Return the start and stop times of the given runs in a single query to CaCo."""
+    run_info = caco_client["CACO"]["RUN_INFORMATION"]
+    runs = run_info.find(
+        {"run_number": {"$in": list(run_ids)}},
+        {"run_number": 1, "start_time": 1, "stop_time": 1},
+    )
+
+    time_windows = {}
+    for run in runs:
+        try:
+            start = datetime.fromisoformat(run["start_time"].replace("Z", ""))
+            end = datetime.fromisoformat(run["stop_time"].replace("Z", ""))
+        except (KeyError, TypeError, AttributeError):
+            continue
+        time_windows[run["run_number"]] = (start, end)
+
+    return time_windows
+
+
+def query_source_info(run_ids: Iterable[int]) -> Table:
+    """
+    Query the source name and coordinates of a list of runs from TCU database.
+
+    Instead of querying each property of each run separately, the time windows of all
+    the runs, the property descriptors and the chunks with their values are fetched
+    with one query each, reusing the pooled database clients.
+
+    Parameters
+    ----------
+    run_ids : Iterable[int]
+        Run numbers
+
+    Returns
+    -------
+    source_info : astropy.table.Table
+        Table with columns run_id, source_name, source_ra and source_dec including
+        only the runs for which a source name was found.
+
+    Raises
+    ------
+    ConnectionFailure
+    """
+    # Avoid problems with numpy int64 encoding in MongoDB
+    run_ids = [int(run_id) for run_id in run_ids]
+
+    source_info = Table(
+        names=["run_id", "source_name", "source_ra", "source_dec"],
+        dtype=["int32", str, "float64", "float64"],
+    )
+
+    if not run_ids:
+        return source_info
+
+    caco_client, tcu_client = get_clients()
+    time_windows = get_run_time_windows(caco_client, run_ids)
+
+    if not time_windows:
+        return source_info
+
+    bridges_monitoring = tcu_client["bridgesmonitoring"]
+    descriptors = bridges_monitoring["properties"].find(
+        {"property_name": {"$in": list(SOURCE_PROPERTIES)}},
+        {"property_name": 1},
+    )
+    property_names = {
+        descriptor["_id"]: SOURCE_PROPERTIES[descriptor["property_name"]]
+        for descriptor in descriptors
+    }
+
+    chunks = bridges_monitoring["chunks"].find(
+        {
+            "pid": {"$in": list(property_names)},
+            "$or": [
+                {"begin": {"$gte": start}, "end": {"$lte": end}}
+                for start, end in time_windows.values()
+            ],
+        },
+        {"pid": 1, "begin": 1, "end": 1, "values": {"$slice": 1}},
+    ).sort("begin", 1)
+
+    # Keep the first value of each property within the time window of each run
+    values = {run_id: {} for run_id in time_windows}
+    for chunk in chunks:
+        if not chunk["values"]:
+            continue
+        property_name = property_names[chunk["pid"]]
+        for run_id, (start, end) in time_windows.items():
+            if start <= chunk["begin"] and chunk["end"] <= end:
+                values[run_id].setdefault(property_name, chunk["values"][0]["val"])
+
+    for run_id in run_ids:
+        run_values = values.get(run_id, {})
+        if run_values.get("source_name") in (None, ""):
+            continue
+        source_info.add_row(
+            [
+                run_id,
+                run_values["source_name"],
+                run_values.get("source_ra", np.nan),
+                run_values.get("source_dec", np.nan),
+            ]
+        )
+
+    return source_info
+
+
 def query(obs_id: int, property_name: str):
     """
     Query the source name and coordinates from TCU database.
@@ -60,46 +190,44 @@ def query(obs_id: int, property_name: str):
     if not isinstance(obs_id, int):
         obs_id = int(obs_id)
 
-    caco_client = MongoClient(CACO_DB)
-    tcu_client = MongoClient(TCU_DB)
+    caco_client, tcu_client = get_clients()
 
-    with caco_client, tcu_client:
-        run_info = caco_client["CACO"]["RUN_INFORMATION"]
-        run = run_info.find_one({"run_number": obs_id})
+    run_info = caco_client["CACO"]["RUN_INFORMATION"]
+    run = run_info.find_one({"run_number": obs_id})
 
-        try:
-            start = datetime.fromisoformat(run["start_time"].replace("Z", ""))
-            end = datetime.fromisoformat(run["stop_time"].replace("Z", ""))
-        except TypeError:
-            return None
-
-        bridges_monitoring = tcu_client["bridgesmonitoring"]
-        property_collection = bridges_monitoring["properties"]
-        chunk_collection = bridges_monitoring["chunks"]
-        descriptors = property_collection.find(
-            {"property_name": property_name},
-        )
+    try:
+        start = datetime.fromisoformat(run["start_time"].replace("Z", ""))
+        end = datetime.fromisoformat(run["stop_time"].replace("Z", ""))
+    except TypeError:
+        return None
+
+    bridges_monitoring = tcu_client["bridgesmonitoring"]
+    property_collection = bridges_monitoring["properties"]
+    chunk_collection = bridges_monitoring["chunks"]
+    descriptors = property_collection.find(
+        {"property_name": property_name},
+    )
 
-        entries = {"name": property_name, "time": [], "value": []}
+    entries = {"name": property_name, "time": [], "value": []}
 
-        for descriptor in descriptors:
-            query_property = {"pid": descriptor["_id"]}
+    for descriptor in descriptors:
+        query_property = {"pid": descriptor["_id"]}
 
-            if start is not None:
-                query_property["begin"] = {"$gte": start}
+        if start is not None:
+            query_property["begin"] = {"$gte": start}
 
-            if end is not None:
-                query_property["end"] = {"$lte": end}
+        if end is not None:
+            query_property["end"] = {"$lte": end}
 
-            chunks = chunk_collection.find(query_property)
+        chunks = chunk_collection.find(query_property)
 
-            for chunk in chunks:
-                for value in chunk["values"]:
-                    entries["time"].append(value["t"])
-                    entries["value"].append(value["val"])
+        for chunk in chunks:
+            for value in chunk["values"]:
+                entries["time"].append(value["t"])
+                entries["value"].append(value["val"])
 
-                    source_name = entries["value"][0]
-                    return source_name if source_name != "" else None
+                source_name = entries["value"][0]
+                return source_name if source_name != "" else None
 
 
 def get_run_info_from_TCU(run_id: int, tcu_server: str) -> Tuple:
@@ -5,11 +5,10 @@ import itertools
 import logging
 import sys
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 from typing import List
 
-import numpy as np
 from astropy.table import Table
 
 from osa.configs import options
@@ -22,7 +21,7 @@ from osa.configs.datamodel import (
 from osa.configs.datamodel import Sequence
 from osa.job import sequence_filenames
 from osa.nightsummary import database
-from osa.nightsummary.nightsummary import run_summary_table
+from osa.nightsummary.nightsummary import run_summary_table, last_run_of_type
 from osa.paths import sequence_calibration_files, get_run_date
 from osa.utils.logging import myLogger
 from osa.utils.utils import date_to_iso, date_to_dir
@@ -45,39 +44,25 @@ def get_data_runs(date: datetime):
 
 def get_last_drs4(date: datetime) -> int:
     """Return run_id of the last DRS4 run for the given date to be used for data processing."""
-    summary = run_summary_table(date)
-    n_max = 4
-    n = 1
-    while (np.array(summary["run_type"] == "DRS4")).any() == False & n <= n_max:
-        date = date - timedelta(days=1)
-        summary = run_summary_table(date)
-        n += 1
-
-    try:
-        return summary[summary["run_type"] == "DRS4"]["run_id"].max()
+    run_id = last_run_of_type("DRS4", date)
 
-    except ValueError:
+    if run_id is None:
         log.warning("No DRS4 run found. Nothing to do. Exiting.")
         sys.exit(0)
 
+    return run_id
+
 
 def get_last_pedcalib(date) -> int:
     """Return run_id of the last PEDCALIB run for the given date to be used for data processing."""
-    summary = run_summary_table(date)
-    n_max = 4
-    n = 1
-    while (np.array(summary["run_type"] == "PEDCALIB")).any() == False & n <= n_max:
-        date = date - timedelta(days=1)
-        summary = run_summary_table(date)
-        n += 1
+    run_id = last_run_of_type("PEDCALIB", date)
 
-    try:
-        return summary[summary["run_type"] == "PEDCALIB"]["run_id"].max()
-
-    except ValueError:
+    if run_id is None:
         log.warning("No PEDCALIB run found. Nothing to do. Exiting.")
         sys.exit(0)
 
+    return run_id
+
 
 def extract_runs(summary_table):
     """
@@ -165,36 +150,21 @@ def extract_runs(summary_table):
                 run.source_dec = source_catalog.loc[run_id]["source_dec"]
 
     elif database.db_available():
-        run_table = Table(
-            names=["run_id", "source_name", "source_ra", "source_dec"],
-            dtype=["int32", str, "float64", "float64"],
-        )
-        for run in run_list:
-            # Make sure we are looking at actual data runs. Avoid test runs.
-            if run.run > 0 and run.type == "DATA":
-                log.debug(f"Looking info in TCU DB for run {run.run}")
-                run.source_name = database.query(
-                    obs_id=run.run, property_name="DriveControl_SourceName"
-                )
-                run.source_ra = database.query(
-                    obs_id=run.run, property_name="DriveControl_RA_Target"
-                    )
-                run.source_dec = database.query(
-                    obs_id=run.run, property_name="DriveControl_Dec_Target"
-                    )
-                # Store this source information (run_id, source_name, source_ra, source_dec)
-                # into an astropy Table and save to disk in RunCatalog files. In this way, the
-                # information can be dumped anytime later more easily than accessing the
-                # TCU database.
-                if run.source_name is not None:
-                    line = [
-                        run.run,
-                        run.source_name,
-                        run.source_ra,
-                        run.source_dec,
-                    ]
-                    log.debug(f"Adding line with source info to RunCatalog: {line}")
-                    run_table.add_row(line)
+        # Make sure we are looking at actual data runs. Avoid test runs.
+        data_runs = {run.run: run for run in run_list if run.run > 0 and run.type == "DATA"}
+        log.debug(f"Looking info in TCU DB for runs {list(data_runs)}")
+
+        # Store this source information (run_id, source_name, source_ra, source_dec)
+        # into an astropy Table and save to disk in RunCatalog files. In this way, the
+        # information can be dumped anytime later more easily than accessing the
+        # TCU database.
+        run_table = database.query_source_info(data_runs)
+
+        for row in run_table:
+            run = data_runs[row["run_id"]]
+            run.source_name = str(row["source_name"])
+            run.source_ra = float(row["source_ra"])
+            run.source_dec = float(row["source_dec"])
 
         # Save table to disk
         run_table.write(source_catalog_file, overwrite=True, delimiter=",")
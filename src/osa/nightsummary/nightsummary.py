@@ -2,6 +2,7 @@
 
 import logging
 import subprocess
+from datetime import timedelta
 from pathlib import Path
 
 from astropy.table import Table
@@ -10,11 +11,19 @@ from osa.configs.config import cfg
 from osa.utils.logging import myLogger
 from osa.utils.utils import date_to_dir, stringify
 
-__all__ = ["produce_run_summary_file", "get_run_summary_file", "run_summary_table"]
+__all__ = [
+    "produce_run_summary_file",
+    "get_run_summary_file",
+    "run_summary_table",
+    "last_run_of_type",
+]
 
 
 log = myLogger(logging.getLogger(__name__))
 
+# Parsed run summary tables keyed by file path: (mtime, table, last run_id of each run type)
+_RUN_SUMMARY_CACHE = {}
+
 
 def produce_run_summary_file(date) -> None:
     """
@@ -74,9 +83,65 @@ def run_summary_table(date) -> Table:
         log.info(f"Run summary file {night_summary_file} not found. Producing it.")
         produce_run_summary_file(date)
 
-    table = Table.read(night_summary_file)
-    table.add_index(["run_id"])
-    return table
+    return load_run_summary(night_summary_file)[0].copy()
+
+
+def load_run_summary(night_summary_file: Path):
+    """
+    Read and index a run summary file only once per process, reading
+    it again if the file was modified since it was last read.
+
+    Returns
+    -------
+    table : astropy.Table
+        Cached table. It must not be modified in place.
+    last_runs : dict
+        Last run_id of each run type in the table.
+    """
+    mtime = night_summary_file.stat().st_mtime_ns
+    cached = _RUN_SUMMARY_CACHE.get(night_summary_file)
+
+    if cached is None or cached[0] != mtime:
+        table = Table.read(night_summary_file)
+        table.add_index(["run_id"])
+        last_runs = {
+            str(run_type): int(table["run_id"][table["run_type"] == run_type].max())
+            for run_type in set(table["run_type"])
+        }
+        cached = (mtime, table, last_runs)
+        _RUN_SUMMARY_CACHE[night_summary_file] = cached
+
+    return cached[1], cached[2]
+
+
+def last_run_of_type(run_type: str, date, max_days: int = 4):
+    """
+    Return the last run of a given type (e.g. DRS4 or PEDCALIB) taken on
+    the given date or, if there is none, on the closest previous date.
+
+    Parameters
+    ----------
+    run_type : str
+    date : datetime.datetime
+    max_days : int
+        Maximum number of days to look back.
+
+    Returns
+    -------
+    run_id : int or None
+        None if no run of this type was found.
+    """
+    for day in range(max_days + 1):
+        night = date - timedelta(days=day)
+        night_summary_file = get_run_summary_file(night)
+        if not night_summary_file.exists():
+            produce_run_summary_file(night)
+
+        _, last_runs = load_run_summary(night_summary_file)
+        if run_type in last_runs:
+            return last_runs[run_type]
+
+    return None
 
 
 def get_run_summary_file(date) -> Path:
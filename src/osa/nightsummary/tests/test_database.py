@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 import pytest
 from pymongo.errors import ConnectionFailure
 
@@ -7,3 +9,56 @@ def test_query():
 
     with pytest.raises(ConnectionFailure):
         database.query(obs_id=1616, property_name="DriveControl_SourceName")
+
+
+def test_query_source_info(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    from osa.nightsummary import database
+
+    caco_client = mongomock.MongoClient()
+    tcu_client = mongomock.MongoClient()
+    monkeypatch.setattr(database, "get_clients", lambda: (caco_client, tcu_client))
+
+    caco_client["CACO"]["RUN_INFORMATION"].insert_many(
+        [
+            {
+                "run_number": 1807,
+                "start_time": "2020-01-17T22:00:00Z",
+                "stop_time": "2020-01-17T22:20:00Z",
+            },
+            {
+                "run_number": 1808,
+                "start_time": "2020-01-17T22:30:00Z",
+                "stop_time": "2020-01-17T22:50:00Z",
+            },
+        ]
+    )
+    bridges_monitoring = tcu_client["bridgesmonitoring"]
+    bridges_monitoring["properties"].insert_many(
+        [
+            {"_id": 1, "property_name": "DriveControl_SourceName"},
+            {"_id": 2, "property_name": "DriveControl_RA_Target"},
+            {"_id": 3, "property_name": "DriveControl_Dec_Target"},
+        ]
+    )
+    values = {
+        datetime(2020, 1, 17, 22, 1): ("Crab", 83.63, 22.01),
+        datetime(2020, 1, 17, 22, 31): ("MadeUpSource", 110.0, 70.0),
+    }
+    for begin, run_values in values.items():
+        for pid, value in zip((1, 2, 3), run_values):
+            bridges_monitoring["chunks"].insert_one(
+                {
+                    "pid": pid,
+                    "begin": begin,
+                    "end": begin + timedelta(minutes=10),
+                    "values": [{"t": begin, "val": value}],
+                }
+            )
+
+    source_info = database.query_source_info([1807, 1808, 1809])
+
+    assert source_info["run_id"].tolist() == [1807, 1808]
+    assert source_info["source_name"].tolist() == ["Crab", "MadeUpSource"]
+    assert source_info["source_ra"].tolist() == [83.63, 110.0]
+    assert source_info["source_dec"].tolist() == [22.01, 70.0]
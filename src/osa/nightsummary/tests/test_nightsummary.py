@@ -29,3 +29,28 @@ def test_produce_run_summary_file():
     produce_run_summary_file(date)
     summary_file = Path(cfg.get("LST1", "RUN_SUMMARY_DIR")) / "RunSummary_20200101.ecsv"
     assert summary_file.exists()
+
+
+def test_run_summary_table_cache(run_summary_file, monkeypatch):
+    import osa.nightsummary.nightsummary
+    from osa.nightsummary.nightsummary import run_summary_table
+
+    date = datetime.fromisoformat("2020-01-17")
+    summary = run_summary_table(date)
+
+    def table_read(*args, **kwargs):
+        raise AssertionError("The run summary should not be parsed again")
+
+    monkeypatch.setattr(osa.nightsummary.nightsummary.Table, "read", table_read)
+    cached_summary = run_summary_table(date)
+    assert cached_summary is not summary
+    assert cached_summary.loc[1808]["n_subruns"] == summary.loc[1808]["n_subruns"]
+
+
+def test_last_run_of_type(run_summary_file):
+    from osa.nightsummary.nightsummary import last_run_of_type
+
+    date = datetime.fromisoformat("2020-01-17")
+    assert last_run_of_type("DRS4", date) == 1804
+    assert last_run_of_type("PEDCALIB", date) == 1809
+    assert last_run_of_type("DATA", date) == 1808
@@ -1,18 +1,13 @@
 """Handle the paths of the analysis products."""
 
 import logging
+import os
 import re
 from datetime import datetime
 from pathlib import Path
 from typing import List
-import subprocess
-import time
 
-import lstchain
-from astropy.table import Table
-from lstchain.onsite import (find_systematics_correction_file,
-                             find_time_calibration_file,
-                             find_filter_wheels)
+import numpy as np
 
 from osa.configs import options
 from osa.configs.config import DEFAULT_CFG, cfg
@@ -41,6 +36,7 @@ __all__ = [
     "DEFAULT_CFG",
     "create_source_directories",
     "analysis_path",
+    "scan_output_files",
 ]
 
 
@@ -48,6 +44,15 @@ DATACHECK_WEB_BASEDIR = Path(cfg.get("WEBSERVER", "DATACHECK"))
 CALIB_BASEDIR = Path(cfg.get("LST1", "CALIB_DIR"))
 DRS4_PEDESTAL_BASEDIR = Path(cfg.get("LST1", "PEDESTAL_DIR"))
 
+# Run dates of the merged run summaries file, keyed by the file path: (mtime, index)
+_RUN_DATE_INDEX_CACHE = {}
+
+# Subrun-wise (and run-wise) output files produced in the running_analysis directory
+OUTPUT_FILE_RE = re.compile(
+    r"^(?P<prefix>dl1|dl2|muons|datacheck_dl1|interleaved)_LST-1\.Run(?P<run>\d{5})"
+    r"(?:\.(?P<subrun>\d{4}))?\.(?P<extension>h5|hdf5|hdf|fits)$"
+)
+
 
 def analysis_path(tel) -> Path:
     """
@@ -72,18 +77,67 @@ def analysis_path(tel) -> Path:
     return directory
 
 
+def read_run_date_index(merged_run_summaries_file: Path) -> dict:
+    """
+    Build the run_id -> date (YYYY-MM-DD) index of the merged run summaries file.
+
+    If MERGED_SUMMARY_INDEX is set in the configuration file, the index is read from
+    that binary (.npz) file as long as it is newer than the merged run summaries file,
+    and written to it otherwise.
+    """
+    index_file = cfg.get("LST1", "MERGED_SUMMARY_INDEX", fallback=None)
+    index_file = Path(index_file) if index_file else None
+    summary_mtime = merged_run_summaries_file.stat().st_mtime_ns
+
+    if index_file is not None and index_file.exists():
+        with np.load(index_file) as index:
+            if int(index["summary_mtime"]) == summary_mtime:
+                log.debug(f"Reading run dates from {index_file}")
+                return dict(zip(index["run_id"].tolist(), index["date"].tolist()))
+
+    from astropy.table import Table
+
+    summary_table = Table.read(merged_run_summaries_file)
+    run_ids = np.asarray(summary_table["run_id"], dtype=np.int64)
+    dates = np.asarray(summary_table["date"], dtype="U10")
+
+    if index_file is not None:
+        try:
+            # Write to a temporary file and rename it to avoid partial reads
+            tmp_file = index_file.with_name(f".{index_file.name}.{os.getpid()}.npz")
+            np.savez(tmp_file, run_id=run_ids, date=dates, summary_mtime=summary_mtime)
+            os.replace(tmp_file, index_file)
+        except OSError as error:
+            log.debug(f"Run date index file {index_file} could not be written: {error}")
+
+    return dict(zip(run_ids.tolist(), dates.tolist()))
+
+
+def get_run_date_index() -> dict:
+    """
+    Return the run_id -> date index of the merged run summaries file. It is
+    loaded only once per process and reloaded if the file is modified.
+    """
+    merged_run_summaries_file = Path(cfg.get("LST1", "MERGED_SUMMARY"))
+    mtime = merged_run_summaries_file.stat().st_mtime_ns
+    cached = _RUN_DATE_INDEX_CACHE.get(merged_run_summaries_file)
+
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, read_run_date_index(merged_run_summaries_file))
+        _RUN_DATE_INDEX_CACHE[merged_run_summaries_file] = cached
+
+    return cached[1]
+
+
 def get_run_date(run_id: int) -> datetime:
     """
     Return the date (YYYYMMDD) when the given run was taken. The search for this date
     is done by looking at the date corresponding to each run in the merged run summaries
     file.
     """
-    merged_run_summaries_file = cfg.get("LST1", "MERGED_SUMMARY")
-    summary_table = Table.read(merged_run_summaries_file)
-
     try:
-        date_string = summary_table[summary_table["run_id"] == run_id]["date"][0]
-    except IndexError:
+        date_string = get_run_date_index()[run_id]
+    except KeyError:
         log.warning(
             f"Run {run_id} is not in the summary table. "
             f"Assuming the date of the run is {options.date}."
@@ -106,7 +160,7 @@ def get_drs4_pedestal_filename(run_id: int, prod_id: str) -> Path:
     return (
         DRS4_PEDESTAL_BASEDIR
         / date
-        / f"v{lstchain.__version__}/drs4_pedestal.Run{run_id:05d}.0000.h5"
+        / f"{utils.get_lstchain_version()}/drs4_pedestal.Run{run_id:05d}.0000.h5"
     ).resolve()
 
 
@@ -141,6 +195,8 @@ def get_calibration_filename(run_id: int, prod_id: str) -> Path:
         options.filters = 52
 
     else:
+        from lstchain.onsite import find_filter_wheels
+
         mongodb = cfg.get("database", "caco_db")
         try:
             # Cast run_id to int to avoid problems with numpy int64 encoding in MongoDB
@@ -152,7 +208,7 @@ def get_calibration_filename(run_id: int, prod_id: str) -> Path:
     return (
         CALIB_BASEDIR
         / date
-        / f"v{lstchain.__version__}/calibration_filters_{options.filters}.Run{run_id:05d}.0000.h5"
+        / f"{utils.get_lstchain_version()}/calibration_filters_{options.filters}.Run{run_id:05d}.0000.h5"
     ).resolve()
 
 
@@ -234,6 +290,8 @@ def get_pedestal_ids_file(run_id: int, date: str) -> Path:
 
 def sequence_calibration_files(sequence_list: List[Sequence]) -> None:
     """Build names of the calibration files for each sequence in the list."""
+    from lstchain.onsite import find_systematics_correction_file, find_time_calibration_file
+
     flat_date = utils.date_to_dir(options.date)
     base_dir = Path(cfg.get("LST1", "BASE"))
     prod_id = options.prod_id
@@ -343,6 +401,78 @@ def destination_dir(concept: str, create_dir: bool = True) -> Path:
     return directory
 
 
+def get_output_file_concept(prefix: str, extension: str, parent_dir: str):
+    """
+    Return the concept (DL1, DL1AB, DATACHECK, MUON, INTERLEAVED or DL2) of an
+    output file given its prefix, extension and parent directory relative to
+    the analysis directory ("" for the files in the analysis directory itself).
+    """
+    if prefix == "muons":
+        return "MUON" if extension == "fits" else None
+    if extension == "fits":
+        return None
+    if prefix == "dl1":
+        if parent_dir == options.dl1_prod_id:
+            return "DL1AB"
+        return "DL1" if parent_dir == "" else None
+    if prefix == "dl2":
+        return "DL2" if parent_dir == options.dl2_prod_id else None
+    if prefix == "datacheck_dl1":
+        return "DATACHECK" if parent_dir == options.dl1_prod_id else None
+    return "INTERLEAVED"
+
+
+def scan_output_files(directory: Path) -> dict:
+    """
+    Build an index of the output files found in a given directory
+    (usually running_analysis) walking it only once with os.scandir.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory to be scanned recursively. Symlinked directories are not followed.
+
+    Returns
+    -------
+    file_index : dict
+        Dictionary with (concept, run, subrun) as keys and the file paths as values.
+        Subrun is None for run-wise files. If several files have the same key, only
+        the first one found is kept.
+    """
+    file_index = {}
+    directories = [""]
+
+    while directories:
+        relative_dir = directories.pop()
+        try:
+            entries = list(os.scandir(Path(directory) / relative_dir))
+        except FileNotFoundError:
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append(os.path.join(relative_dir, entry.name))
+                continue
+
+            if not (match := OUTPUT_FILE_RE.match(entry.name)):
+                continue
+
+            concept = get_output_file_concept(
+                match.group("prefix"), match.group("extension"), relative_dir
+            )
+            if concept is None:
+                continue
+
+            subrun = int(match.group("subrun")) if match.group("subrun") else None
+            key = (concept, int(match.group("run")), subrun)
+            if key in file_index:
+                log.warning(f"{entry.path} ignored: same (concept, run, subrun) {key} as {file_index[key]}")
+                continue
+            file_index[key] = Path(entry.path)
+
+    return file_index
+
+
 def create_source_directories(source_list: list, cuts_dir: Path):
     """Create a subdirectory for each source."""
     for source in source_list:
@@ -364,22 +494,14 @@ def get_latest_version_file(longterm_files: List[str]) -> Path:
 def is_job_completed(job_id: str):
     """
     Check whether SLURM job `job_id` has finished.
-    
-    It keeps checking every 10 minutes for one our.
+
+    It keeps checking the state of the job with an exponential
+    backoff until it finishes or the waiting timeout is reached.
     """
-    n_max = 10
-    n = 0
-    while n < n_max:
-        # Check if the status of the SLURM job is "COMPLETED"
-        status = subprocess.run(["sacct", "--format=state", "--jobs", job_id], capture_output=True, text=True)
-        if "COMPLETED" in status.stdout:
-            log.debug(f"Job {job_id} finished successfully!")
-            return True
-        n += 1
-        log.debug(f"Job {job_id} is not completed yet, checking again in 10 minutes...")
-        time.sleep(600)  # wait 10 minutes to check again
-    log.info(f"The maximum number of checks of job {job_id} was reached, job {job_id} did not finish succesfully yet.")
-    return False
+    # Imported here to avoid a circular import with osa.job
+    from osa.job import wait_for_jobs
+
+    return wait_for_jobs([job_id])
 
 
 def create_longterm_symlink(cherenkov_job_id: str = None):
@@ -1,17 +1,20 @@
 """Provenance capture functions."""
 
+import atexit
 import datetime
 import hashlib
 import logging
 import logging.config
 import os
 import platform
+import queue
 import sys
+import threading
 import uuid
 from functools import wraps
+from importlib.metadata import distributions
 from pathlib import Path
 
-import pkg_resources
 import psutil
 import yaml
 
@@ -24,8 +27,9 @@ from osa.provenance.utils import get_log_config, parse_variables
 #    get_info_version,
 # )
 
-__all__ = ["trace", "get_file_hash", "get_activity_id"]
+__all__ = ["trace", "get_file_hash", "get_activity_id", "ProvenanceWriter"]
 
+from osa.utils.iofile import append_in_single_write
 from osa.utils.logging import myLogger
 
 _interesting_env_vars = [
@@ -54,24 +58,96 @@ PROV_PREFIX = provconfig["PREFIX"]
 SUPPORTED_HASH_METHOD = ["md5"]
 SUPPORTED_HASH_BUFFER = ["content", "path"]
 REDUCTION_TASKS = ["r0_to_dl1", "dl1ab", "dl1_datacheck", "dl1_to_dl2"]
+PROV_FORMATTER = logging.Formatter(
+    provconfig["formatters"]["simple"]["format"], provconfig["formatters"]["simple"]["datefmt"]
+)
 
 # global variables
 traced_entities = {}
 session_name = ""
 session_tag = ""
+logging_configured = False
+# Records of the activity being traced, written all at once when it finishes
+prov_records = None
+prov_writer = None
 
 
 def setup_logging():
-    """Setup logging configuration."""
+    """Setup logging configuration, only the first time it is called."""
+    global logging_configured
+    if logging_configured:
+        return
+
     log = myLogger(logging.getLogger(__name__))
 
     try:
         logging.config.dictConfig(provconfig)
+        logging_configured = True
     except Exception as ex:
         log.warning(ex)
         log.warning("Failed to set up the logger.")
 
 
+class ProvenanceWriter:
+    """
+    Writer of the provenance records into the provenance log file. Each batch
+    of records (e.g. those of an activity) is appended at once with
+    `osa.utils.iofile.append_in_single_write`. Optionally, the batches are written by a background thread.
+
+    Parameters
+    ----------
+    filename: str or pathlib.Path
+        Provenance log file.
+    background: bool
+        Write the batches from a background thread, which writes
+        the pending ones when the program exits.
+    """
+
+    def __init__(self, filename, background=False):
+        self.filename = Path(filename).resolve()
+        self.queue = None
+        if background:
+            self.queue = queue.Queue()
+            self.thread = threading.Thread(target=self._run, name="ProvenanceWriter", daemon=True)
+            self.thread.start()
+            atexit.register(self.close)
+
+    def write(self, lines):
+        """Write a batch of formatted records."""
+        if not lines:
+            return
+        if self.queue is None:
+            self._append(lines)
+        else:
+            self.queue.put(list(lines))
+
+    def close(self):
+        """Wait for the background thread to write the pending batches."""
+        if self.queue is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    def _append(self, lines):
+        append_in_single_write(self.filename, "".join(lines))
+
+    def _run(self):
+        while (lines := self.queue.get()) is not None:
+            try:
+                self._append(lines)
+            except OSError as error:
+                logger.warning(f"Could not write the provenance records: {error}")
+
+
+def get_prov_writer():
+    """Writer of the provenance log file, created the first time it is needed."""
+    global prov_writer
+    if prov_writer is None:
+        prov_writer = ProvenanceWriter(
+            LOG_FILENAME, background=provconfig.get("BACKGROUND_WRITER", False)
+        )
+    return prov_writer
+
+
 # def provenance(cls):
 #     """A function decorator which decorates the methods of a class with trace function."""
 #
@@ -84,10 +160,10 @@ def setup_logging():
 
 def trace(func):
     """Trace and capture provenance info inside a method /function."""
-    setup_logging()
 
     @wraps(func)
     def wrapper(*args, **kwargs):
+        setup_logging()
 
         activity = func.__name__
         activity_id = get_activity_id()
@@ -123,16 +199,22 @@ def trace(func):
         if not log_is_active(class_instance, activity):
             return result
         # provenance logging only if activity ends properly
-        session_id = log_session(class_instance, start)
-        for log_record in derivation_records:
-            log_prov_info(log_record)
-        log_start_activity(activity, activity_id, session_id, start)
-        for log_record in parameter_records:
-            log_prov_info(log_record)
-        for log_record in usage_records:
-            log_prov_info(log_record)
-        log_generation(class_instance, activity, activity_id)
-        log_finish_activity(activity_id, end)
+        global prov_records
+        prov_records = []
+        try:
+            session_id = log_session(class_instance, start)
+            for log_record in derivation_records:
+                log_prov_info(log_record)
+            log_start_activity(activity, activity_id, session_id, start)
+            for log_record in parameter_records:
+                log_prov_info(log_record)
+            for log_record in usage_records:
+                log_prov_info(log_record)
+            log_generation(class_instance, activity, activity_id)
+            log_finish_activity(activity_id, end)
+            get_prov_writer().write(prov_records)
+        finally:
+            prov_records = None
         return result
 
     return wrapper
@@ -331,19 +413,36 @@ def get_item_properties(nested, item):
 
 def get_python_packages():
     """Return the collection of dependencies available for importing."""
-    return [
-        {"name": p.project_name, "version": p.version, "path": p.module_path}
-        for p in sorted(pkg_resources.working_set, key=lambda p: p.project_name)
-    ]
+    packages = {}
+    for dist in distributions():
+        name = dist.metadata["Name"]
+        # Keep the first one found in the path, as it is the one imported
+        if name and name not in packages:
+            packages[name] = {
+                "name": name,
+                "version": dist.version,
+                "path": str(dist.locate_file("")),
+            }
+    return sorted(packages.values(), key=lambda p: p["name"])
 
 
 def log_prov_info(prov_dict):
-    """Write a dictionary to the logger."""
+    """
+    Write a dictionary to the provenance log file, in the same format as the
+    provenance logger. Within a traced activity, the record is kept until all
+    the records of the activity are written at once.
+    """
     # OSA specific session tag used in merging prov from parallel sessions
     prov_dict["session_tag"] = session_tag
     #
     record_date = datetime.datetime.now().isoformat()
-    logger.info(f"{PROV_PREFIX}{record_date}{PROV_PREFIX}{prov_dict}")
+    message = f"{PROV_PREFIX}{record_date}{PROV_PREFIX}{prov_dict}"
+    record = logger.makeRecord(logger.name, logging.INFO, __file__, 0, message, None, None)
+    line = f"{PROV_FORMATTER.format(record)}\n"
+    if prov_records is None:
+        get_prov_writer().write([line])
+    else:
+        prov_records.append(line)
 
 
 def log_session(class_instance, start):
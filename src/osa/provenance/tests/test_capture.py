@@ -0,0 +1,24 @@
+from osa.provenance.capture import ProvenanceWriter
+
+
+def test_provenance_writer(tmp_path):
+    prov_file = tmp_path / "prov.log"
+    prov_file.write_text("INFO provLogger first\n")
+
+    writer = ProvenanceWriter(prov_file)
+    writer.write(["INFO provLogger second\n", "INFO provLogger third\n"])
+    writer.write([])
+    assert prov_file.read_text().splitlines() == [
+        "INFO provLogger first",
+        "INFO provLogger second",
+        "INFO provLogger third",
+    ]
+
+    # Batches written in order by the background thread
+    background_writer = ProvenanceWriter(prov_file, background=True)
+    for i in range(100):
+        background_writer.write([f"INFO provLogger {i}\n", f"INFO provLogger {i}\n"])
+    background_writer.close()
+    lines = prov_file.read_text().splitlines()
+    assert len(lines) == 203
+    assert lines[3:] == [f"INFO provLogger {i // 2}" for i in range(200)]
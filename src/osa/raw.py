@@ -1,4 +1,6 @@
 import logging
+import os
+import re
 from datetime import datetime
 from pathlib import Path
 
@@ -9,7 +11,23 @@ from osa.utils.utils import date_to_dir
 
 log = myLogger(logging.getLogger(__name__))
 
-__all__ = ["get_check_raw_dir", "get_raw_dir", "is_raw_data_available"]
+__all__ = [
+    "get_check_raw_dir",
+    "get_raw_dir",
+    "is_raw_data_available",
+    "r0_inventory",
+    "incomplete_subruns",
+    "missing_runs",
+]
+
+# Name of the R0 (and gain selected R0G) files, e.g. LST-1.1.Run01807.0000.fits.fz
+R0_FILENAME = re.compile(r"^LST-1\.(?P<stream>\d)\.Run(?P<run>\d{5})\.(?P<subrun>\d{4})\.fits\.fz$")
+
+# Columns of the R0 file inventory table
+INVENTORY_COLUMNS = ["run", "subrun", "stream", "size", "path"]
+
+# Number of streams (files) of a complete R0 subrun
+N_STREAMS = 4
 
 
 def get_check_raw_dir(date: datetime) -> Path:
@@ -20,10 +38,10 @@ def get_check_raw_dir(date: datetime) -> Path:
     if not raw_dir.exists():
         raise IOError(f"Raw directory {raw_dir} does not exist")
 
-    # check that it contains raw files
-    files = raw_dir.glob("*.fits.fz")
-    if not files:
-        raise IOError(f"Empty raw directory {raw_dir}")
+    # check that it contains raw files, stopping at the first one
+    with os.scandir(raw_dir) as entries:
+        if not any(R0_FILENAME.match(entry.name) for entry in entries):
+            raise IOError(f"Empty raw directory {raw_dir}")
 
     return raw_dir
 
@@ -45,3 +63,62 @@ def is_raw_data_available(date: datetime) -> bool:
     else:
         answer = True
     return answer
+
+
+def r0_inventory(directory: Path):
+    """
+    Table of the R0 (or R0G) files of a directory built in a single scan of it.
+
+    Parameters
+    ----------
+    directory: pathlib.Path
+        R0 or R0G directory of a night.
+
+    Returns
+    -------
+    inventory: pandas.DataFrame
+        Run, subrun, stream, size (in bytes) and path of each file,
+        sorted by run, subrun and stream. Empty if the directory does not exist.
+    """
+    import pandas as pd
+
+    rows = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if match := R0_FILENAME.match(entry.name):
+                    rows.append(
+                        (
+                            int(match["run"]),
+                            int(match["subrun"]),
+                            int(match["stream"]),
+                            entry.stat().st_size,
+                            Path(entry.path),
+                        )
+                    )
+    except FileNotFoundError:
+        log.debug(f"Directory {directory} does not exist")
+
+    inventory = pd.DataFrame(rows, columns=INVENTORY_COLUMNS)
+    inventory = inventory.astype({"run": int, "subrun": int, "stream": int, "size": "int64"})
+    return inventory.sort_values(["run", "subrun", "stream"], ignore_index=True)
+
+
+def incomplete_subruns(inventory, n_streams: int = N_STREAMS):
+    """
+    Subruns of an R0 inventory without the files of all the streams.
+
+    Returns
+    -------
+    subruns: pandas.DataFrame
+        Run, subrun and number of streams found of each incomplete subrun.
+    """
+    streams = inventory.groupby(["run", "subrun"]).size().rename("streams").reset_index()
+    return streams[streams["streams"] != n_streams].reset_index(drop=True)
+
+
+def missing_runs(r0_files, r0g_files):
+    """Runs of the R0 inventory table without any file in the R0G one."""
+    import numpy as np
+
+    return np.setdiff1d(r0_files["run"].unique(), r0g_files["run"].unique())
@@ -1,20 +1,42 @@
 import logging
+import os
+import sqlite3
 from datetime import datetime, timezone
 from fnmatch import fnmatchcase
 from glob import glob
-from os.path import basename, getsize, join
+from os.path import basename, join
 from pathlib import Path
 
 from osa.configs import config, options
 from osa.configs.config import cfg
-from osa.raw import get_raw_dir
-from osa.utils.iofile import append_to_file
+from osa.history import history_db_file, record_history
+from osa.raw import get_raw_dir, r0_inventory
+from osa.utils.iofile import append_in_single_write, append_to_file
 from osa.utils.logging import myLogger
 from osa.utils.utils import date_to_iso
 
 log = myLogger(logging.getLogger(__name__))
 
-__all__ = ["history", "start", "finished_assignments"]
+__all__ = ["history", "stage_metrics", "start", "finished_assignments"]
+
+# Per-night table (in the log directory) of the resource usage of the analysis stages
+STAGE_METRICS_FILE = "stage_metrics.csv"
+
+# Columns of the stage metrics table, written without header line
+STAGE_METRICS_COLUMNS = [
+    "timestamp",
+    "run",
+    "stage",
+    "rc",
+    "wall_time",
+    "user_time",
+    "sys_time",
+    "max_rss",
+    "read_bytes",
+    "write_bytes",
+    "input_size",
+    "output_size",
+]
 
 
 def start(parent_tag: str):
@@ -71,13 +93,11 @@ def finished_assignments(sequence_list):
         if sequence_list is not None:
             for seq in sequence_list:
                 rawnum += seq.subruns
-        data_files = glob(
-            join(
-                rawdir,
-                f'*{cfg.get("PATTERN", "R0PREFIX")}*{cfg.get("PATTERN", "R0SUFFIX")}*',
-            )
+        raw_files = r0_inventory(rawdir)
+        data_files = raw_files["path"].map(lambda path: path.name).str.startswith(
+            cfg.get("PATTERN", "R0PREFIX")
         )
-        disk_space = sum(getsize(d) for d in data_files)
+        disk_space = raw_files.loc[data_files, "size"].sum()
         disk_space_GB_f = float(disk_space) / (1000 * 1000 * 1000)
         disk_space_GB = int(round(disk_space_GB_f, 0))
 
@@ -124,10 +144,17 @@ def history(
     history_file: Path,
     input_file=None,
     config_file=None,
+    wall_time: float = None,
+    cpu_time: float = None,
+    max_rss: int = None,
+    failure: str = None,
 ) -> None:
     """
     Appends a history line to the history file. A history line
     reports the outcome of the execution of a lstchain executable.
+    The same entry, together with the resource usage of the executable
+    and the class of its failure, is recorded in the history database of
+    the night (in the log directory next to the history file).
 
     Parameters
     ----------
@@ -145,9 +172,76 @@ def history(
         If needed, input file used for the lstchain executable
     config_file : str, optional
         Input card used for the lstchain executable.
+    wall_time : float, optional
+        Elapsed time of the lstchain executable in seconds.
+    cpu_time : float, optional
+        CPU time (user + system) of the lstchain executable in seconds.
+    max_rss : int, optional
+        Maximum resident set size of the lstchain executable in kB.
+    failure : str, optional
+        Class of the failure of the lstchain executable (transient,
+        permanent or unknown), i.e. the retry decision.
     """
     date_string = datetime.utcnow().isoformat(sep=" ", timespec="minutes")
     string_to_write = (
         f"{run} {stage} {prod_id} {date_string} " f"{input_file} {config_file} {return_code}\n"
     )
     append_to_file(history_file, string_to_write)
+
+    if options.simulate:
+        return
+
+    try:
+        record_history(
+            history_file=history_file,
+            run=run,
+            prod_id=prod_id,
+            stage=stage,
+            return_code=return_code,
+            input_file=input_file,
+            config_file=config_file,
+            timestamp=date_string,
+            wall_time=wall_time,
+            cpu_time=cpu_time,
+            max_rss=max_rss,
+            failure=failure,
+            file_size=os.path.getsize(history_file),
+            db_file=history_db_file(Path(history_file).parent),
+        )
+    except sqlite3.Error as error:
+        log.warning(f"Could not record the history entry in the history database: {error}")
+
+
+def stage_metrics(run: str, stage: str, return_code: int, metrics: dict, metrics_file: Path):
+    """
+    Append the resource usage of an analysis stage to the per-night stage
+    metrics table (see STAGE_METRICS_COLUMNS). Times are given in seconds,
+    the maximum RSS in kB and the rest of quantities in bytes (see
+    `osa.utils.iofile.append_in_single_write`).
+
+    Parameters
+    ----------
+    run : str
+        Run/sequence analyzed.
+    stage : str
+        Stage of the analysis pipeline.
+    return_code : int
+        Return code of the lstchain executable.
+    metrics : dict
+        Resource usage of the stage, see `osa.workflow.stages.AnalysisStage`.
+    metrics_file : pathlib.Path
+    """
+    if options.simulate:
+        return
+
+    timestamp = datetime.utcnow().isoformat(sep=" ", timespec="seconds")
+    values = {"timestamp": timestamp, "run": run, "stage": stage, "rc": return_code, **metrics}
+    line = ",".join(
+        "" if values.get(key) is None else str(values[key]) for key in STAGE_METRICS_COLUMNS
+    )
+
+    try:
+        metrics_file.parent.mkdir(parents=True, exist_ok=True)
+        append_in_single_write(metrics_file, f"{line}\n")
+    except OSError as error:
+        log.warning(f"Could not store the stage metrics: {error}")
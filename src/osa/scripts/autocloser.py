@@ -13,6 +13,7 @@ from pathlib import Path
 
 from osa.configs import options
 from osa.paths import analysis_path
+from osa.scripts.sequencer import compute_status
 from osa.utils.cliopts import autocloser_cli_parser
 from osa.utils.logging import myLogger
 from osa.utils.mail import send_warning_mail
@@ -51,7 +52,7 @@ class Telescope:
         date : str
             Date in format YYYY-MM-DD
         config_file : pathlib.Path
-            Path to the configuration file
+            Path to the configuration file (already loaded in cfg)
         ignore_cronlock : bool
             Ignore cron lock file
         test : bool
@@ -61,15 +62,11 @@ class Telescope:
         self.telescope = telescope
         # necessary to make sure that cron.lock gets deleted in the end
         self.cron_lock = cron_lock(self.telescope)
-        self.keyLine = None
         self.locked = False
         self.closed = False
-        self.header_lines = []
-        self.data_lines = []
+        self.status = []
         self.sequences = []
         self.seq_lines = None
-        self.stdout = None
-        self.stderr = None
 
         if self.is_closed():
             log.info(f"{self.telescope} is already closed! Ignoring {self.telescope}")
@@ -83,15 +80,13 @@ class Telescope:
         if not self.lock_automatic_sequencer() and not ignore_cronlock:
             log.warning(f"{self.telescope} already locked! Ignoring {self.telescope}")
             return
-        if not self.simulate_sequencer(date, config_file, test, no_gainsel):
+        if not self.simulate_sequencer(date, test, no_gainsel):
             log.warning(
                 f"Simulation of the sequencer failed "
                 f"for {self.telescope}! Ignoring {self.telescope}"
             )
             return
 
-        self.parse_sequencer()
-
         if not self.build_sequences():
             log.info(f"Sequencer for {self.telescope} is empty! Exiting.")
             sys.exit()
@@ -122,66 +117,49 @@ class Telescope:
         self.locked = True
         return True
 
-    def simulate_sequencer(self, date: str, config_file: Path, test: bool, no_gainsel: bool):
-        """Launch the sequencer in simulation mode."""
+    def simulate_sequencer(self, date: str, test: bool, no_gainsel: bool):
+        """Get the status of the sequences as the sequencer does in simulation mode."""
         if test:
             self.read_file()
-        else:
-            sequencer_cmd = [
-                "sequencer",
-                "-s",
-                "-c",
-                str(config_file),
-                "-d",
-                date,
-                self.telescope,
-            ]
-            if no_gainsel:
-                sequencer_cmd.insert(1, "--no-gainsel")
-
-            log.debug(f"Executing {' '.join(sequencer_cmd)}")
-            sequencer = subprocess.Popen(
-                sequencer_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
+            self.parse_sequencer()
+            return True
+
+        try:
+            status = compute_status(
+                datetime.datetime.fromisoformat(date), self.telescope, no_gainsel=no_gainsel
             )
-            self.stdout, self.stderr = sequencer.communicate()
-            log.info(self.stdout)
-            if sequencer.returncode != 0:
-                log.warning(f"Sequencer returns error code {sequencer.returncode}")
-                return False
-            self.seq_lines = self.stdout.split("\n")
+        except Exception as error:
+            log.warning(f"Could not get the status of the sequences: {error}")
+            return False
+
+        self.status = [
+            {column: str(value) for column, value in sequence_status.to_dict().items()}
+            for sequence_status in status
+        ]
         return True
 
     def read_file(self):
         """Read an example sequencer output."""
         log.debug(f"Reading example of a sequencer output {example_seq()}")
-        with open(example_seq(), "r") as self.stdout:
-            stdout_tmp = self.stdout.read()
+        with open(example_seq(), "r") as file:
+            stdout_tmp = file.read()
             log.info(stdout_tmp)
             self.seq_lines = stdout_tmp.split("\n")
 
     def parse_sequencer(self):
-        """Parse the sequencer output lines."""
+        """Parse the lines of a sequencer table (only used in test mode)."""
         log.debug(f"Parsing sequencer table of {self.telescope}")
-        header = True
-        data = False
+        key_line = None
         for line in self.seq_lines:
-            if data and line:
-                if line.startswith("LST1"):
-                    self.data_lines.append(line)
+            if key_line and line.startswith("LST1"):
+                self.status.append(dict(zip(key_line.split(), line.split())))
             elif "Tel   Seq" in line:
-                data = True
-                header = False
-                self.keyLine = line
-            elif header:
-                self.header_lines.append(line)
+                key_line = line
 
     def build_sequences(self):
         """Build the sequences and return True if there are any."""
         log.debug(f"Creating Sequence objects for {self.telescope}")
-        self.sequences = [Sequence(self.keyLine, line) for line in self.data_lines]
+        self.sequences = [Sequence(sequence_status) for sequence_status in self.status]
         return bool(self.sequences)
 
     def close(
@@ -229,27 +207,20 @@ class Telescope:
 
 class Sequence:
     """
-    As for now the keys for the 'dict_sequence' are:
-    (LST1) Tel Seq Parent Type Run Subruns Source Wobble Action Tries JobID
+    The keys for the 'dict_sequence' are the columns of the sequencer table
+    (see `osa.scripts.sequencer.STATUS_COLUMNS`):
+    Tel Seq Parent Type Run Subruns Source Action Tries JobID
     State CPU_time Exit DL1% MUONS% DL1AB% DATACHECK% DL2%
 
     All the values in the 'dict_sequence' are strings
     """
 
-    def __init__(self, keyLine, sequence):
-        self.dict_sequence = {}
-        self.keyLine = keyLine
-        self.sequence = sequence
+    def __init__(self, dict_sequence: dict):
+        self.dict_sequence = dict_sequence
         self.understood = False
         self.readyToClose = False
         self.discarded = False
         self.closed = False
-
-        self.parse_sequence()
-
-    def parse_sequence(self):
-        log.debug("Parsing sequence")
-        self.dict_sequence = dict(zip(self.keyLine.split(), self.sequence.split()))
         log.debug(self.dict_sequence)
 
     def is_closed(self):
@@ -4,14 +4,11 @@ collect results and merge them if needed.
 """
 
 import logging
-import re
 import shutil
-import subprocess
 import sys
-import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Tuple, Iterable, List
+from typing import Dict, Iterable, Optional, Tuple
 
 from osa import osadb
 from osa.configs import options
@@ -19,22 +16,32 @@ from osa.configs.config import cfg
 from osa.job import (
     are_all_jobs_correctly_finished, 
     save_job_information, 
-    run_sacct, 
-    get_closer_sacct_output
+    read_sacct_cache,
+    get_closer_sacct_output,
+    job_array_step,
+    wait_for_jobs,
 )
 from osa.nightsummary.extract import extract_runs, extract_sequences
 from osa.nightsummary.nightsummary import run_summary_table
 from osa.paths import (
     destination_dir,
     create_longterm_symlink,
-    dl1_datacheck_longterm_file_exits
+    dl1_datacheck_longterm_file_exits,
+    get_latest_version_file,
+    scan_output_files,
 )
 from osa.raw import is_raw_data_available
 from osa.report import start
 from osa.utils.cliopts import closercliparsing
 from osa.utils.logging import myLogger
-from osa.utils.register import register_found_pattern
+from osa.utils.register import (
+    register_concept_files,
+    register_manifest_file,
+    resume_registration,
+)
 from osa.utils.mail import send_warning_mail
+from osa.veto import set_closed_sequence
+from osa.workflow.dag import Step, WorkflowDAG
 from osa.utils.utils import (
     night_finished_flag,
     is_day_closed,
@@ -51,12 +58,16 @@ __all__ = [
     "post_process",
     "post_process_files",
     "is_finished_check",
-    "extract_provenance",
-    "merge_dl1_datacheck",
+    "provenance_step",
+    "merge_dl1_datacheck_step",
     "set_closed_with_file",
-    "merge_files",
-    "daily_datacheck",
-    "daily_longterm_cmd",
+    "merge_files_step",
+    "merge_muon_files_step",
+    "daily_longterm_step",
+    "cherenkov_transparency_step",
+    "longterm_symlink_step",
+    "closer_workflow",
+    "submit_closer_workflow",
     "observation_finished",
 ]
 
@@ -166,42 +177,22 @@ def post_process(seq_tuple):
         # Close the sequences
         post_process_files(seq_list)
 
-        # Extract the provenance info
-        extract_provenance(seq_list)
-
-        # Merge DL1b files run-wise
-        merge_files(seq_list, data_level="DL1AB")
-
-        merge_muon_files(seq_list)
+        # Extract the provenance, merge the files run-wise and produce the daily datacheck
+        closer_job_ids = submit_closer_workflow(closer_workflow(seq_list))
 
-        # Merge DL2 files run-wise
-        if not options.no_dl2:
-            merge_files(seq_list, data_level="DL2")
+        # Until the merging of muon files is fixed, do not wait for these jobs
+        closer_job_ids.pop("merge_muon", None)
 
-        # Merge DL1 datacheck files and produce PDFs. It also produces
-        # the daily datacheck report using the longterm script, and updates
-        # the longterm DL1 datacheck file with the cherenkov_transparency script.
-        if cfg.getboolean("lstchain", "merge_dl1_datacheck"):
-            list_job_id = merge_dl1_datacheck(seq_list)
-            longterm_job_id = daily_datacheck(daily_longterm_cmd(list_job_id))
-            cherenkov_job_id = cherenkov_transparency(cherenkov_transparency_cmd(longterm_job_id))
-            create_longterm_symlink(cherenkov_job_id)
-
-        time.sleep(600)
+        # Wait for the jobs launched by the closer before closing the night,
+        # waking up as soon as they finish
+        if not wait_for_jobs(closer_job_ids.values()):
+            send_warning_mail(date=date_to_iso(options.date))
+            return False
 
     # Check if all jobs launched by autocloser finished correctly 
     # before creating the NightFinished.txt file
-    n_max = 6
-    n = 0
-    while not all_closer_jobs_finished_correctly() and n <= n_max:
-        log.info(
-            "All jobs launched by autocloser did not finished correctly yet. "
-            "Checking again in 10 minutes..."
-        )
-        time.sleep(600)
-        n += 1
-
-    if n > n_max:
+    if not all_closer_jobs_finished_correctly():
+        log.warning("Not all the jobs launched by autocloser finished correctly.")
         send_warning_mail(date=date_to_iso(options.date))
         return False
 
@@ -226,44 +217,43 @@ def post_process_files(seq_list: list):
         list of sequences
     """
 
-    output_files_set = set(Path(options.directory).rglob("*Run*"))
-
-    DL1AB_RE = re.compile(rf"{options.dl1_prod_id}/dl1.*.(?:h5|hdf5|hdf)")
-    MUONS_RE = re.compile(r"muons.*.fits")
-    DATACHECK_RE = re.compile(r"datacheck_dl1.*.(?:h5|hdf5|hdf)")
-    INTERLEAVED_RE = re.compile(r"interleaved.*.(?:h5|hdf5|hdf)")
-
-    pattern_files = dict(
-        [
-            ("DL1AB", DL1AB_RE),
-            ("MUON", MUONS_RE),
-            ("DATACHECK", DATACHECK_RE),
-            ("INTERLEAVED", INTERLEAVED_RE),
-        ]
-    )
-
+    concepts = ["DL1AB", "MUON", "DATACHECK", "INTERLEAVED"]
     if not options.no_dl2:
-        DL2_RE = re.compile(f"{options.dl2_prod_id}/dl2.*.(?:h5|hdf5|hdf)")
-        pattern_files["DL2"] = DL2_RE
+        concepts.append("DL2")
 
-    for concept, pattern_re in pattern_files.items():
-        log.info(f"Post processing {concept} files, {len(output_files_set)} files left")
+    # Only the files of the runs in the list of sequences are registered
+    runs = {sequence.run for sequence in seq_list}
+    runs.update(sequence.previousrun for sequence in seq_list if sequence.type == "PEDCALIB")
 
-        dst_path = destination_dir(concept, create_dir=True)
+    file_index = scan_output_files(Path(options.directory))
+    log.info(f"{len(file_index)} output files found in {options.directory}")
 
-        log.debug(f"Checking if {concept} files need to be moved to {dst_path}")
+    # Finish first the moves interrupted in a previous execution of the closer
+    if not options.simulate:
+        resume_registration(register_manifest_file())
 
-        for file_path in output_files_set.copy():
+    n_registered = 0
 
-            file = str(file_path)
+    for concept in concepts:
+        file_list = [
+            file_path
+            for (file_concept, run, _), file_path in file_index.items()
+            if file_concept == concept
+            and run in runs
             # If seqtoclose is set, we only want to close that sequence
-            if options.seqtoclose is not None and options.seqtoclose not in file:
-                continue
+            and (options.seqtoclose is None or options.seqtoclose in str(file_path))
+        ]
+        log.info(f"Post processing {len(file_list)} {concept} files")
+
+        dst_path = destination_dir(concept, create_dir=True)
+
+        if not options.simulate:
+            log.debug(f"Moving {concept} files to {dst_path}")
+            n_registered += register_concept_files(file_list, concept, dst_path)
 
-            if pattern_found := pattern_re.search(file):
-                log.debug(f"Pattern {concept} found, {pattern_found} in {file}")
-                registered_file = register_found_pattern(file_path, seq_list, concept, dst_path)
-                output_files_set.remove(registered_file)
+    if n_registered > 0:
+        for sequence in seq_list:
+            set_closed_sequence(sequence)
 
 
 def set_closed_with_file():
@@ -323,80 +313,69 @@ def is_finished_check(run_summary):
     return [sequence_success, sequence_list]
 
 
-def merge_dl1_datacheck(seq_list) -> List[str]:
+def merge_dl1_datacheck_step(seq_list) -> Optional[Step]:
     """
-    Merge every DL1 datacheck h5 files run-wise and generate the PDF files
+    Workflow step merging every DL1 datacheck h5 files run-wise and generating
+    the PDF files, as a single job array. None if there are no DATA sequences.
 
     Parameters
     ----------
     seq_list: list of sequence objects
         List of Sequence Objects
+
+    Returns
+    -------
+    step: osa.workflow.dag.Step or None
     """
     log.debug("Merging dl1 datacheck files and producing PDFs")
 
     muons_dir = destination_dir("MUON", create_dir=False)
     datacheck_dir = destination_dir("DATACHECK", create_dir=False)
 
-    list_job_id = []
+    commands = {}
 
     for sequence in seq_list:
         if sequence.type == "DATA":
-            cmd = [
-                "sbatch",
-                "--parsable",
-                "-D",
-                options.directory,
-                "-o",
-                f"log/merge_dl1_datacheck_{sequence.run:05d}_%j.out",
-                "-e",
-                f"log/merge_dl1_datacheck_{sequence.run:05d}_%j.err",
+            commands[sequence.run] = [
                 "lstchain_check_dl1",
                 "--input-file",
                 f"{datacheck_dir}/datacheck_dl1_LST-1.Run{sequence.run:05d}.*.h5",
                 f"--output-dir={datacheck_dir}",
                 f"--muons-dir={muons_dir}",
             ]
-            if not options.simulate and not options.test:
-                job = subprocess.run(
-                    cmd,
-                    encoding="utf-8",
-                    capture_output=True,
-                    text=True,
-                    check=True,
-                )
-                list_job_id.append(job.stdout.strip())
-            else:
-                log.debug("Simulate launching scripts")
+            log.debug(f"Executing {stringify(commands[sequence.run])}")
 
-            log.debug(f"Executing {stringify(cmd)}")
+    if not commands:
+        return None
 
-    return list_job_id
+    return job_array_step("merge_dl1_datacheck", commands, "merge_dl1_datacheck")
 
 
-def extract_provenance(seq_list):
+def provenance_step(seq_list) -> Optional[Step]:
     """
-    Extract provenance run wise from the prov.log file
-    where it was stored sub-run wise
+    Workflow step extracting the provenance run wise from the prov.log file
+    where it was stored sub-run wise, as a single job array. None if there
+    are no DATA sequences.
 
     Parameters
     ----------
     seq_list: list of sequence objects
         List of Sequence Objects
+
+    Returns
+    -------
+    step: osa.workflow.dag.Step or None
     """
     log.info("Extract provenance run wise")
 
     nightdir = date_to_dir(options.date)
+    commands = {}
 
     for sequence in seq_list:
         if sequence.type == "DATA":
             drs4_pedestal_run_id = str(sequence.drs4_run)
             pedcal_run_id = str(sequence.pedcal_run)
             cmd = [
-                "sbatch",
-                "-D",
-                options.directory,
-                "-o",
-                f"log/provenance_{sequence.run:05d}_%j.log",
                 "provprocess",
                 "-c",
                 options.configfile,
@@ -408,11 +387,13 @@ def extract_provenance(seq_list):
             ]
             if options.no_dl2:
                 cmd.append("--no-dl2")
-                
-            if not options.simulate and not options.test and shutil.which("sbatch") is not None:
-                subprocess.run(cmd, check=True)
-            else:
-                log.debug("Simulate launching scripts")
+
+            commands[sequence.run] = cmd
+
+    if not commands:
+        return None
+
+    return job_array_step("provenance", commands, "provenance")
 
 
 def get_pattern(data_level) -> Tuple[str, str]:
@@ -427,10 +408,15 @@ def get_pattern(data_level) -> Tuple[str, str]:
     raise ValueError(f"Unknown data level {data_level}")
 
 
-def merge_files(sequence_list, data_level="DL2"):
-    """Merge DL1b or DL2 h5 files run-wise."""
+def merge_files_step(sequence_list, data_level="DL2") -> Optional[Step]:
+    """
+    Workflow step merging DL1b or DL2 h5 files run-wise as a single job array.
+    None if there are no DATA sequences.
+    """
     log.info(f"Looping over the sequences and merging the {data_level} files")
 
+    commands = {}
+
     data_dir = destination_dir(data_level, create_dir=False)
     pattern, prefix = get_pattern(data_level)
 
@@ -438,12 +424,7 @@ def merge_files(sequence_list, data_level="DL2"):
         if sequence.type == "DATA":
             merged_file = Path(data_dir) / f"{prefix}_LST-1.Run{sequence.run:05d}.h5"
 
-            cmd = [
-                "sbatch",
-                "-D",
-                options.directory,
-                "-o",
-                f"log/merge_{prefix}_{sequence.run:05d}_%j.log",
+            commands[sequence.run] = [
                 "lstchain_merge_hdf5_files",
                 f"--input-dir={data_dir}",
                 f"--output-file={merged_file}",
@@ -453,30 +434,30 @@ def merge_files(sequence_list, data_level="DL2"):
                 f"--pattern={pattern}",
             ]
 
-            log.debug(f"Executing {stringify(cmd)}")
+            log.debug(f"Executing {stringify(commands[sequence.run])}")
 
-            if not options.simulate and not options.test and shutil.which("sbatch") is not None:
-                subprocess.run(cmd, check=True)
-            else:
-                log.debug("Simulate launching scripts")
+    if not commands:
+        return None
+
+    return job_array_step(f"merge_{prefix}", commands, f"merge_{prefix}")
 
 
-def merge_muon_files(sequence_list):
-    """Merge muon files run-wise."""
+def merge_muon_files_step(sequence_list) -> Optional[Step]:
+    """
+    Workflow step merging muon files run-wise as a single job array.
+    None if there are no sequences.
+    """
     log.info("Looping over the sequences and merging the MUON files")
 
+    commands = {}
+
     data_dir = destination_dir("MUON", create_dir=False)
     pattern, prefix = get_pattern("MUON")
 
     for sequence in sequence_list:
         merged_file = Path(data_dir) / f"muons_LST-1.Run{sequence.run:05d}.fits"
 
-        cmd = [
-            "sbatch",
-            "-D",
-            options.directory,
-            "-o",
-            f"log/merge_{prefix}_{sequence.run:05d}_%j.log",
+        commands[sequence.run] = [
             "lstchain_merge_muon_files",
             f"--input-dir={data_dir}",
             f"--output-file={merged_file}",
@@ -484,101 +465,131 @@ def merge_muon_files(sequence_list):
             f"--pattern={pattern}",
         ]
 
-        log.debug(f"Executing {stringify(cmd)}")
+        log.debug(f"Executing {stringify(commands[sequence.run])}")
 
-        if not options.simulate and not options.test and shutil.which("sbatch") is not None:
-            subprocess.run(cmd, check=True)
-        else:
-            log.debug("Simulate launching scripts")
+    if not commands:
+        return None
+
+    return job_array_step(f"merge_{prefix}", commands, f"merge_{prefix}")
 
 
-def daily_longterm_cmd(parent_job_ids: List[str]) -> List[str]:
-    """Build the daily longterm command."""
+def daily_longterm_step() -> Step:
+    """Workflow step producing the daily DL1 datacheck report using the longterm script."""
     nightdir = date_to_dir(options.date)
     datacheck_dir = destination_dir("DATACHECK", create_dir=False)
     muons_dir = destination_dir("MUON", create_dir=False)
     longterm_dir = Path(cfg.get("LST1", "LONGTERM_DIR")) / options.prod_id / nightdir
     longterm_output_file = longterm_dir / f"DL1_datacheck_{nightdir}.h5"
 
-    return [
-        "sbatch",
-        "--parsable",
-        "-D",
-        options.directory,
-        "-o",
-        "log/longterm_daily_%j.log",
-        f"--dependency=afterok:{','.join(parent_job_ids)}",
-        "lstchain_longterm_dl1_check",
-        f"--input-dir={datacheck_dir}",
-        f"--output-file={longterm_output_file}",
-        f"--muons-dir={muons_dir}",
-        "--batch",
-    ]
-
-
-def daily_datacheck(cmd: List[str]):
-    """Run daily dl1 checks using longterm script."""
-    log.info("Daily dl1 checks using longterm script.")
-    log.debug(f"Executing {stringify(cmd)}")
-
-    if not options.simulate and not options.test and shutil.which("sbatch") is not None:
-        job = subprocess.run(
-            cmd,
-            encoding="utf-8",
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        job_id = job.stdout.strip()
-        return job_id
-    else:
-        log.debug("Simulate launching scripts")
+    return Step(
+        name="longterm",
+        command=[
+            "lstchain_longterm_dl1_check",
+            f"--input-dir={datacheck_dir}",
+            f"--output-file={longterm_output_file}",
+            f"--muons-dir={muons_dir}",
+            "--batch",
+        ],
+        inputs=[datacheck_dir / "datacheck_dl1_LST-1.Run?????.h5"],
+        outputs=[longterm_output_file],
+        directory=options.directory,
+        sbatch_options=["-o", "log/longterm_daily_%j.log"],
+    )
 
 
-def cherenkov_transparency_cmd(longterm_job_id: str) -> List[str]:
-    """Build the cherenkov transparency command."""
+def cherenkov_transparency_step() -> Step:
+    """Workflow step updating the longterm DL1 datacheck file with the Cherenkov transparency."""
     nightdir = date_to_dir(options.date)
     datacheck_dir = destination_dir("DATACHECK", create_dir=False)
     longterm_dir = Path(cfg.get("LST1", "LONGTERM_DIR")) / options.prod_id / nightdir
     longterm_datacheck_file = longterm_dir / f"DL1_datacheck_{nightdir}.h5"
 
-    return [
-        "sbatch",
-        "--parsable",
-        "-D",
-        options.directory,
-        "-o",
-        "log/cherenkov_transparency_%j.log",
-        f"--dependency=afterok:{longterm_job_id}",
-        "lstchain_cherenkov_transparency",
-        f"--update-datacheck-file={longterm_datacheck_file}",
-        f"--input-dir={datacheck_dir}",
-    ]
+    return Step(
+        name="cherenkov_transparency",
+        command=[
+            "lstchain_cherenkov_transparency",
+            f"--update-datacheck-file={longterm_datacheck_file}",
+            f"--input-dir={datacheck_dir}",
+        ],
+        depends_on=["longterm"],
+        inputs=[longterm_datacheck_file],
+        directory=options.directory,
+        sbatch_options=["-o", "log/cherenkov_transparency_%j.log"],
+    )
 
 
-def cherenkov_transparency(cmd: List[str]):
-    """Update longterm dl1 check file with cherenkov transparency information."""
-    log.info("Update longterm dl1 check file with cherenkov_transparency script.")
-    log.debug(f"Executing {stringify(cmd)}")
+def longterm_symlink_step() -> Step:
+    """
+    Workflow step linking the latest version of the longterm DL1 datacheck file of
+    the night, among the existing ones and the one produced by this version, in the
+    common directory (see `osa.paths.create_longterm_symlink`).
+    """
+    nightdir = date_to_dir(options.date)
+    longterm_dir = Path(cfg.get("LST1", "LONGTERM_DIR"))
+    linked_longterm_file = longterm_dir / f"night_wise/all/DL1_datacheck_{nightdir}.h5"
+    longterm_file = longterm_dir / options.prod_id / nightdir / f"DL1_datacheck_{nightdir}.h5"
+    latest_version_file = get_latest_version_file(
+        [longterm_file, *longterm_dir.rglob(f"v*/{nightdir}/DL1_datacheck_{nightdir}.h5")]
+    )
+
+    return Step(
+        name="longterm_symlink",
+        command=["ln", "-sfn", str(latest_version_file), str(linked_longterm_file)],
+        depends_on=["cherenkov_transparency"],
+        directory=options.directory,
+        sbatch_options=["-o", "log/longterm_symlink_%j.log"],
+    )
+
+
+def closer_workflow(seq_list) -> WorkflowDAG:
+    """
+    End-of-night workflow of the closer: the run-wise extraction of the provenance
+    and merging of the DL1b, muon and DL2 files, independent of each other, and the
+    merging of the DL1 datacheck files followed by the daily longterm DL1 datacheck,
+    the Cherenkov transparency update and the link to the latest longterm file.
+    """
+    workflow = WorkflowDAG()
 
-    if not options.simulate and not options.test and shutil.which("sbatch") is not None:
-        job = subprocess.run(
-            cmd,
-            encoding="utf-8",
-            capture_output=True,
-            text=True,
-            check=True,
+    steps = [
+        provenance_step(seq_list),
+        merge_files_step(seq_list, data_level="DL1AB"),
+        merge_muon_files_step(seq_list),
+    ]
+    if not options.no_dl2:
+        steps.append(merge_files_step(seq_list, data_level="DL2"))
+
+    if cfg.getboolean("lstchain", "merge_dl1_datacheck"):
+        merge_datacheck = merge_dl1_datacheck_step(seq_list)
+        longterm = daily_longterm_step()
+        if merge_datacheck is not None:
+            longterm.depends_on.append(merge_datacheck.name)
+        steps.extend(
+            [merge_datacheck, longterm, cherenkov_transparency_step(), longterm_symlink_step()]
         )
-        job_id = job.stdout.strip()
-        return job_id
 
-    else:
+    for step in steps:
+        if step is not None:
+            workflow.add(step)
+
+    return workflow
+
+
+def submit_closer_workflow(workflow: WorkflowDAG, batch_command: str = "sbatch") -> Dict[str, str]:
+    """Submit the closer workflow. Return the job ID of each submitted step."""
+    log.info("Submitting the closer workflow: " + ", ".join(workflow.steps))
+
+    if options.simulate or options.test or shutil.which(batch_command) is None:
+        for step in workflow.order():
+            log.debug(f"Executing {stringify(step.batch_command(step.after_jobs))}")
         log.debug("Simulate launching scripts")
+        return {}
+
+    return workflow.submit(batch_command)
 
 
 def all_closer_jobs_finished_correctly():
     """Check if all the jobs launched by autocloser finished correctly."""
-    sacct_output = run_sacct()
+    sacct_output = read_sacct_cache()
     jobs_closer = get_closer_sacct_output(sacct_output)
     if len(jobs_closer[jobs_closer["State"]!="COMPLETED"])==0:
         return True
@@ -1,7 +1,9 @@
 """Script called from the batch scheduler to process a run."""
 
 import logging
+import os
 import sys
+import time
 from pathlib import Path
 
 from osa.configs import options
@@ -10,13 +12,24 @@ from osa.job import historylevel
 from osa.workflow.stages import AnalysisStage
 from osa.provenance.capture import trace
 from osa.utils.cliopts import data_sequence_cli_parsing
+from osa.utils.iofile import append_in_single_write
 from osa.utils.logging import myLogger
-from osa.utils.utils import date_to_dir
+from osa.utils.utils import date_to_dir, get_process_start_time
 
-__all__ = ["data_sequence", "r0_to_dl1", "dl1_to_dl2", "dl1ab", "dl1_datacheck"]
+__all__ = [
+    "data_sequence",
+    "r0_to_dl1",
+    "dl1_to_dl2",
+    "dl1ab",
+    "dl1_datacheck",
+    "report_pilot_overhead",
+]
 
 log = myLogger(logging.getLogger())
 
+# File (in the log directory) collecting the start-up overhead of the pilot jobs
+PILOT_OVERHEAD_FILE = "pilot_overhead.csv"
+
 
 def data_sequence(
     calibration_file: Path,
@@ -160,7 +173,13 @@ def r0_to_dl1(
     if options.simulate:
         return 0
 
-    analysis_step = AnalysisStage(run=run_str, command_args=cmd, config_file=dl1a_config.name)
+    analysis_step = AnalysisStage(
+        run=run_str,
+        command_args=cmd,
+        config_file=dl1a_config.name,
+        output_file=Path(options.directory) / f"dl1_LST-1.Run{run_str}.h5",
+        staged=True,
+    )
     analysis_step.execute()
     return analysis_step.rc
 
@@ -204,7 +223,9 @@ def dl1ab(run_str: str) -> int:
     if options.simulate:
         return 0
 
-    analysis_step = AnalysisStage(run=run_str, command_args=cmd, config_file=dl1b_config.name)
+    analysis_step = AnalysisStage(
+        run=run_str, command_args=cmd, config_file=dl1b_config.name, staged=True
+    )
     analysis_step.execute()
     return analysis_step.rc
 
@@ -242,7 +263,11 @@ def dl1_datacheck(run_str: str) -> int:
     if options.simulate:
         return 0
 
-    analysis_step = AnalysisStage(run=run_str, command_args=cmd)
+    analysis_step = AnalysisStage(
+        run=run_str,
+        command_args=cmd,
+        output_file=output_directory / f"datacheck_dl1_LST-1.Run{run_str}.h5",
+    )
     analysis_step.execute()
     return analysis_step.rc
 
@@ -280,13 +305,57 @@ def dl1_to_dl2(run_str: str) -> int:
     if options.simulate:
         return 0
 
-    analysis_step = AnalysisStage(run=run_str, command_args=cmd, config_file=dl2_config.name)
+    analysis_step = AnalysisStage(
+        run=run_str,
+        command_args=cmd,
+        config_file=dl2_config.name,
+        output_file=dl2_subdirectory / f"dl2_LST-1.Run{run_str}.h5",
+        staged=True,
+    )
     analysis_step.execute()
     return analysis_step.rc
 
 
+def report_pilot_overhead(run_str: str, start_time: float) -> None:
+    """
+    Log the time elapsed since the pilot job script (parent process) started
+    until datasequence is ready to process the subrun, i.e. the interpreter
+    start-up and import overhead of each job array task. Pilots processing
+    several subruns per task set OSA_PILOT_START to the time at which each
+    subrun is launched, which is used instead of the start of the pilot. It is also appended
+    to log/pilot_overhead.csv as (run_str, pilot, overhead_s).
+
+    Parameters
+    ----------
+    run_str: str
+    start_time: float
+        Time (seconds since the epoch) at which datasequence started.
+    """
+    if pilot_start := os.getenv("OSA_PILOT_START"):
+        pilot_start_time = float(pilot_start)
+    else:
+        pilot_start_time = get_process_start_time(os.getppid())
+    if pilot_start_time is None:
+        return
+
+    overhead = start_time - pilot_start_time
+    pilot = cfg.get("SLURM", "PILOT_SCRIPT", fallback="python")
+    log.info(f"Overhead of the {pilot} pilot job: {overhead:.2f} s")
+
+    if options.simulate:
+        return
+
+    overhead_file = Path(options.directory) / "log" / PILOT_OVERHEAD_FILE
+    try:
+        overhead_file.parent.mkdir(parents=True, exist_ok=True)
+        append_in_single_write(overhead_file, f"{run_str},{pilot},{overhead:.3f}\n")
+    except OSError as error:
+        log.warning(f"Could not store the pilot overhead: {error}")
+
+
 def main():
     """Performs the analysis steps to convert raw data into DL2 files."""
+    start_time = time.time()
     (
         calibration_file,
         drs4_ped_file,
@@ -303,6 +372,8 @@ def main():
     else:
         log.setLevel(logging.INFO)
 
+    report_pilot_overhead(run_number, start_time)
+
     # Run the routine piping all the analysis steps
     rc = data_sequence(
         calibration_file,
@@ -2,28 +2,48 @@
 import logging
 import re
 import shutil
-import glob
-import pandas as pd
 import subprocess as sp
+from itertools import groupby
 from pathlib import Path
 from textwrap import dedent
 from io import StringIO
+from typing import TYPE_CHECKING
 import argparse
 
+import numpy as np
 from astropy.table import Table
-from lstchain.paths import run_info_from_filename, parse_r0_filename
 
-from osa.scripts.reprocessing import get_list_of_dates, check_job_status_and_wait
+from osa.scripts.reprocessing import get_list_of_dates
 from osa.utils.utils import wait_for_daytime
+from osa.utils.iofile import transfer_files
+from osa.raw import r0_inventory, incomplete_subruns, missing_runs
 from osa.utils.logging import myLogger
-from osa.job import get_sacct_output, FORMAT_SLURM
 from osa.configs.config import cfg
+from osa.job import JOB_FINAL_STATES
 from osa.paths import DEFAULT_CFG
 
+if TYPE_CHECKING:
+    # pandas is imported only where needed to keep the start-up fast
+    import pandas as pd
+
 log = myLogger(logging.getLogger(__name__))
 
 PATH = "PATH=/fefs/aswg/software/offline_dvr/bin:$PATH"
 
+# Log file of a gain selection job: gain_selection_<run>_<subrun>_<job ID>.log
+GAIN_SELECTION_LOG = re.compile(r"^gain_selection_(?P<run>\d{5})_(?P<subrun>\d{4})_(?P<job>\d+)\.log$")
+
+# Manifest and job script of the gain selection job arrays of a night (in its log directory)
+GAIN_SELECTION_MANIFEST = "gain_selection.manifest"
+GAIN_SELECTION_SCRIPT = "gain_selection.sh"
+
+# Fields of sacct output and number of jobs queried at once
+FORMAT_GAIN_SELECTION = ["JobIDRaw", "JobName", "State", "ExitCode"]
+SACCT_CHUNK_SIZE = 500
+
+# Final SLURM states of jobs which did not finish successfully
+FAILED_STATES = JOB_FINAL_STATES - {"COMPLETED"}
+
 parser = argparse.ArgumentParser()
 parser.add_argument(
         "--check",                                                                                       
@@ -31,11 +51,18 @@ parser.add_argument(
         default=False,
         help="Check if any job failed",
 )
+parser.add_argument(
+        "--resubmit",
+        action="store_true",
+        default=False,
+        help="Together with --check, resubmit the subruns whose jobs did not finish successfully",
+)
 parser.add_argument(
         "--no-queue-check",
         action="store_true",
         default=False,
-        help="Do not wait until the number of jobs in the slurm queue is < 1500",
+        help="Deprecated, kept for compatibility: the number of gain selection tasks "
+        "running at the same time is limited by the job array throttle instead",
 )
 parser.add_argument(
         "-c",                                                                                            
@@ -89,45 +116,132 @@ parser.add_argument(
         "previous to 20231205) and lstchain_r0_to_r0g (by default used for dates later than 20231205).",
 )
 
-def get_sbatch_script(
-    run_id, subrun, input_file, output_dir, log_dir, log_file, ref_time, ref_counter, module, ref_source, tool
-):
-    """Build the sbatch job pilot script for running the gain selection."""
-    if tool == "lst_dvr":
-        return dedent(
-            f"""\
-        #!/bin/bash
+def array_throttle() -> int:
+    """
+    Maximum number of tasks of each gain selection job array of a night
+    running at the same time ([SLURM] GAIN_SELECTION_THROTTLE).
+    """
+    return cfg.getint("SLURM", "GAIN_SELECTION_THROTTLE", fallback=1500)
+
+
+def max_array_size() -> int:
+    """
+    Maximum number of tasks of a job array, whose task IDs must be lower than it:
+    [SLURM] MAX_ARRAY_SIZE or, if not set, the MaxArraySize of the SLURM
+    configuration (1001 by default).
+    """
+    if size := cfg.get("SLURM", "MAX_ARRAY_SIZE", fallback=""):
+        return int(size)
+
+    if shutil.which("scontrol") is not None:
+        config = sp.run(["scontrol", "show", "config"], capture_output=True, encoding="utf-8").stdout
+        if match := re.search(r"^MaxArraySize\s*=\s*(\d+)", config, re.MULTILINE):
+            return int(match.group(1))
+
+    return 1001
+
+
+def array_indices(subruns) -> str:
+    """Compact SLURM array index specification (e.g. 0-3,5,7-9) of a list of task IDs."""
+    subruns = sorted(set(subruns))
+    ranges = []
+    first = last = subruns[0]
+    for subrun in subruns[1:]:
+        if subrun != last + 1:
+            ranges.append(f"{first}-{last}" if last > first else f"{first}")
+            first = subrun
+        last = subrun
+    ranges.append(f"{first}-{last}" if last > first else f"{first}")
+    return ",".join(ranges)
 
-        #SBATCH -D {log_dir}
-        #SBATCH -o "gain_selection_{run_id:05d}_{subrun:04d}_%j.log"
-        #SBATCH --job-name "gain_selection_{run_id:05d}"
-        #SBATCH --export {PATH}
-        #SBATCH --partition=short,long
 
-        lst_dvr {input_file} {output_dir} {ref_time} {ref_counter} {module} {ref_source}
-        """
+def write_manifest(manifest_file: Path, tasks: list):
+    """
+    Write the manifest of the gain selection job arrays of a night: one line per
+    subrun with the task ID, run, subrun, input file and the dragon
+    reference time, counter, module and source of its run.
+    """
+    with open(manifest_file, "w") as f:
+        for task_id, (run_id, subrun, file, *references) in enumerate(tasks):
+            f.write(" ".join(map(str, [task_id, f"{run_id:05d}", f"{subrun:04d}", file, *references])))
+            f.write("\n")
+
+
+def get_sbatch_script(manifest_file, output_dir, log_dir, log_file, tool):
+    """
+    Build the sbatch job pilot script for running the gain selection over the subruns
+    of a night as job arrays (see `submit_job_arrays`). Each task reads its run,
+    subrun, input file and dragon references from the manifest, at the task ID given
+    by its array task ID plus the offset of its job array (first argument of the
+    script), and writes its log to gain_selection_<run>_<subrun>_<job ID>.log.
+    """
+    read_manifest = dedent(
+        f"""\
+        task=$((SLURM_ARRAY_TASK_ID + ${{1:-0}}))
+        read -r run subrun input_file ref_time ref_counter module ref_source < <(
+            awk -v task="$task" '$1 == task {{print $2, $3, $4, $5, $6, $7, $8}}' {manifest_file}
         )
+        exec > "gain_selection_${{run}}_${{subrun}}_${{SLURM_JOB_ID}}.log" 2>&1"""
+    )
+    if tool == "lst_dvr":
+        header = f"#SBATCH --export {PATH}"
+        command = "lst_dvr $input_file {output_dir} $ref_time $ref_counter $module $ref_source"
     elif tool == "lstchain_r0_to_r0g":
-        return dedent(
+        header = "#SBATCH --mem=40GB"
+        command = (
+            "lstchain_r0_to_r0g --R0-file=$input_file --output-dir={output_dir} --log={log_file} "
+            "--no-flatfield-heuristic"
+        )
+    else:
+        raise ValueError(f"Unknown gain selection tool {tool}")
+
+    return (
+        dedent(
             f"""\
-        #!/bin/bash
+            #!/bin/bash
 
-        #SBATCH -D {log_dir}
-        #SBATCH -o "gain_selection_{run_id:05d}_{subrun:04d}_%j.log"
-        #SBATCH --job-name "gain_selection_{run_id:05d}"
-        #SBATCH --mem=40GB
-        #SBATCH --partition=short,long
+            #SBATCH -D {log_dir}
+            #SBATCH -o /dev/null
+            {header}
+            #SBATCH --partition=short,long
 
-        lstchain_r0_to_r0g --R0-file={input_file} --output-dir={output_dir} --log={log_file} --no-flatfield-heuristic
-        """
+            """
         )
+        + f"{read_manifest}\n"
+        + command.format(output_dir=output_dir, log_file=log_file)
+        + "\n"
+    )
+
 
-def apply_gain_selection(date: str, start: int, end: int, output_basedir: Path = None, tool: str = None, no_queue_check: bool = False):
+def submit_job_arrays(job_file: Path, date: str, tasks, batch_command: str = "sbatch"):
     """
-    Submit the jobs to apply the gain selection to the data for a given date
-    on a subrun-by-subrun basis.
+    Submit the given task IDs of the manifest of the gain selection of a night as
+    job arrays of at most `max_array_size` tasks, each with the throttle of
+    `array_throttle`. The job array of the task IDs from <offset> to <offset> +
+    `max_array_size` - 1 is named gain_selection_<date>_<offset>.
     """
+    size = max_array_size()
+    for offset, chunk in groupby(sorted(set(tasks)), key=lambda task: task - task % size):
+        indices = array_indices([task - offset for task in chunk])
+        sp.run(
+            [
+                batch_command,
+                f"--job-name=gain_selection_{date}_{offset}",
+                f"--array={indices}%{array_throttle()}",
+                job_file,
+                str(offset),
+            ],
+            check=True,
+        )
+
 
+def apply_gain_selection(date: str, start: int, end: int, output_basedir: Path = None, tool: str = None):
+    """
+    Submit the jobs to apply the gain selection to the data for a given date as job
+    arrays with a task per subrun (see `submit_job_arrays`), so that [SLURM]
+    GAIN_SELECTION_THROTTLE caps the tasks of each of them running at the same time.
+    The R0 files to which the gain selection cannot be applied are copied afterwards.
+    """
     if not tool:
         if date < "20231205":
             tool = "lst_dvr"
@@ -147,72 +261,59 @@ def apply_gain_selection(date: str, start: int, end: int, output_basedir: Path =
     log_dir.mkdir(parents=True, exist_ok=True)
     log_file = log_dir / f"r0_to_r0g_{date}.log"
     r0_dir = Path(f"/fefs/aswg/data/real/R0/{date}")
+    r0_files = r0_inventory(r0_dir)
 
-    for run in data_runs:
-        if not no_queue_check:
-            # Check slurm queue status and sleep for a while to avoid overwhelming the queue
-            check_job_status_and_wait(max_jobs=1500)
-
-        # Avoid running jobs while it is still night time
-        wait_for_daytime(start, end)
+    tasks = []
+    files_to_copy = []
 
+    for run in data_runs:
         run_id = run["run_id"]
         ref_time = run["dragon_reference_time"]
         ref_counter = run["dragon_reference_counter"]
         module = run["dragon_reference_module_index"]
         ref_source = run["dragon_reference_source"].upper()
 
-        files = glob.glob(f"{r0_dir}/LST-1.?.Run{run_id:05d}.????.fits.fz")
-        subrun_numbers = [int(file[-12:-8]) for file in files]
-        input_files = []
+        run_files = r0_files[r0_files["run"] == run_id]
 
         if tool == "lst_dvr" and ref_source not in ["UCTS", "TIB"]:
-            input_files = r0_dir.glob(f"LST-1.?.Run{run_id:05d}.????.fits.fz")
             log.info(
                 f"Run {run_id} does not have UCTS or TIB info, so gain selection cannot"
                 f"be applied. Copying directly the R0 files to {output_dir}."
             )
-            for file in input_files:
-                sp.run(["cp", file, output_dir])
+            files_to_copy.append(run_files["path"])
 
         else:
-            n_subruns = max(subrun_numbers)
-
-            for subrun in range(n_subruns + 1):
-                new_files = glob.glob(f"{r0_dir}/LST-1.?.Run{run_id:05d}.{subrun:04d}.fits.fz")
-
-                if len(new_files) != 4:
-                    log.info(f"Run {run_id}.{subrun:05d} does not have 4 streams of R0 files, so gain"
-                        f"selection cannot be applied. Copying directly the R0 files to {output_dir}."
-                    )
-                    for file in new_files:
-                        sp.run(["cp", file, output_dir])
-
-                else:
-                    new_files.sort()
-                    input_files.append(new_files[0])
-
-            log.info("Creating and launching the sbatch scripts for the rest of the runs to apply gain selection")
-            for file in input_files:
-                run_info = run_info_from_filename(file)
-                job_file = log_dir / f"gain_selection_{run_info.run:05d}.{run_info.subrun:04d}.sh"
-                with open(job_file, "w") as f:
-                    f.write(
-                        get_sbatch_script(
-                            run_id,
-                            run_info.subrun,
-                            file,
-                            output_dir,
-                            log_dir,
-                            log_file,
-                            ref_time,
-                            ref_counter,
-                            module,
-                            ref_source,
-                            tool,
-                        )
-                    )
-                sp.run(["sbatch", job_file], check=True)
+            incomplete = run_files["subrun"].isin(incomplete_subruns(run_files)["subrun"])
+            if incomplete.any():
+                log.info(
+                    f"Subruns {run_files.loc[incomplete, 'subrun'].unique()} of run {run_id} do not have "
+                    f"4 streams of R0 files, so gain selection cannot be applied. Copying directly "
+                    f"the R0 files to {output_dir}."
+                )
+                files_to_copy.append(run_files.loc[incomplete, "path"])
+
+            # The inventory is sorted by stream, so the first file of each subrun is its first stream
+            first_streams = run_files[~incomplete].drop_duplicates("subrun")
+            tasks.extend(
+                (run_id, subrun, file, ref_time, ref_counter, module, ref_source)
+                for subrun, file in zip(first_streams["subrun"], first_streams["path"])
+            )
+
+    if tasks:
+        # Avoid running jobs while it is still night time
+        wait_for_daytime(start, end)
+        log.info(f"Creating and launching the job arrays to apply gain selection to {len(tasks)} subruns")
+        manifest_file = log_dir / GAIN_SELECTION_MANIFEST
+        write_manifest(manifest_file, tasks)
+        job_file = log_dir / GAIN_SELECTION_SCRIPT
+        with open(job_file, "w") as f:
+            f.write(get_sbatch_script(manifest_file, output_dir, log_dir, log_file, tool))
+        submit_job_arrays(job_file, date, range(len(tasks)))
+
+    for files in files_to_copy:
+        # Avoid copying files while it is still night time
+        wait_for_daytime(start, end)
+        transfer_files(files, output_dir)
 
     calib_runs = summary_table[summary_table["run_type"] != "DATA"]
     log.info(f"Found {len(calib_runs)} NO-DATA runs")
@@ -224,13 +325,10 @@ def apply_gain_selection(date: str, start: int, end: int, output_basedir: Path =
         wait_for_daytime(start, end)
 
         run_id = run["run_id"]
-        r0_files = r0_dir.glob(f"LST-1.?.Run{run_id:05d}.????.fits.fz")
-
-        for file in r0_files:
-            sp.run(["cp", file, output_dir])
+        transfer_files(r0_files.loc[r0_files["run"] == run_id, "path"], output_dir)
 
-def run_sacct_j(job) -> StringIO:
-    """Run sacct to obtain the job information."""
+def run_sacct_j(jobs) -> StringIO:
+    """Run sacct to obtain the information of a list of jobs."""
     if shutil.which("sacct") is None:
         log.warning("No job info available since sacct command is not available")
         return StringIO()
@@ -240,16 +338,132 @@ def run_sacct_j(job) -> StringIO:
         "-n",
         "--parsable2",
         "--delimiter=,",
-        "--units=G",
         "-o",
-        ",".join(FORMAT_SLURM),
+        ",".join(FORMAT_GAIN_SELECTION),
         "-j",
-        job,
+        ",".join(map(str, jobs)),
     ]
 
     return StringIO(sp.check_output(sacct_cmd).decode())
 
 
+def gain_selection_jobs(log_dir: Path):
+    """
+    Table of the gain selection jobs of a night (run, subrun, job ID and array task ID)
+    from the log files of their job array tasks, keeping only the latest job of each
+    subrun. The subruns of the job array manifest without any log file have no job
+    ID (0), and those without a task in the manifest have task ID -1.
+    """
+    import pandas as pd
+
+    jobs = pd.DataFrame(
+        [
+            [int(match["run"]), int(match["subrun"]), int(match["job"])]
+            for file in log_dir.glob("gain_selection_*.log")
+            if (match := GAIN_SELECTION_LOG.match(file.name))
+        ],
+        columns=["run", "subrun", "job"],
+    )
+
+    manifest_file = log_dir / GAIN_SELECTION_MANIFEST
+    if manifest_file.exists():
+        manifest = pd.read_csv(
+            manifest_file, sep=" ", header=None, usecols=[0, 1, 2], names=["task", "run", "subrun"]
+        )
+        jobs = manifest.merge(jobs, on=["run", "subrun"], how="outer")
+
+    return (
+        jobs.reindex(columns=["run", "subrun", "job", "task"])
+        .fillna({"job": 0, "task": -1})
+        .astype(int)
+        .sort_values(["run", "subrun", "job"])
+        .drop_duplicates(["run", "subrun"], keep="last")
+        .reset_index(drop=True)
+    )
+
+
+def get_job_states(jobs) -> "pd.Series":
+    """
+    State of a list of jobs, querying sacct for chunks of SACCT_CHUNK_SIZE jobs.
+    Jobs unknown to sacct are reported as MISSING.
+    """
+    import pandas as pd
+
+    jobs = sorted(set(jobs))
+    sacct_output = [
+        pd.read_csv(
+            run_sacct_j(jobs[i:i + SACCT_CHUNK_SIZE]),
+            names=FORMAT_GAIN_SELECTION,
+            dtype=str,
+        )
+        for i in range(0, len(jobs), SACCT_CHUNK_SIZE)
+    ]
+    states = pd.concat([pd.DataFrame(columns=FORMAT_GAIN_SELECTION), *sacct_output])
+    # Skip the job steps (e.g. <job ID>.batch)
+    states = states[states["JobIDRaw"].str.isdigit()]
+    # Keep only the state itself, e.g. CANCELLED instead of "CANCELLED by <user ID>"
+    states = states.set_index(states["JobIDRaw"].astype(int))["State"].str.split().str[0]
+    return states.reindex(jobs, fill_value="MISSING")
+
+
+def queued_tasks(date: str, n_tasks: int) -> set:
+    """
+    Task IDs of the manifest of the gain selection of a night, with `n_tasks` tasks,
+    still in the SLURM queue (see `submit_job_arrays`).
+    """
+    if shutil.which("squeue") is None:
+        log.warning("No job info available since squeue command is not available")
+        return set()
+
+    names = ",".join(f"gain_selection_{date}_{offset}" for offset in range(0, n_tasks, max_array_size()))
+    squeue_output = sp.check_output(["squeue", "-h", "-r", "-o", "%j %K", "-n", names], encoding="utf-8")
+    return {
+        int(name.rsplit("_", 1)[1]) + int(task)
+        for name, task in (line.split() for line in squeue_output.splitlines())
+        if task.isdigit()
+    }
+
+
+def gain_selection_status(log_dir: Path):
+    """
+    Status of the gain selection jobs of a night (see `gain_selection_jobs`).
+
+    The state of each subrun is the SLURM state of its latest job. Subruns without
+    any job are PENDING while their job array task is still in the queue and
+    MISSING otherwise, and subruns whose job is unknown to sacct are UNKNOWN. Only
+    the subruns which FAILED (or any other final failure state) or are MISSING,
+    without a task in the queue, are to be resubmitted, so that no subrun is
+    processed twice at the same time.
+    """
+    jobs = gain_selection_jobs(log_dir)
+    states = get_job_states(jobs.loc[jobs["job"] > 0, "job"])
+    jobs["state"] = jobs["job"].map(states).replace("MISSING", "UNKNOWN")
+
+    n_tasks = jobs["task"].max() + 1 if not jobs.empty else 0
+    queued = jobs["task"].isin(queued_tasks(log_dir.name, n_tasks))
+    no_job = jobs["job"] == 0
+    jobs.loc[no_job, "state"] = np.where(queued[no_job], "PENDING", "MISSING")
+
+    failed = jobs["state"].isin(FAILED_STATES) | (jobs["state"] == "MISSING")
+    jobs["resubmit"] = failed & ~queued & (jobs["task"] >= 0)
+    return jobs
+
+
+def resubmit_failed_subruns(failed_jobs, log_dir: Path, batch_command: str = "sbatch"):
+    """
+    Resubmit the failed subruns of a night as job arrays of the job script and
+    manifest of its gain selection, containing only the tasks of the failed subruns.
+    """
+    job_file = log_dir / GAIN_SELECTION_SCRIPT
+    if not job_file.exists():
+        log.warning(f"No gain selection job array script in {log_dir} to resubmit")
+        return
+
+    for run, subruns in failed_jobs.groupby("run")["subrun"]:
+        log.info(f"Resubmitting the gain selection of subruns {subruns.tolist()} of run {run}")
+    submit_job_arrays(job_file, log_dir.name, failed_jobs["task"], batch_command)
+
+
 def GainSel_flag_file(date: str) -> Path:
     filename = cfg.get("LSTOSA", "gain_selection_check")
     GainSel_dir = Path(cfg.get("LST1", "GAIN_SELECTION_FLAG_DIR"))
@@ -263,23 +477,23 @@ def GainSel_finished(date: str) -> bool:
     return flagfile.exists()
 
 
-def check_failed_jobs(date: str, output_basedir: Path = None):
-    """Search for failed jobs in the log directory."""
-    failed_jobs = []
+def check_failed_jobs(date: str, output_basedir: Path = None, resubmit: bool = False):
+    """
+    Search for the gain selection jobs of a night which did not finish successfully,
+    or whose subruns have not been submitted, optionally resubmitting those subruns
+    which failed or are missing (see `gain_selection_status`).
+    """
     log_dir = output_basedir / "log" / date
-    filenames = glob.glob(f"{log_dir}/gain_selection*.log")
-    jobs = [re.search(r'(?<=_)(.[0-9.]+?)(?=.log)', i).group(0) for i in filenames]
-
-    for job in jobs:
-        output = run_sacct_j(job)
-        df = get_sacct_output(output)
+    jobs = gain_selection_status(log_dir)
+    failed_jobs = jobs[jobs["state"] != "COMPLETED"]
 
-        if not df.iloc[0]["State"] == "COMPLETED":
-            log.warning(f"Job {job} did not finish successfully")
-            failed_jobs.append(job)
+    for (run, state), subruns in failed_jobs.groupby(["run", "state"])["subrun"]:
+        log.warning(f"Run {run}: subruns {subruns.tolist()} have not finished successfully ({state})")
 
-    if failed_jobs:
+    if not failed_jobs.empty:
         log.warning(f"{date}: some jobs did not finish successfully")
+        if resubmit and jobs["resubmit"].any():
+            resubmit_failed_subruns(jobs[jobs["resubmit"]], log_dir)
 
     else:
         log.info(f"{date}: all jobs finished successfully")
@@ -289,30 +503,18 @@ def check_failed_jobs(date: str, output_basedir: Path = None):
         run_summary_file = run_summary_dir / f"RunSummary_{date}.ecsv"
         summary_table = Table.read(run_summary_file)
         runs = summary_table["run_id"]
-        missing_runs = []
 
-        r0_files = glob.glob(f"/fefs/aswg/data/real/R0/{date}/LST-1.?.Run?????.????.fits.fz")
-        r0g_files = glob.glob(f"/fefs/aswg/data/real/R0G/{date}/LST-1.?.Run?????.????.fits.fz")
-        all_r0_runs = [parse_r0_filename(i).run for i in r0_files]
-        all_r0g_runs = [parse_r0_filename(i).run for i in r0g_files]
+        r0_files = r0_inventory(Path(f"/fefs/aswg/data/real/R0/{date}"))
+        r0g_files = r0_inventory(Path(f"/fefs/aswg/data/real/R0G/{date}"))
+        runs_to_copy = np.setdiff1d(missing_runs(r0_files, r0g_files), runs)
 
-        for run in all_r0_runs:
-            if run not in runs:
-                if run not in all_r0g_runs:
-                    missing_runs.append(run)
-
-        missing_runs.sort()
-        if missing_runs:
+        if runs_to_copy.size > 0:
             log.info(
-                f"Some runs are missing. Copying R0 files of runs {pd.Series(missing_runs).unique()} "
+                f"Some runs are missing. Copying R0 files of runs {runs_to_copy} "
                 f"directly to /fefs/aswg/data/real/R0G/{date}"
             )
-
-            for run in missing_runs:
-                output_dir = Path(f"/fefs/aswg/data/real/R0G/{date}/")
-                files = glob.glob(f"/fefs/aswg/data/real/R0/{date}/LST-1.?.Run{run:05d}.????.fits.fz")
-                for file in files:
-                    sp.run(["cp", file, output_dir])
+            output_dir = Path(f"/fefs/aswg/data/real/R0G/{date}/")
+            transfer_files(r0_files.loc[r0_files["run"].isin(runs_to_copy), "path"], output_dir)
 
         GainSel_dir = Path(cfg.get("LST1", "GAIN_SELECTION_FLAG_DIR"))
         flagfile_dir = GainSel_dir / date
@@ -335,7 +537,7 @@ def main():
     if args.date:
         if args.check:
             log.info(f"Checking gain selection status for date {args.date}")
-            check_failed_jobs(args.date, args.output_basedir)
+            check_failed_jobs(args.date, args.output_basedir, args.resubmit)
         else:
             log.info(f"Applying gain selection to date {args.date}")
             apply_gain_selection(
@@ -344,7 +546,6 @@ def main():
                 args.end_time, 
                 args.output_basedir,
                 args.tool,
-                no_queue_check=args.no_queue_check, 
             )
 
 
@@ -355,7 +556,7 @@ def main():
         if args.check:
             for date in list_of_dates:
                 log.info(f"Checking gain selection status for date {date}")
-                check_failed_jobs(date, args.output_basedir)
+                check_failed_jobs(date, args.output_basedir, args.resubmit)
         else:
             for date in list_of_dates:
                 log.info(f"Applying gain selection to date {date}")
@@ -365,7 +566,6 @@ def main():
                     args.end_time,
                     args.output_basedir,
                     args.tool,
-                    no_queue_check=args.no_queue_check,
                 )
             log.info("Done! No more dates to process.")
 
@@ -0,0 +1,36 @@
+"""Script to import the .history files of analysis directories into their history database."""
+
+import logging
+from pathlib import Path
+
+import click
+
+from osa.history import history_db_file, migrate_history_files
+from osa.utils.logging import myLogger
+
+log = myLogger(logging.getLogger(__name__))
+
+
+@click.command()
+@click.argument(
+    "analysis-dirs", nargs=-1, type=click.Path(exists=True, file_okay=False, path_type=Path)
+)
+def main(analysis_dirs: tuple = ()):
+    """
+    Import the .history files of the given analysis directories into the history
+    database of each directory. It can be run several times over the same directory,
+    only the history lines not imported yet are added.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    for analysis_dir in analysis_dirs:
+        history_files = sorted(analysis_dir.glob("*.history"))
+        db_file = history_db_file(analysis_dir)
+        n_entries = migrate_history_files(history_files, db_file)
+        log.info(
+            f"{n_entries} entries from {len(history_files)} history files imported into {db_file}"
+        )
+
+
+if __name__ == "__main__":
+    main()
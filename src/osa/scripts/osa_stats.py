@@ -0,0 +1,109 @@
+"""Script to summarize the resource usage of the analysis stages across nights."""
+
+import logging
+from pathlib import Path
+from typing import Iterable
+
+import click
+import pandas as pd
+
+from osa.report import STAGE_METRICS_COLUMNS, STAGE_METRICS_FILE
+from osa.utils.logging import myLogger
+
+__all__ = ["read_stage_metrics", "summarize_stage_metrics"]
+
+log = myLogger(logging.getLogger(__name__))
+
+
+def read_stage_metrics(paths: Iterable[Path]) -> pd.DataFrame:
+    """
+    Read the stage metrics tables of several nights into a single table.
+
+    Parameters
+    ----------
+    paths: Iterable[pathlib.Path]
+        Stage metrics files or analysis directories (running_analysis/YYYYMMDD/vX.Y.Z)
+        containing them in their log directory.
+
+    Returns
+    -------
+    metrics: pd.DataFrame
+        Stage metrics with an additional column with the night (YYYYMMDD)
+        taken from the path of the analysis directory.
+    """
+    tables = []
+    for path in paths:
+        metrics_file = path / "log" / STAGE_METRICS_FILE if path.is_dir() else path
+        if not metrics_file.exists():
+            log.warning(f"File {metrics_file} not found")
+            continue
+
+        table = pd.read_csv(metrics_file, names=STAGE_METRICS_COLUMNS)
+        table["night"] = metrics_file.resolve().parent.parent.parent.name
+        tables.append(table)
+
+    if not tables:
+        return pd.DataFrame(columns=STAGE_METRICS_COLUMNS + ["night"])
+
+    return pd.concat(tables, ignore_index=True)
+
+
+def summarize_stage_metrics(metrics: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarize the resource usage per analysis stage, sorted by
+    the total wall time to show first the stages that dominate.
+
+    Returns
+    -------
+    summary: pd.DataFrame
+        Executions, failures, total and mean wall time, CPU efficiency,
+        peak RSS and total data read and written per stage.
+    """
+    grouped = metrics.assign(
+        failed=metrics["rc"] != 0,
+        cpu_time=metrics["user_time"] + metrics["sys_time"],
+    ).groupby("stage")
+
+    summary = pd.DataFrame(
+        {
+            "executions": grouped.size(),
+            "failed": grouped["failed"].sum(),
+            "nights": grouped["night"].nunique(),
+            "wall_time_h": grouped["wall_time"].sum() / 3600,
+            "mean_wall_time_s": grouped["wall_time"].mean(),
+            "cpu_efficiency": grouped["cpu_time"].sum() / grouped["wall_time"].sum(),
+            "max_rss_gb": grouped["max_rss"].max() / 1024**2,
+            "read_gb": grouped["read_bytes"].sum() / 1e9,
+            "written_gb": grouped["write_bytes"].sum() / 1e9,
+        }
+    )
+    summary["wall_time_fraction"] = summary["wall_time_h"] / summary["wall_time_h"].sum()
+
+    return summary.sort_values("wall_time_h", ascending=False)
+
+
+@click.command()
+@click.option("--top", default=10, show_default=True, help="Number of slowest executions shown.")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+def main(paths: tuple = (), top: int = 10):
+    """
+    Summarize the stage metrics (log/stage_metrics.csv) of the given analysis
+    directories or stage metrics files to find the hotspots of the processing.
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    metrics = read_stage_metrics(paths)
+    if metrics.empty:
+        log.info("No stage metrics found")
+        return
+
+    with pd.option_context("display.width", 200, "display.float_format", "{:.2f}".format):
+        log.info(f"Resource usage per stage:\n{summarize_stage_metrics(metrics).to_string()}")
+
+        slowest = metrics.nlargest(top, "wall_time")
+        columns = ["night", "run", "stage", "rc", "wall_time", "user_time", "max_rss"]
+        log.info(f"Slowest executions:\n{slowest[columns].to_string(index=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,18 @@ Orchestrator script that creates and execute the calibration sequence and
 prepares a SLURM job array which launches the data sequences for every subrun.
 """
 
+import json
 import logging
 import os
 import sys
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
 from decimal import Decimal
+from pathlib import Path
+from typing import List
+
+import numpy as np
 
 from osa import osadb
 from osa.configs import options
@@ -19,23 +27,31 @@ from osa.job import (
     submit_jobs,
     get_sacct_output,
     get_squeue_output,
-    run_sacct,
+    read_sacct_cache,
     run_squeue,
 )
 from osa.nightsummary.extract import build_sequences
 from osa.nightsummary.nightsummary import run_summary_table
-from osa.paths import analysis_path
+from osa.paths import analysis_path, scan_output_files
 from osa.report import start
 from osa.utils.cliopts import sequencer_cli_parsing
 from osa.utils.logging import myLogger
-from osa.utils.utils import is_day_closed, gettag, date_to_iso, date_to_dir
+from osa.utils.utils import is_day_closed, gettag, date_to_iso, date_to_dir, set_prod_ids
 from osa.veto import get_closed_list, get_veto_list
 from osa.scripts.gain_selection import GainSel_finished
 
 __all__ = [
     "single_process",
+    "build_sequence_list",
+    "compute_status",
+    "status_options",
+    "SequenceStatus",
+    "STATUS_COLUMNS",
+    "status_to_json",
+    "status_from_json",
     "update_sequence_status",
     "get_status_for_sequence",
+    "get_status_counts",
     "output_matrix",
     "report_sequences",
     "update_job_info",
@@ -43,6 +59,89 @@ __all__ = [
 
 log = myLogger(logging.getLogger())
 
+# Columns of the table with the processing status shown by the sequencer
+STATUS_COLUMNS = [
+    "Tel",
+    "Seq",
+    "Parent",
+    "Type",
+    "Run",
+    "Subruns",
+    "Source",
+    "Action",
+    "Tries",
+    "JobID",
+    "State",
+    "CPU_time",
+    "Exit",
+    "DL1%",
+    "MUONS%",
+    "DL1AB%",
+    "DATACHECK%",
+    "DL2%",
+]
+
+# Data levels counted for the DATA sequences, i.e. columns of the status count matrix
+STATUS_DATA_LEVELS = ["DL1", "DL1AB", "DATACHECK", "MUON", "DL2"]
+
+# Snapshot (in the log directory) of the last status computed by the sequencer
+STATUS_SNAPSHOT = "sequencer_status.json"
+
+# Global options overwritten while computing the status of the sequences of a date
+STATUS_OPTIONS = [
+    "simulate",
+    "date",
+    "tel_id",
+    "directory",
+    "prod_id",
+    "dl1_prod_id",
+    "dl2_prod_id",
+]
+
+
+@dataclass
+class SequenceStatus:
+    """Processing status of a sequence, i.e. a row of the sequencer table."""
+
+    telescope: str = None
+    seq: int = None
+    parent: int = None
+    type: str = None
+    run: int = None
+    subruns: int = None
+    source_name: str = None
+    action: str = None
+    tries: int = None
+    jobid: str = None
+    state: str = None
+    cputime: str = None
+    exit: str = None
+    dl1status: int = None
+    muonstatus: int = None
+    dl1abstatus: int = None
+    datacheckstatus: int = None
+    dl2status: int = None
+
+    @classmethod
+    def from_sequence(cls, sequence):
+        """Build the status from a sequence object updated by the sequencer."""
+        values = {field.name: getattr(sequence, field.name, None) for field in fields(cls)}
+        # Use python types instead of numpy scalars (e.g. taken from the run summary)
+        return cls(
+            **{
+                name: value.item() if isinstance(value, np.generic) else value
+                for name, value in values.items()
+            }
+        )
+
+    def to_row(self) -> list:
+        """Values in the order of the columns of the sequencer table."""
+        return [getattr(self, field.name) for field in fields(self)]
+
+    def to_dict(self) -> dict:
+        """Values keyed by the columns of the sequencer table."""
+        return dict(zip(STATUS_COLUMNS, self.to_row()))
+
 
 def main():
     """
@@ -109,7 +208,31 @@ def single_process(telescope):
         log.info(f"Date {date_to_iso(options.date)} is already closed for {options.tel_id}")
         return sequence_list
 
-    # Build the sequences
+    sequence_list = build_sequence_list()
+
+    if not options.no_submit:
+        submit_jobs(sequence_list)
+
+    # TODO: insert_new_activity_db(sequence_list)
+
+    # Display the sequencer table with processing status
+    report_sequences(sequence_list)
+
+    if not options.simulate:
+        write_status_snapshot(sequence_list)
+
+    return sequence_list
+
+
+def build_sequence_list() -> list:
+    """
+    Build the sequences of the date and update them with the
+    information of the jobs and the analysis products.
+
+    Returns
+    -------
+    sequence_list : list
+    """
     sequence_list = build_sequences(options.date)
 
     # Create job pilot scripts
@@ -122,15 +245,86 @@ def single_process(telescope):
     get_closed_list(sequence_list)
     update_sequence_status(sequence_list)
 
-    if not options.no_submit:
-        submit_jobs(sequence_list)
+    return sequence_list
 
-    # TODO: insert_new_activity_db(sequence_list)
 
-    # Display the sequencer table with processing status
-    report_sequences(sequence_list)
+@contextmanager
+def status_options(date: datetime, telescope: str):
+    """
+    Set the global options to compute the status of the sequences of a date
+    in simulation mode, restoring their previous values afterwards.
+    """
+    saved_options = {name: getattr(options, name) for name in STATUS_OPTIONS}
+    try:
+        options.simulate = True
+        options.date = date
+        options.tel_id = telescope
+        options.directory = analysis_path(telescope)
+        set_prod_ids()
+        yield
+    finally:
+        for name, value in saved_options.items():
+            setattr(options, name, value)
+
+
+def compute_status(
+    date: datetime, telescope: str = "LST1", no_gainsel: bool = False
+) -> List[SequenceStatus]:
+    """
+    Get the processing status of the sequences of a given date in-process,
+    as the sequencer does in simulation mode, i.e. without writing the job
+    scripts nor submitting any job.
 
-    return sequence_list
+    Parameters
+    ----------
+    date : datetime.datetime
+    telescope : str
+        Options: 'LST1'
+    no_gainsel : bool
+        Do not check if the gain selection finished correctly.
+
+    Returns
+    -------
+    status : list[SequenceStatus]
+        Status of each sequence. It is empty if there are no runs, the gain
+        selection did not finish yet or the date is already closed.
+    """
+    with status_options(date, telescope):
+        if len(run_summary_table(date)) == 0:
+            log.warning("No runs found for this date.")
+            return []
+
+        if not no_gainsel and not GainSel_finished(date_to_dir(date)):
+            log.info(f"Gain selection did not finish successfully for date {date}.")
+            return []
+
+        if is_day_closed():
+            log.info(f"Date {date_to_iso(date)} is already closed for {telescope}")
+            return []
+
+        sequence_list = build_sequence_list()
+
+    return [SequenceStatus.from_sequence(sequence) for sequence in sequence_list]
+
+
+def status_to_json(status: List[SequenceStatus]) -> str:
+    """Serialize the status of the sequences to JSON."""
+    return json.dumps([asdict(sequence_status) for sequence_status in status], default=str)
+
+
+def status_from_json(content: str) -> List[SequenceStatus]:
+    """Build the status of the sequences from its JSON serialization."""
+    return [SequenceStatus(**sequence_status) for sequence_status in json.loads(content)]
+
+
+def write_status_snapshot(sequence_list: list) -> Path:
+    """Store the status of the sequences as JSON in the log directory."""
+    status = [SequenceStatus.from_sequence(sequence) for sequence in sequence_list]
+    snapshot = Path(options.directory) / "log" / STATUS_SNAPSHOT
+    snapshot_tmp = snapshot.with_suffix(".tmp")
+    snapshot_tmp.write_text(status_to_json(status))
+    snapshot_tmp.replace(snapshot)
+    return snapshot
 
 
 def update_job_info(sequence_list):
@@ -145,7 +339,7 @@ def update_job_info(sequence_list):
     if options.test:
         return
 
-    sacct_output, squeue_output = run_sacct(), run_squeue()
+    sacct_output, squeue_output = read_sacct_cache(), run_squeue()
     set_queue_values(
         sacct_info=get_sacct_output(sacct_output),
         squeue_info=get_squeue_output(squeue_output),
@@ -163,21 +357,63 @@ def update_sequence_status(seq_list):
     seq_list
         List of sequences of a given night corresponding to each run.
     """
+    data_sequences = [seq for seq in seq_list if seq.type == "DATA"]
+    counts = get_status_counts(options.directory, [seq.run for seq in data_sequences])
+
     for seq in seq_list:
         if seq.type == "PEDCALIB":
             seq.calibstatus = int(
                 Decimal(get_status_for_sequence(seq, "CALIB") * 100) / seq.subruns
             )
-        elif seq.type == "DATA":
-            seq.dl1status = int(Decimal(get_status_for_sequence(seq, "DL1") * 100) / seq.subruns)
-            seq.dl1abstatus = int(
-                Decimal(get_status_for_sequence(seq, "DL1AB") * 100) / seq.subruns
-            )
-            seq.datacheckstatus = int(
-                Decimal(get_status_for_sequence(seq, "DATACHECK") * 100) / seq.subruns
-            )
-            seq.muonstatus = int(Decimal(get_status_for_sequence(seq, "MUON") * 100) / seq.subruns)
-            seq.dl2status = int(Decimal(get_status_for_sequence(seq, "DL2") * 100) / seq.subruns)
+
+    for seq, run_counts in zip(data_sequences, counts):
+        status = {
+            level: int(Decimal(int(n_files) * 100) / seq.subruns)
+            for level, n_files in zip(STATUS_DATA_LEVELS, run_counts)
+        }
+        seq.dl1status = status["DL1"]
+        seq.dl1abstatus = status["DL1AB"]
+        seq.datacheckstatus = status["DATACHECK"]
+        seq.muonstatus = status["MUON"]
+        seq.dl2status = status["DL2"]
+
+
+def get_status_counts(directory: Path, runs: list) -> np.ndarray:
+    """
+    Count the subrun-wise files produced for each run and data level listing
+    every directory of the analysis directory only once.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Analysis directory (running_analysis).
+    runs : list
+        Run numbers.
+
+    Returns
+    -------
+    counts : numpy.ndarray
+        Number of files with shape (number of runs, number of data levels). The
+        columns follow the order of `STATUS_DATA_LEVELS`.
+    """
+    run_index = {run: i for i, run in enumerate(runs)}
+    level_index = {level: j for j, level in enumerate(STATUS_DATA_LEVELS)}
+    counts = np.zeros((len(runs), len(STATUS_DATA_LEVELS)), dtype=int)
+
+    # Directories of the files of the levels which can be found elsewhere
+    level_dirs = {
+        "MUON": Path(directory),
+        "DATACHECK": Path(directory) / options.dl1_prod_id,
+    }
+
+    for (concept, run, subrun), file in scan_output_files(directory).items():
+        if subrun is None or concept not in level_index or run not in run_index:
+            continue
+        if concept in level_dirs and file.parent != level_dirs[concept]:
+            continue
+        counts[run_index[run], level_index[concept]] += 1
+
+    return counts
 
 
 def get_status_for_sequence(sequence, data_level) -> int:
@@ -196,20 +432,20 @@ def get_status_for_sequence(sequence, data_level) -> int:
     """
     if data_level == "DL1AB":
         directory = options.directory / options.dl1_prod_id
-        files = list(directory.glob(f"dl1_LST-1*{sequence.run}*.h5"))
+        files = list(directory.glob(f"dl1_LST-1.Run{sequence.run:05d}.*.h5"))
 
     elif data_level == "DL2":
         directory = options.directory / options.dl2_prod_id
-        files = list(directory.glob(f"dl2_LST-1*{sequence.run}*.h5"))
+        files = list(directory.glob(f"dl2_LST-1.Run{sequence.run:05d}.*.h5"))
 
     elif data_level == "DATACHECK":
         directory = options.directory / options.dl1_prod_id
-        files = list(directory.glob(f"datacheck_dl1_LST-1*{sequence.run}*.h5"))
+        files = list(directory.glob(f"datacheck_dl1_LST-1.Run{sequence.run:05d}.*.h5"))
 
     else:
         prefix = cfg.get("PATTERN", f"{data_level}PREFIX")
         suffix = cfg.get("PATTERN", f"{data_level}SUFFIX")
-        files = list(options.directory.glob(f"{prefix}*{sequence.run}*{suffix}"))
+        files = list(options.directory.glob(f"{prefix}*{sequence.run:05d}.*{suffix}"))
 
     return len(files)
 
@@ -223,53 +459,14 @@ def report_sequences(sequence_list):
     sequence_list: list
         List of sequences of a given date
     """
-    header = [
-        "Tel",
-        "Seq",
-        "Parent",
-        "Type",
-        "Run",
-        "Subruns",
-        "Source",
-        "Action",
-        "Tries",
-        "JobID",
-        "State",
-        "CPU_time",
-        "Exit",
-    ]
+    header = STATUS_COLUMNS[:13]
     if options.tel_id in ["LST1", "LST2"]:
-        header.extend(("DL1%", "MUONS%", "DL1AB%", "DATACHECK%", "DL2%"))
+        header.extend(STATUS_COLUMNS[13:])
     matrix = [header]
     for sequence in sequence_list:
-        row_list = [
-            sequence.telescope,
-            sequence.seq,
-            sequence.parent,
-            sequence.type,
-            sequence.run,
-            sequence.subruns,
-            sequence.source_name,
-            sequence.action,
-            sequence.tries,
-            sequence.jobid,
-            sequence.state,
-            sequence.cputime,
-            sequence.exit,
-        ]
-        if sequence.type in ["DRS4", "PEDCALIB"]:
-            row_list.extend((None, None, None, None, None))
-        elif sequence.type == "DATA":
-            row_list.extend(
-                (
-                    sequence.dl1status,
-                    sequence.muonstatus,
-                    sequence.dl1abstatus,
-                    sequence.datacheckstatus,
-                    sequence.dl2status,
-                )
-            )
-
+        row_list = [getattr(sequence, field.name, None) for field in fields(SequenceStatus)]
+        if options.tel_id not in ["LST1", "LST2"]:
+            row_list = row_list[:13]
         matrix.append(row_list)
     padding = int(cfg.get("OUTPUT", "PADDING"))
     output_matrix(matrix, padding)
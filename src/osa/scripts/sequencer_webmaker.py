@@ -2,17 +2,15 @@
 
 
 import logging
-import subprocess as sp
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 from textwrap import dedent
-from typing import Iterable
-
-import pandas as pd
+from typing import Iterable, List
 
 from osa.configs import options
 from osa.configs.config import cfg
+from osa.scripts.sequencer import STATUS_COLUMNS, SequenceStatus, compute_status
 from osa.utils.cliopts import sequencer_webmaker_argparser
 from osa.utils.logging import myLogger
 from osa.utils.utils import is_day_closed, date_to_iso, date_to_dir
@@ -55,57 +53,33 @@ def html_content(body: str, date: str) -> str:
     )
 
 
-def get_sequencer_output(date: str, config: str, test=False, no_gainsel=False) -> list:
-    """Call sequencer to get table with the sequencer status report.
+def get_sequencer_output(date: str, test=False, no_gainsel=False) -> List[SequenceStatus]:
+    """Get the status of the sequences as reported by the sequencer.
 
     Parameters
     ----------
     date : str
         Date of the processing YYYY-MM-DD.
-    config : str
-        OSA configuration file to use.
     test : bool
+    no_gainsel : bool
 
     Returns
     -------
     list
-        Lines of the sequencer output.
+        Status of each sequence.
     """
-    log.info("Calling sequencer...")
-    commandargs = [
-        "sequencer",
-        "-c",
-        config,
-        "-s",
-        "-d",
-        date,
-        options.tel_id,
-    ]
-
-    if no_gainsel:
-        commandargs.insert(1, "--no-gainsel")
-        
-    if test:
-        commandargs.insert(-1, "-t")
-
+    log.info("Computing the sequencer status...")
+    options.test = test
     try:
-        output = sp.run(commandargs, stdout=sp.PIPE, stderr=sp.STDOUT, encoding="utf-8", check=True)
-    except sp.CalledProcessError as error:
-        log.error(f"Command {commandargs} failed, {error.returncode}")
+        return compute_status(datetime.fromisoformat(date), options.tel_id, no_gainsel=no_gainsel)
+    except Exception as error:
+        log.error(f"Sequencer status could not be computed: {error}")
         sys.exit(1)
-    else:
-        # Strip newlines and fit it into a table:
-        return output.stdout.splitlines()
 
 
-def lines_to_matrix(lines: Iterable) -> list:
-    """Build the matrix from the sequencer output lines."""
-    matrix = []
-    for line in lines:
-        l_fields = line.split()
-        if len(l_fields) == 18:
-            matrix.append(l_fields)
-    return matrix
+def status_to_matrix(status: Iterable[SequenceStatus]) -> list:
+    """Build the matrix of the sequencer table from the status of the sequences."""
+    return [STATUS_COLUMNS] + [sequence_status.to_row() for sequence_status in status]
 
 
 def matrix_to_html(matrix: list) -> str:
@@ -113,6 +87,9 @@ def matrix_to_html(matrix: list) -> str:
     log.info("Building the html table from sequencer output")
     if len(matrix) < 2:
         return "<p>No data found</p>"
+
+    import pandas as pd
+
     df = pd.DataFrame(matrix[1:], columns=matrix[0])
     return df.to_html(index=False)
 
@@ -147,10 +124,10 @@ def main():
         sys.exit(1)
 
     # Get the table with the sequencer status report:
-    lines = get_sequencer_output(date, args.config, test=args.test, no_gainsel=args.no_gainsel)
+    status = get_sequencer_output(date, test=args.test, no_gainsel=args.no_gainsel)
 
     # Build the html sequencer table that will be place in the body of the HTML file
-    matrix = lines_to_matrix(lines)
+    matrix = status_to_matrix(status)
     html_table = matrix_to_html(matrix)
 
     # Save the HTML file
@@ -1,6 +1,7 @@
 import datetime
 import os
 import subprocess as sp
+import sys
 from pathlib import Path
 from textwrap import dedent
 
@@ -25,6 +26,20 @@ ALL_SCRIPTS = [
     "sequencer_webmaker",
 ]
 
+# Maximum import time (in seconds) at start-up of the scripts run every night.
+# It depends on the machine and its load, so it is only checked if the
+# OSA_STARTUP_BENCHMARK environment variable is set, otherwise it is reported.
+STARTUP_IMPORT_TIME = {
+    "sequencer": 6,
+    "closer": 6,
+    "autocloser": 4,
+    "copy_datacheck": 4,
+    "datasequence": 4,
+}
+
+# Heavy modules that these scripts should import only when they are needed
+DEFERRED_IMPORTS = ["lstchain", "matplotlib.pyplot", "pandas", "pkg_resources"]
+
 options.date = datetime.datetime.fromisoformat("2020-01-17")
 options.tel_id = "LST1"
 options.prod_id = "v0.1.0"
@@ -161,6 +176,65 @@ def test_sequencer(sequence_file_list):
         assert sequence_file.exists()
 
 
+def test_compute_status(
+    drs4_time_calibration_files,
+    systematic_correction_files,
+    run_summary_file,
+    run_catalog,
+    r0_data,
+    merged_run_summary,
+    gain_selection_flag_file,
+    monkeypatch,
+):
+    from osa.scripts.sequencer import (
+        STATUS_OPTIONS,
+        compute_status,
+        status_from_json,
+        status_to_json,
+    )
+
+    monkeypatch.setattr(options, "test", True)
+    monkeypatch.setattr(options, "simulate", False)
+    saved_options = {option: getattr(options, option) for option in STATUS_OPTIONS}
+
+    status = compute_status(datetime.datetime.fromisoformat("2020-01-17"), "LST1")
+
+    # The global options are not modified
+    assert {option: getattr(options, option) for option in STATUS_OPTIONS} == saved_options
+    assert [sequence_status.run for sequence_status in status] == [1809, 1807, 1808]
+    assert status[0].to_dict()["Type"] == "PEDCALIB"
+    assert status[0].dl1status is None
+    assert status[1].to_dict()["Source"] == "Crab"
+    assert status[1].to_dict()["DL1%"] == 0
+    assert len(status[2].to_row()) == 18
+    assert status_from_json(status_to_json(status)) == status
+
+
+def test_get_status_counts(tmp_path, monkeypatch):
+    from osa.scripts.sequencer import get_status_counts
+
+    monkeypatch.setattr(options, "dl1_prod_id", "tailcut84")
+    monkeypatch.setattr(options, "dl2_prod_id", "model2")
+    dl1ab_dir = tmp_path / "tailcut84"
+    dl2_dir = tmp_path / "model2"
+    dl1ab_dir.mkdir()
+    dl2_dir.mkdir()
+
+    for subrun in range(3):
+        (tmp_path / f"dl1_LST-1.Run01807.{subrun:04d}.h5").touch()
+        (tmp_path / f"muons_LST-1.Run01807.{subrun:04d}.fits").touch()
+        (dl1ab_dir / f"dl1_LST-1.Run01807.{subrun:04d}.h5").touch()
+    (dl1ab_dir / "datacheck_dl1_LST-1.Run01807.0000.h5").touch()
+    (dl2_dir / "dl2_LST-1.Run01808.0000.h5").touch()
+    # Neither run-wise files nor files of runs containing the run number are counted
+    (dl1ab_dir / "datacheck_dl1_LST-1.Run01807.h5").touch()
+    (tmp_path / "dl1_LST-1.Run11807.0000.h5").touch()
+
+    counts = get_status_counts(tmp_path, [1807, 1808])
+    # Columns: DL1, DL1AB, DATACHECK, MUON, DL2
+    assert counts.tolist() == [[3, 3, 1, 3, 0], [0, 0, 0, 0, 1]]
+
+
 def test_autocloser(running_analysis_dir):
     result = run_program(
         "autocloser",
@@ -268,6 +342,18 @@ def test_datasequence(running_analysis_dir):
     assert output.returncode == 0
 
 
+def test_report_pilot_overhead(tmp_path, monkeypatch):
+    from osa.scripts.datasequence import report_pilot_overhead
+
+    monkeypatch.setattr(options, "simulate", False)
+    monkeypatch.setattr(options, "directory", tmp_path)
+    # Launch time of the subrun set by the pilot, not the start of the pilot itself
+    monkeypatch.setenv("OSA_PILOT_START", "1000.0")
+
+    report_pilot_overhead("01807.0004", 1002.5)
+    assert (tmp_path / "log" / "pilot_overhead.csv").read_text() == "01807.0004,python,2.500\n"
+
+
 def test_calibration_pipeline(running_analysis_dir):
     options.prod_id = "v0.1.0"
     drs4_run_number = "01804"
@@ -320,20 +406,50 @@ def test_calibration_file_cmd(base_test_dir):
     assert cmd == expected_command
 
 
-def test_daily_longterm_cmd():
-    from osa.scripts.closer import daily_longterm_cmd
+def test_closer_workflow(sequence_list, running_analysis_dir, monkeypatch):
+    from osa.scripts.closer import closer_workflow
+
+    monkeypatch.setattr(options, "directory", running_analysis_dir)
+    monkeypatch.setattr(options, "no_dl2", False)
+
+    workflow = closer_workflow(sequence_list)
+    assert set(workflow.steps) == {
+        "provenance",
+        "merge_dl1",
+        "merge_muon",
+        "merge_dl2",
+        "merge_dl1_datacheck",
+        "longterm",
+        "cherenkov_transparency",
+        "longterm_symlink",
+    }
+    # The merges are independent, whereas the daily datacheck steps are chained
+    for name in ("provenance", "merge_dl1", "merge_muon", "merge_dl2", "merge_dl1_datacheck"):
+        assert workflow.steps[name].depends_on == []
+    assert workflow.steps["longterm"].depends_on == ["merge_dl1_datacheck"]
+    assert workflow.steps["cherenkov_transparency"].depends_on == ["longterm"]
+    assert workflow.steps["longterm_symlink"].depends_on == ["cherenkov_transparency"]
+    assert [step.name for step in workflow.order()][-3:] == [
+        "longterm",
+        "cherenkov_transparency",
+        "longterm_symlink",
+    ]
+
+    merge_datacheck = workflow.steps["merge_dl1_datacheck"]
+    assert merge_datacheck.command == [str(running_analysis_dir / "log/merge_dl1_datacheck_array.sh")]
+    assert "--job-name=lstchain_check_dl1" in merge_datacheck.sbatch_options
 
-    job_ids = ["12345", "54321"]
-    cmd = daily_longterm_cmd(parent_job_ids=job_ids)
+    longterm = workflow.steps["longterm"]
+    cmd = longterm.batch_command(["12345"])
 
     expected_cmd = [
         "sbatch",
         "--parsable",
         "-D",
-        options.directory,
+        running_analysis_dir,
         "-o",
         "log/longterm_daily_%j.log",
-        "--dependency=afterok:12345,54321",
+        "--dependency=afterok:12345",
         "lstchain_longterm_dl1_check",
         "--input-dir=test_osa/test_files0/DL1/20200117/v0.1.0/tailcut84/datacheck",
         "--output-file=test_osa/test_files0/OSA/DL1DataCheck_LongTerm/v0.1.0/20200117/DL1_datacheck_20200117.h5",
@@ -343,6 +459,10 @@ def test_daily_longterm_cmd():
 
     assert cmd == expected_cmd
 
+    symlink = workflow.steps["longterm_symlink"]
+    assert symlink.command[:2] == ["ln", "-sfn"]
+    assert symlink.command[-1].endswith("night_wise/all/DL1_datacheck_20200117.h5")
+
 
 def test_observation_finished():
     """Check if observation is finished for `options.date=2020-01-17`."""
@@ -397,3 +517,203 @@ def test_sequencer_webmaker(
     # Running without test option will make the script fail
     output = sp.run(["sequencer_webmaker", "-d", "2020-01-17"])
     assert output.returncode != 0
+
+
+def import_times(module: str) -> dict:
+    """Self import time (in seconds) of every module imported by a module using -X importtime."""
+    output = sp.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in output.stderr.splitlines():
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit():
+            times[fields[2].strip()] = int(fields[0]) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("script", STARTUP_IMPORT_TIME)
+def test_scripts_startup(script):
+    times = import_times(f"osa.scripts.{script}")
+    assert not set(DEFERRED_IMPORTS) & set(times)
+
+    import_time = sum(times.values())
+    print(f"Import time of osa.scripts.{script}: {import_time:.2f} s")
+    if os.getenv("OSA_STARTUP_BENCHMARK"):
+        assert import_time < STARTUP_IMPORT_TIME[script]
+
+
+def test_osa_stats(tmp_path, monkeypatch):
+    from osa.report import stage_metrics
+    from osa.scripts.osa_stats import read_stage_metrics, summarize_stage_metrics
+
+    monkeypatch.setattr(options, "simulate", False)
+
+    analysis_dirs = [tmp_path / night / "v0.1.0" for night in ("20200117", "20200118")]
+    for analysis_dir in analysis_dirs:
+        metrics_file = analysis_dir / "log" / "stage_metrics.csv"
+        for stage, wall_time, rc in [("r0_to_dl1", 100, 0), ("dl1ab", 10, 1), ("dl1ab", 12, 0)]:
+            metrics = {
+                "wall_time": wall_time,
+                "user_time": wall_time / 2,
+                "sys_time": 0,
+                "max_rss": 1024**2,
+                "read_bytes": 1e9,
+                "write_bytes": None,
+            }
+            stage_metrics("01807.0000", stage, rc, metrics, metrics_file)
+
+    metrics = read_stage_metrics(analysis_dirs)
+    assert len(metrics) == 6
+    assert set(metrics["night"]) == {"20200117", "20200118"}
+
+    summary = summarize_stage_metrics(metrics)
+    assert list(summary.index) == ["r0_to_dl1", "dl1ab"]
+    assert summary.loc["dl1ab", "executions"] == 4
+    assert summary.loc["dl1ab", "failed"] == 2
+    assert summary.loc["r0_to_dl1", "cpu_efficiency"] == pytest.approx(0.5)
+    assert summary.loc["r0_to_dl1", "max_rss_gb"] == pytest.approx(1)
+    assert summary.loc["r0_to_dl1", "read_gb"] == pytest.approx(2)
+
+
+def test_gain_selection_job_array(tmp_path):
+    from osa.configs.config import cfg
+    from osa.scripts.gain_selection import (
+        array_indices,
+        get_sbatch_script,
+        submit_job_arrays,
+        write_manifest,
+    )
+
+    assert array_indices([0, 1, 2, 3, 5, 7, 8, 9]) == "0-3,5,7-9"
+    assert array_indices([4]) == "4"
+
+    tasks = [
+        (run, subrun, f"LST-1.1.Run{run:05d}.{subrun:04d}.fits.fz", 100, 10, 1, "UCTS")
+        for run, subrun in [(1807, 0), (1807, 1), (1807, 3), (1808, 0)]
+    ]
+    manifest_file = tmp_path / "gain_selection.manifest"
+    write_manifest(manifest_file, tasks)
+    assert manifest_file.read_text().splitlines()[2] == (
+        "2 01807 0003 LST-1.1.Run01807.0003.fits.fz 100 10 1 UCTS"
+    )
+
+    script = get_sbatch_script(manifest_file, "R0G", tmp_path, "r0g.log", "lst_dvr")
+    assert script.endswith("lst_dvr $input_file R0G $ref_time $ref_counter $module $ref_source\n")
+
+    # The task reads its input file from the manifest, at its array task ID plus the
+    # offset of its job array, and logs into its own file
+    task_script = script.split("\n\n")[-1].rsplit("\n", 2)[0] + '\necho "$input_file $ref_source"'
+    sp.run(
+        ["bash", "-c", task_script, "bash", "2"],
+        env={**os.environ, "SLURM_ARRAY_TASK_ID": "1", "SLURM_JOB_ID": "123"},
+        cwd=tmp_path,
+        capture_output=True,
+        encoding="utf-8",
+    )
+    assert (tmp_path / "gain_selection_01808_0000_123.log").read_text().strip() == (
+        "LST-1.1.Run01808.0000.fits.fz UCTS"
+    )
+
+    # The tasks are split into job arrays of at most MAX_ARRAY_SIZE tasks
+    submitted = tmp_path / "submitted.txt"
+    batch_command = tmp_path / "sbatch"
+    batch_command.write_text(f'#!/bin/bash\necho "$@" >> {submitted}\n')
+    batch_command.chmod(0o755)
+    cfg.set("SLURM", "MAX_ARRAY_SIZE", "3")
+    try:
+        submit_job_arrays(tmp_path / "gain_selection.sh", "20200117", range(7), str(batch_command))
+    finally:
+        cfg.set("SLURM", "MAX_ARRAY_SIZE", "")
+    assert submitted.read_text().splitlines() == [
+        f"--job-name=gain_selection_20200117_{offset} --array={array}%1500 "
+        f"{tmp_path / 'gain_selection.sh'} {offset}"
+        for offset, array in [(0, "0-2"), (3, "0-2"), (6, "0")]
+    ]
+
+
+def test_check_gain_selection_jobs(tmp_path, monkeypatch):
+    from io import StringIO
+
+    from osa.scripts import gain_selection
+
+    log_dir = tmp_path / "log" / "20200117"
+    log_dir.mkdir(parents=True)
+    (log_dir / "gain_selection.manifest").write_text(
+        "".join(
+            f"{task} {run:05d} {subrun:04d} LST-1.1.Run{run:05d}.{subrun:04d}.fits.fz\n"
+            for task, (run, subrun) in enumerate(
+                (run, subrun) for run in (1807, 1808) for subrun in range(4)
+            )
+        )
+    )
+    (log_dir / "gain_selection.sh").touch()
+    # Run 1807: subrun 1 was resubmitted after failing, subrun 3 was never run.
+    # Run 1808: subrun 0 running, subrun 1 failed and subrun 2 still in the queue,
+    # subrun 3 never run.
+    for run, subrun, job in [
+        (1807, 0, 100),
+        (1807, 1, 101),
+        (1807, 2, 102),
+        (1807, 1, 200),
+        (1808, 0, 300),
+        (1808, 1, 301),
+    ]:
+        (log_dir / f"gain_selection_{run:05d}_{subrun:04d}_{job}.log").touch()
+
+    jobs = gain_selection.gain_selection_jobs(log_dir)
+    assert jobs[jobs["run"] == 1807].values.tolist() == [
+        [1807, 0, 100, 0],
+        [1807, 1, 200, 1],
+        [1807, 2, 102, 2],
+        [1807, 3, 0, 3],
+    ]
+
+    queried_jobs = []
+
+    def run_sacct_j(jobs):
+        queried_jobs.append(list(jobs))
+        return StringIO(
+            "100,gain_selection_20200117,COMPLETED,0:0\n"
+            "100.batch,batch,COMPLETED,0:0\n"
+            "102,gain_selection_20200117,CANCELLED by 1000,0:0\n"
+            "200,gain_selection_20200117,COMPLETED,0:0\n"
+            "300,gain_selection_20200117,RUNNING,0:0\n"
+            "301,gain_selection_20200117,FAILED,1:0\n"
+        )
+
+    monkeypatch.setattr(gain_selection, "run_sacct_j", run_sacct_j)
+    monkeypatch.setattr(gain_selection, "queued_tasks", lambda date, n_tasks: {4, 6})
+    jobs = gain_selection.gain_selection_status(log_dir)
+    assert queried_jobs == [[100, 102, 200, 300, 301]]
+    assert jobs["state"].tolist() == [
+        "COMPLETED",
+        "COMPLETED",
+        "CANCELLED",
+        "MISSING",
+        "RUNNING",
+        "FAILED",
+        "PENDING",
+        "MISSING",
+    ]
+    # Nothing still in the queue is resubmitted
+    failed_jobs = jobs[jobs["resubmit"]]
+    assert failed_jobs[["run", "subrun"]].values.tolist() == [
+        [1807, 2],
+        [1807, 3],
+        [1808, 1],
+        [1808, 3],
+    ]
+
+    submitted = tmp_path / "submitted.txt"
+    batch_command = tmp_path / "sbatch"
+    batch_command.write_text(f'#!/bin/bash\necho "$@" > {submitted}\n')
+    batch_command.chmod(0o755)
+    gain_selection.resubmit_failed_subruns(failed_jobs, log_dir, str(batch_command))
+    assert submitted.read_text().split()[:2] == [
+        "--job-name=gain_selection_20200117_0",
+        "--array=2-3,5,7%1500",
+    ]
@@ -0,0 +1,289 @@
+import os
+import shutil
+from pathlib import Path
+
+from osa.configs import options
+
+extra_files = Path(os.getenv("OSA_TEST_DATA", "extra"))
+history_files_dir = extra_files / "history_files"
+
+
+def test_parse_history_line():
+    from osa.history import parse_history_line
+
+    entry = parse_history_line(
+        "01807.0011 lstchain_data_r0_to_dl1 v0.9.0 2022-01-01 12:00 "
+        "dl1_LST-1.Run01807.0011.h5 None 0"
+    )
+    assert entry["run"] == "01807.0011"
+    assert entry["stage"] == "lstchain_data_r0_to_dl1"
+    assert entry["timestamp"] == "2022-01-01 12:00"
+    assert entry["config"] is None
+    assert entry["rc"] == 0
+
+
+def test_record_history(tmp_path):
+    from osa.history import get_failed_twice, get_history_entries, record_history
+
+    db_file = tmp_path / "log" / "history.db"
+    history_file = tmp_path / "sequence_LST1_01807.0011.history"
+
+    timestamp = "2022-01-01 12:00"
+    record_history(history_file, "01807.0011", "v0.9.0", "r0_to_dl1", 0, db_file=db_file)
+    record_history(
+        history_file, "01807.0011", "tailcut84", "dl1ab", 1, timestamp=timestamp, db_file=db_file
+    )
+    assert get_failed_twice(db_file) == []
+
+    record_history(
+        history_file, "01807.0011", "tailcut84", "dl1ab", 1, timestamp=timestamp, db_file=db_file
+    )
+    assert get_failed_twice(db_file) == ["sequence_LST1_01807.0011"]
+
+    # As in the history files, failures at different times are different entries
+    other_history_file = tmp_path / "sequence_LST1_01807.0012.history"
+    for timestamp in ("2022-01-01 12:00", "2022-01-01 12:05"):
+        record_history(
+            other_history_file, "01807.0012", "tailcut84", "dl1ab", 1,
+            timestamp=timestamp, db_file=db_file,
+        )
+    assert get_failed_twice(db_file) == ["sequence_LST1_01807.0011"]
+
+    entries = get_history_entries(db_file)
+    assert len(entries[1807]) == 2
+    assert entries[1807]["sequence_LST1_01807.0011"] == [
+        ("r0_to_dl1", "v0.9.0", 0),
+        ("dl1ab", "tailcut84", 1),
+        ("dl1ab", "tailcut84", 1),
+    ]
+
+
+def test_migrate_history_files(tmp_path):
+    from osa.history import (
+        get_failed_twice,
+        get_history_entries,
+        get_history_sizes,
+        migrate_history_files,
+    )
+
+    db_file = tmp_path / "history.db"
+    history_files = [
+        shutil.copy(history_files_dir / name, tmp_path)
+        for name in ("sequence_LST1_04185.0010.history", "sequence_LST1_04183.history")
+    ]
+
+    assert migrate_history_files(history_files, db_file) == 6
+    # Only new lines are imported when migrating the same files again
+    assert migrate_history_files(history_files, db_file) == 0
+
+    failed_history_file = tmp_path / "sequence_LST1_04186.history"
+    shutil.copy(history_files_dir / "sequence_LST1_04183_failed.history", failed_history_file)
+    assert migrate_history_files([failed_history_file], db_file) == 4
+    assert get_failed_twice(db_file) == ["sequence_LST1_04186"]
+
+    entries = get_history_entries(db_file)
+    assert sorted(entries) == [4183, 4185, 4186]
+    assert len(entries[4185]["sequence_LST1_04185.0010"]) == 4
+
+    # The size of each history file is stored with its last entry
+    history_sizes = get_history_sizes(db_file)
+    for history_file in history_files + [failed_history_file]:
+        assert history_sizes[Path(history_file).stem] == Path(history_file).stat().st_size
+
+
+def test_are_all_jobs_correctly_finished_history_db(tmp_path, monkeypatch):
+    from osa.configs.datamodel import Sequence
+    from osa.history import history_db_file, migrate_history_files
+    from osa.job import are_all_jobs_correctly_finished
+
+    monkeypatch.setattr(options, "directory", tmp_path)
+    monkeypatch.setattr(options, "dl1_prod_id", "tailcut84")
+    monkeypatch.setattr(options, "dl2_prod_id", "model1")
+    monkeypatch.setattr(options, "no_dl2", False)
+
+    history_file = shutil.copy(history_files_dir / "sequence_LST1_04185.0010.history", tmp_path)
+    migrate_history_files([history_file], history_db_file())
+
+    sequence = Sequence()
+    sequence.seq = 2
+    sequence.run = 4185
+    sequence.type = "DATA"
+    assert are_all_jobs_correctly_finished([sequence])
+
+    monkeypatch.setattr(options, "dl2_prod_id", "model2")
+    assert not are_all_jobs_correctly_finished([sequence])
+
+
+def test_get_history_levels(tmp_path, monkeypatch):
+    from osa.configs.datamodel import Sequence
+    from osa.job import get_history_levels
+
+    monkeypatch.setattr(options, "directory", tmp_path)
+    monkeypatch.setattr(options, "dl1_prod_id", "tailcut84")
+    monkeypatch.setattr(options, "dl2_prod_id", "model1")
+
+    history_file = history_files_dir / "sequence_LST1_04185.0010.history"
+    shutil.copy(history_file, tmp_path)
+    # Subrun not finished yet
+    (tmp_path / "sequence_LST1_04185.0011.history").write_text(
+        history_file.read_text().splitlines()[0] + "\n"
+    )
+    # History of a run not in the sequence list
+    shutil.copy(history_file, tmp_path / "sequence_LST1_14185.0010.history")
+
+    sequence = Sequence()
+    sequence.seq = 2
+    sequence.run = 4185
+    sequence.type = "DATA"
+
+    levels = get_history_levels([sequence], n_threads=2).set_index("history")
+    assert sorted(levels.index) == ["sequence_LST1_04185.0010", "sequence_LST1_04185.0011"]
+    assert levels.loc["sequence_LST1_04185.0010", "level"] == 0
+    assert levels.loc["sequence_LST1_04185.0011", "level"] == 3
+
+
+def test_upgrade_history_db(tmp_path, monkeypatch):
+    import sqlite3
+
+    from osa import history
+
+    db_file = tmp_path / "history.db"
+    with history.open_history_db(db_file) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == 2
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(history)")]
+        assert "file_size" in columns
+
+    # Upgrade to a new schema version adding a column, which is added only once
+    # even if a concurrent job already added it
+    monkeypatch.setattr(history, "HISTORY_SCHEMA_VERSION", 4)
+    monkeypatch.setattr(
+        history,
+        "HISTORY_MIGRATIONS",
+        {
+            3: ["ALTER TABLE history ADD COLUMN node TEXT"],
+            4: ["ALTER TABLE history ADD COLUMN node TEXT"],
+        },
+    )
+    with history.open_history_db(db_file) as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(history)")]
+        assert columns.count("node") == 1
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == 4
+
+    connection = sqlite3.connect(db_file)
+    connection.execute("PRAGMA user_version = 3")
+    connection.close()
+    with history.open_history_db(db_file) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone()[0] == 4
+
+
+def test_history_db_not_matching_files(tmp_path, monkeypatch):
+    from osa.configs.datamodel import Sequence
+    from osa.history import history_db_file, migrate_history_files
+    from osa.job import get_history_levels
+    from osa.veto import update_vetoes
+
+    monkeypatch.setattr(options, "directory", tmp_path)
+    monkeypatch.setattr(options, "dl1_prod_id", "tailcut84")
+    monkeypatch.setattr(options, "dl2_prod_id", "model1")
+
+    history_file = tmp_path / "sequence_LST1_04185.0010.history"
+    lines = [f"{line}\n" for line in (history_files_dir / history_file.name).read_text().splitlines()]
+    history_file.write_text("".join(lines[:2]))
+    migrate_history_files([history_file], history_db_file())
+    # Entries missing in the database, e.g. lost inserts
+    failed_line = lines[2].replace(" 0\n", " 1\n")
+    history_file.write_text("".join(lines) + failed_line * 2)
+
+    sequence = Sequence()
+    sequence.seq = 2
+    sequence.run = 4185
+    sequence.type = "DATA"
+    sequence.history = history_file
+    sequence.veto = tmp_path / "sequence_LST1_04185.0010.veto"
+
+    levels = get_history_levels([sequence]).set_index("history")
+    assert levels.loc["sequence_LST1_04185.0010", "exit_status"] == 1
+
+    update_vetoes([sequence])
+    assert sequence.veto.exists()
+
+
+def test_history_db_not_readable(tmp_path, monkeypatch):
+    from osa.configs.datamodel import Sequence
+    from osa.history import history_db_file
+    from osa.job import get_history_levels
+    from osa.veto import update_vetoes
+
+    monkeypatch.setattr(options, "directory", tmp_path)
+    monkeypatch.setattr(options, "dl1_prod_id", "tailcut84")
+    monkeypatch.setattr(options, "dl2_prod_id", "model1")
+
+    # Corrupt database: the history files are enough
+    history_db_file().parent.mkdir()
+    history_db_file().write_text("not a database")
+    history_file = shutil.copy(
+        history_files_dir / "sequence_LST1_04183_failed.history",
+        tmp_path / "sequence_LST1_04183.history",
+    )
+
+    sequence = Sequence()
+    sequence.seq = 1
+    sequence.run = 4183
+    sequence.type = "PEDCALIB"
+    sequence.history = history_file
+    sequence.veto = tmp_path / "sequence_LST1_04183.veto"
+
+    levels = get_history_levels([sequence]).set_index("history")
+    assert levels.loc["sequence_LST1_04183", "exit_status"] != 0
+
+    update_vetoes([sequence])
+    assert sequence.veto.exists()
+
+
+def test_migrate_history_files_with_recorded_entries(tmp_path, monkeypatch):
+    from osa.configs.datamodel import Sequence
+    from osa.history import (
+        get_failed_twice,
+        get_history_entries,
+        get_history_sizes,
+        history_db_file,
+        migrate_history_files,
+        parse_history_line,
+        record_history,
+    )
+    from osa.veto import update_vetoes
+
+    monkeypatch.setattr(options, "directory", tmp_path)
+    db_file = history_db_file()
+
+    # First line written before the history database existed, second one
+    # (a failure) recorded by the analysis stage of a night still in progress
+    history_file = tmp_path / "sequence_LST1_01807.0001.history"
+    lines = [
+        "01807.0001 r0_to_dl1 v0.9.0 2022-01-01 12:00 LST-1.1.Run01807.0001.fits.fz None 0\n",
+        "01807.0001 dl1ab tailcut84 2022-01-01 12:10 dl1_LST-1.Run01807.0001.h5 None 1\n",
+    ]
+    history_file.write_text(lines[0])
+    with open(history_file, "a") as file:
+        file.write(lines[1])
+    entry = parse_history_line(lines[1])
+    record_history(
+        history_file, entry["run"], entry["prod_id"], entry["stage"], entry["rc"],
+        input_file=entry["input_file"], timestamp=entry["timestamp"],
+        file_size=history_file.stat().st_size, db_file=db_file,
+    )
+
+    # Only the line not recorded yet is imported, and sorted as in the history file
+    assert migrate_history_files([history_file], db_file) == 1
+    assert get_history_entries(db_file)[1807][history_file.stem] == [
+        ("r0_to_dl1", "v0.9.0", 0),
+        ("dl1ab", "tailcut84", 1),
+    ]
+    assert get_history_sizes(db_file)[history_file.stem] == history_file.stat().st_size
+    assert get_failed_twice(db_file) == []
+
+    sequence = Sequence()
+    sequence.history = history_file
+    sequence.veto = tmp_path / "sequence_LST1_01807.0001.veto"
+    update_vetoes([sequence])
+    assert not sequence.veto.exists()
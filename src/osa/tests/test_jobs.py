@@ -1,7 +1,10 @@
 import os
+import subprocess
+from io import StringIO
 from pathlib import Path
 from textwrap import dedent
 
+import pandas as pd
 import pytest
 
 from osa.configs import options
@@ -337,6 +340,41 @@ def test_create_job_template_local(
     assert content2 == expected_content2
 
 
+def test_create_job_template_bash(
+    sequence_list,
+    drs4_time_calibration_files,
+    drs4_baseline_file,
+    calibration_file,
+    run_summary_file,
+    pedestal_ids_file,
+):
+    """Check the bash pilot job file in local mode (assuming no scheduler)."""
+    from osa.job import data_sequence_job_template, sequence_filenames
+
+    options.test = True
+    options.simulate = True
+    cfg.set("SLURM", "PILOT_SCRIPT", "bash")
+
+    try:
+        sequence_filenames(sequence_list[2])
+        assert sequence_list[2].script.suffix == ".sh"
+        content = data_sequence_job_template(sequence_list[2])
+    finally:
+        cfg.set("SLURM", "PILOT_SCRIPT", "python")
+        sequence_filenames(sequence_list[2])
+
+    assert content.startswith("#!/bin/bash\n\nsubruns=0000\n")
+    assert "trap 'rm -rf \"${NUMBA_CACHE_DIR}\"' EXIT" in content
+    assert "\ndatasequence \\\n" in content
+    assert "    --config \\\n" in content
+    assert f"    --pedcal-file={calibration_file} \\\n" in content
+    assert (
+        f'    --pedestal-ids-file={Path.cwd()}/test_osa/test_files0/auxiliary/PedestalFinder/'
+        f'20200117/pedestal_ids_Run01808."${{subruns}}".h5 \\\n'
+    ) in content
+    assert content.endswith("    \"01808.${subruns}\" \\\n    LST1\n")
+
+
 def test_create_job_scheduler_calibration(sequence_list):
     """Check the pilot job file for the calibration pipeline."""
     from osa.job import calibration_sequence_job_template
@@ -453,3 +491,194 @@ def test_plot_job_statistics(sacct_output, running_analysis_dir):
     plot_job_statistics(sacct_output, log_dir)
     plot_file = log_dir / "job_statistics.pdf"
     assert plot_file.exists()
+
+
+def test_sacct_cache(mock_sacct_output, running_analysis_dir, monkeypatch):
+    import osa.job
+    from osa.job import update_sacct_cache, read_sacct_cache, get_sacct_output
+
+    db_file = running_analysis_dir / "log" / "sacct_cache.db"
+    sacct_lines = mock_sacct_output.read_text().splitlines(keepends=True)
+    starttimes = []
+
+    def mock_run_sacct(starttime=None):
+        starttimes.append(starttime)
+        # The second poll only returns the records updated since the first one
+        if len(starttimes) == 1:
+            return StringIO("".join(sacct_lines))
+        return StringIO(sacct_lines[0].replace("FAILED", "COMPLETED"))
+
+    monkeypatch.setattr(osa.job, "run_sacct", mock_run_sacct)
+
+    update_sacct_cache(db_file)
+    cached_output = get_sacct_output(read_sacct_cache(db_file, update=False))
+    pd.testing.assert_frame_equal(cached_output, get_sacct_output(mock_sacct_output))
+
+    update_sacct_cache(db_file)
+    assert starttimes[0] is None
+    assert starttimes[1] is not None
+    cached_output = get_sacct_output(read_sacct_cache(db_file, update=False))
+    assert len(cached_output) == len(sacct_lines)
+    assert cached_output.iloc[0]["State"] == "COMPLETED"
+
+
+def test_sacct_cache_simulate(mock_sacct_output, tmp_path, monkeypatch):
+    import osa.job
+    from osa.job import update_sacct_cache, read_sacct_cache
+
+    db_file = tmp_path / "log" / "sacct_cache.db"
+    monkeypatch.setattr(osa.job, "run_sacct", lambda starttime=None: StringIO(mock_sacct_output.read_text()))
+    monkeypatch.setattr(options, "simulate", True)
+
+    # Without a cache, sacct is queried directly and nothing is written
+    assert read_sacct_cache(db_file).read() == mock_sacct_output.read_text()
+    assert not db_file.parent.exists()
+
+    # An existing cache is only read
+    monkeypatch.setattr(options, "simulate", False)
+    update_sacct_cache(db_file)
+    cache = db_file.read_bytes()
+    monkeypatch.setattr(options, "simulate", True)
+    assert len(read_sacct_cache(db_file).readlines()) == len(mock_sacct_output.read_text().splitlines())
+    assert db_file.read_bytes() == cache
+
+
+def test_wait_for_jobs(monkeypatch):
+    import osa.job
+    from osa.job import wait_for_jobs
+
+    polls = iter(
+        [
+            {"123": ["RUNNING"], "124": ["PENDING"]},
+            {"123": ["COMPLETED"], "124": ["RUNNING", "COMPLETED"]},
+            {"123": ["COMPLETED"], "124": ["COMPLETED", "COMPLETED"]},
+        ]
+    )
+    sleeps = []
+    monkeypatch.setattr(osa.job.shutil, "which", lambda cmd: f"/usr/bin/{cmd}")
+    monkeypatch.setattr(osa.job.time, "sleep", sleeps.append)
+    monkeypatch.setattr(osa.job, "get_jobs_state", lambda job_ids: next(polls))
+    monkeypatch.setattr(options, "test", False)
+    monkeypatch.setattr(options, "simulate", False)
+
+    assert wait_for_jobs(["123", "124"]) is True
+    # Exponential backoff between consecutive checks
+    assert sleeps == [30, 60]
+
+    # Stop waiting as soon as one of the jobs fails
+    monkeypatch.setattr(
+        osa.job, "get_jobs_state", lambda job_ids: {"123": ["FAILED"], "124": ["RUNNING"]}
+    )
+    assert wait_for_jobs(["123", "124"]) is False
+    assert sleeps == [30, 60]
+
+
+def test_create_job_template_chunk(sequence_list, running_analysis_dir, pedestal_ids_file):
+    """Check the job file processing several subruns per job array task."""
+    from osa.job import data_sequence_job_template, scheduler_env_variables
+
+    options.test = False
+    options.simulate = True
+    cfg.set("SLURM", "SUBRUNS_PER_TASK", "4")
+    cfg.set("SLURM", "TASK_PROCESSES", "2")
+
+    try:
+        env_variables = scheduler_env_variables(sequence_list[2])
+        content = data_sequence_job_template(sequence_list[2])
+    finally:
+        cfg.set("SLURM", "SUBRUNS_PER_TASK", "1")
+        cfg.set("SLURM", "TASK_PROCESSES", "1")
+
+    # 9 subruns in chunks of 4
+    assert "#SBATCH --array=0-2" in env_variables
+    assert "#SBATCH --cpus-per-task=2" in env_variables
+    assert "task = int(os.getenv('SLURM_ARRAY_TASK_ID'))\n" in content
+    assert "subrun_list = range(task * 4, min((task + 1) * 4, 9))\n" in content
+    assert "        f'01808.{subruns:04d}',\n" in content
+    assert "ThreadPoolExecutor(max_workers=2)" in content
+    assert "    env = dict(os.environ, OSA_PILOT_START=str(time.time()))\n" in content
+    # Single numba cache directory for the whole chunk
+    assert content.count("NUMBA_CACHE_DIR") == 1
+    assert content.endswith("sys.exit(next((rc for rc in return_codes if rc != 0), 0))")
+
+
+def test_create_job_template_bash_chunk(sequence_list, running_analysis_dir, tmp_path):
+    """Check the bash pilot job file processing several subruns per task."""
+    from osa.job import data_sequence_bash_template
+
+    options.test = True
+    options.simulate = True
+    cfg.set("SLURM", "SUBRUNS_PER_TASK", "4")
+    cfg.set("SLURM", "TASK_PROCESSES", "2")
+
+    try:
+        content = data_sequence_bash_template(sequence_list[2], ["datasequence"])
+    finally:
+        cfg.set("SLURM", "SUBRUNS_PER_TASK", "1")
+        cfg.set("SLURM", "TASK_PROCESSES", "1")
+
+    assert "    export OSA_PILOT_START=$(date +%s.%N)\n" in content
+
+    # Fake datasequence storing its launch time, with subruns 1 and 2 failing
+    fake_bin = tmp_path / "bin"
+    fake_bin.mkdir()
+    fake_datasequence = fake_bin / "datasequence"
+    fake_datasequence.write_text(
+        "#!/bin/bash\n"
+        f'echo "${{OSA_PILOT_START}}" > {tmp_path}/start_"$1"\n'
+        'case "$1" in *.0001) sleep 1; exit 3 ;; *.0002) exit 5 ;; esac\n'
+    )
+    fake_datasequence.chmod(0o755)
+    script = tmp_path / "sequence_LST1_01808.sh"
+    script.write_text(content)
+
+    env = {**os.environ, "PATH": f"{fake_bin}:{os.environ['PATH']}"}
+    proc = subprocess.run(["bash", str(script)], cwd=running_analysis_dir, env=env)
+
+    # Exit code of the first subrun that failed, even if another one fails before it finishes
+    assert proc.returncode == 3
+    for subrun in range(4):
+        start = (tmp_path / f"start_01808.{subrun:04d}").read_text()
+        assert float(start) > 0
+
+
+def test_submit_job_array(running_analysis_dir, tmp_path):
+    from osa.job import submit_job_array
+
+    options.simulate = False
+    options.directory = running_analysis_dir
+
+    # Fake sbatch storing its arguments and returning a job ID
+    sbatch_args = tmp_path / "sbatch_args"
+    fake_sbatch = tmp_path / "sbatch"
+    fake_sbatch.write_text(f'#!/bin/bash\necho "$@" > {sbatch_args}\necho "12345;cluster"\n')
+    fake_sbatch.chmod(0o755)
+
+    commands = {
+        1807: ["echo", "--input-file", "datacheck_dl1_LST-1.Run01807.*.h5"],
+        1808: ["echo", "--input-file", "datacheck_dl1_LST-1.Run01808.*.h5"],
+    }
+    job_id = submit_job_array(
+        commands, "merge_test", dependency=["111", "222"], batch_command=str(fake_sbatch)
+    )
+    options.simulate = True
+
+    assert job_id == "12345"
+    script = running_analysis_dir / "log" / "merge_test_array.sh"
+    assert sbatch_args.read_text().split() == [
+        "--parsable",
+        "-D",
+        str(running_analysis_dir),
+        "--job-name=echo",
+        "--array=0-1",
+        "-o",
+        "log/merge_test_array_%A_%a.log",
+        "--dependency=afterok:111,222",
+        str(script),
+    ]
+
+    # The second task runs the command of the second run, without expanding the pattern
+    env = {**os.environ, "SLURM_ARRAY_TASK_ID": "1", "SLURM_ARRAY_JOB_ID": "12345"}
+    subprocess.run(["bash", str(script)], cwd=running_analysis_dir, env=env, check=True)
+    task_log = running_analysis_dir / "log" / "merge_test_01808_12345.log"
+    assert task_log.read_text() == "--input-file datacheck_dl1_LST-1.Run01808.*.h5\n"
@@ -100,3 +100,75 @@ def test_get_run_date(merged_run_summary):
     assert get_run_date(1808) == datetime(2020,1,17)
 
     assert get_run_date(1200) == datetime(2020,1,17)
+
+
+def test_get_run_date_index(merged_run_summary, tmp_path, monkeypatch):
+    import osa.paths
+    from astropy.table import Table
+    from osa.paths import get_run_date_index
+
+    index_file = tmp_path / "merged_RunSummary_dates.npz"
+    cfg.set("LST1", "MERGED_SUMMARY_INDEX", str(index_file))
+    monkeypatch.setattr(osa.paths, "_RUN_DATE_INDEX_CACHE", {})
+    try:
+        run_date_index = get_run_date_index()
+        assert run_date_index[1808] == "2020-01-17"
+        # Cached in memory
+        assert get_run_date_index() is run_date_index
+        assert index_file.exists()
+
+        def table_read(*args, **kwargs):
+            raise AssertionError("The merged run summary should not be parsed again")
+
+        # Read from the binary index file once the in-memory cache is gone
+        monkeypatch.setattr(Table, "read", table_read)
+        monkeypatch.setattr(osa.paths, "_RUN_DATE_INDEX_CACHE", {})
+        assert get_run_date_index() == run_date_index
+    finally:
+        cfg.set("LST1", "MERGED_SUMMARY_INDEX", "")
+
+
+def test_scan_output_files(tmp_path):
+    from osa.paths import scan_output_files
+
+    options.dl1_prod_id = "tailcut84"
+    options.dl2_prod_id = "model2"
+
+    dl1ab_dir = tmp_path / options.dl1_prod_id
+    dl2_dir = tmp_path / options.dl2_prod_id
+    log_dir = tmp_path / "log"
+    other_dir = tmp_path / "tailcut42"
+    for directory in (dl1ab_dir, dl2_dir, log_dir, other_dir):
+        directory.mkdir()
+
+    files = [
+        tmp_path / "dl1_LST-1.Run01808.0011.h5",
+        tmp_path / "muons_LST-1.Run01808.0011.fits",
+        tmp_path / "interleaved_LST-1.Run01808.0011.h5",
+        dl1ab_dir / "dl1_LST-1.Run01808.0011.h5",
+        dl1ab_dir / "datacheck_dl1_LST-1.Run01808.0011.h5",
+        dl1ab_dir / "datacheck_dl1_LST-1.Run01808.h5",
+        dl2_dir / "dl2_LST-1.Run01808.0011.h5",
+        # Files not expected to be indexed
+        tmp_path / "calibration_filters_52.Run01809.0000.h5",
+        tmp_path / "sequence_LST1_01808.0011.history",
+        log_dir / "Run01808.0011_jobid.out",
+        other_dir / "dl1_LST-1.Run01808.0011.h5",
+        other_dir / "datacheck_dl1_LST-1.Run01808.0011.h5",
+        # Same key as the DL1 file of subrun 11
+        tmp_path / "dl1_LST-1.Run01808.0011.hdf5",
+    ]
+    for file in files:
+        file.touch()
+
+    file_index = scan_output_files(tmp_path)
+    # Only one of the files with the same key is kept
+    assert file_index.pop(("DL1", 1808, 11)) in {files[0], files[-1]}
+    assert file_index == {
+        ("MUON", 1808, 11): files[1],
+        ("INTERLEAVED", 1808, 11): files[2],
+        ("DL1AB", 1808, 11): files[3],
+        ("DATACHECK", 1808, 11): files[4],
+        ("DATACHECK", 1808, None): files[5],
+        ("DL2", 1808, 11): files[6],
+    }
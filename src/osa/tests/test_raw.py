@@ -17,7 +17,7 @@ def test_get_raw_dir():
     assert get_raw_dir(options.date) == r0_dir
 
 
-def test_get_check_raw_dir(r0_dir):
+def test_get_check_raw_dir(r0_dir, r0_data):
     options.date = datetime.fromisoformat("2020-01-18")
     from osa.raw import get_check_raw_dir
 
@@ -29,6 +29,19 @@ def test_get_check_raw_dir(r0_dir):
     assert raw_dir.resolve() == r0_dir
 
 
+def test_get_check_raw_dir_without_r0_files(tmp_path, monkeypatch):
+    from osa import raw
+
+    (tmp_path / "LST-1.1.Run01807.0000.fits").touch()
+    monkeypatch.setattr(raw, "get_raw_dir", lambda date: tmp_path)
+
+    with pytest.raises(OSError, match="Empty raw directory"):
+        raw.get_check_raw_dir(options.date)
+
+    (tmp_path / "LST-1.1.Run01807.0000.fits.fz").touch()
+    assert raw.get_check_raw_dir(options.date) == tmp_path
+
+
 def test_is_raw_data_available(r0_data):
     from osa.raw import is_raw_data_available
 
@@ -37,3 +50,30 @@ def test_is_raw_data_available(r0_data):
 
     options.date = datetime.fromisoformat("2020-01-17")
     assert is_raw_data_available(options.date) is True
+
+
+def test_r0_inventory(tmp_path):
+    from osa.raw import incomplete_subruns, missing_runs, r0_inventory
+
+    r0_dir = tmp_path / "R0"
+    r0g_dir = tmp_path / "R0G"
+    r0_dir.mkdir()
+    r0g_dir.mkdir()
+    for stream in range(1, 5):
+        for subrun in range(3):
+            (r0_dir / f"LST-1.{stream}.Run01807.{subrun:04d}.fits.fz").write_bytes(b"0" * stream)
+        (r0g_dir / f"LST-1.{stream}.Run01807.0000.fits.fz").touch()
+    # Subrun with a missing stream and a run not gain selected
+    (r0_dir / "LST-1.4.Run01807.0002.fits.fz").unlink()
+    (r0_dir / "LST-1.1.Run01808.0000.fits.fz").touch()
+    (r0_dir / "LST-1.1.Run01808.0000.fits.fz.tmp").touch()
+
+    r0_files = r0_inventory(r0_dir)
+    assert len(r0_files) == 12
+    assert list(r0_files.columns) == ["run", "subrun", "stream", "size", "path"]
+    assert r0_files.iloc[3].tolist() == [1807, 0, 4, 4, r0_dir / "LST-1.4.Run01807.0000.fits.fz"]
+
+    incomplete = incomplete_subruns(r0_files)
+    assert incomplete.values.tolist() == [[1807, 2, 3], [1808, 0, 1]]
+    assert missing_runs(r0_files, r0_inventory(r0g_dir)).tolist() == [1808]
+    assert r0_inventory(tmp_path / "R0_missing").empty
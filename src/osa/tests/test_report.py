@@ -48,3 +48,8 @@ def test_history(base_test_dir):
 
     assert history_file.exists()
     assert history_file.read_text() == logged_string
+
+    from osa.history import get_history_entries, history_db_file
+
+    entries = get_history_entries(history_db_file(base_test_dir))
+    assert entries[1800]["r0_to_dl1_01800"] == [("r0_to_dl1", "v1.0.0", 0)]
@@ -2,8 +2,12 @@
 
 import filecmp
 import logging
+import os
 import pathlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from os import remove, rename
+from typing import Iterable, List
 
 from osa.configs import options
 from osa.utils.logging import myLogger
@@ -13,8 +17,14 @@ log = myLogger(logging.getLogger(__name__))
 __all__ = [
     "write_to_file",
     "append_to_file",
+    "append_in_single_write",
+    "transfer_file",
+    "transfer_files",
 ]
 
+# ioctl request cloning a file into another one sharing its blocks (reflink)
+FICLONE = 0x40049409
+
 
 def write_to_file(file: pathlib.Path, content: str):
     """Check if the file already exists and write the content in it."""
@@ -67,3 +77,133 @@ def append_to_file(file: pathlib.Path, content: str) -> None:
                     log.exception(f"{e.strerror} {e.filename}")
     else:
         write_to_file(file, content)
+
+
+def append_in_single_write(file: pathlib.Path, content: str) -> None:
+    """
+    Append the content to a file (created if needed) with O_APPEND writes, so that
+    the lines appended at the same time by concurrent jobs do not interleave.
+    Short writes are resumed until the whole content is written.
+
+    Parameters
+    ----------
+    file: pathlib.Path
+        The file to write in.
+    content: str
+        The content to append to the file.
+    """
+    data = content.encode()
+    fd = os.open(file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+
+def is_same_file_copy(source: pathlib.Path, destination: pathlib.Path) -> bool:
+    """Whether the destination already exists with the size and modification time of the source."""
+    try:
+        source_stat = source.stat()
+        destination_stat = destination.stat()
+    except FileNotFoundError:
+        return False
+    return (
+        source_stat.st_size == destination_stat.st_size
+        and int(source_stat.st_mtime) == int(destination_stat.st_mtime)
+    )
+
+
+def copy_file_data(source: pathlib.Path, destination: pathlib.Path) -> None:
+    """
+    Copy the content of a file, sharing its blocks (reflink) if the filesystem
+    supports it, otherwise in the kernel with os.copy_file_range, and falling
+    back to shutil.copyfile (which uses os.sendfile) if that is not possible.
+    """
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        try:
+            import fcntl
+
+            fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return
+        except (ImportError, OSError):
+            pass
+
+        size = os.fstat(source_file.fileno()).st_size
+        copied = 0
+        try:
+            while copied < size:
+                n_bytes = os.copy_file_range(
+                    source_file.fileno(), destination_file.fileno(), size - copied
+                )
+                if n_bytes == 0:
+                    break
+                copied += n_bytes
+            return
+        except (AttributeError, OSError):
+            if copied > 0:
+                raise
+
+    shutil.copyfile(source, destination)
+
+
+def transfer_file(source: pathlib.Path, destination_dir: pathlib.Path) -> pathlib.Path:
+    """
+    Transfer a file into a directory. It is hard linked if both are in the same
+    filesystem, otherwise copied under a temporary name keeping its modification
+    time, checking its size and renaming it. Files already transferred (same size
+    and modification time) are skipped.
+
+    Returns
+    -------
+    destination: pathlib.Path
+        Path of the transferred file.
+    """
+    source = pathlib.Path(source)
+    destination = pathlib.Path(destination_dir) / source.name
+
+    if is_same_file_copy(source, destination):
+        log.debug(f"{destination} already transferred")
+        return destination
+
+    if source.stat().st_dev == destination.parent.stat().st_dev:
+        try:
+            destination.unlink(missing_ok=True)
+            os.link(source, destination)
+            return destination
+        except OSError as error:
+            log.debug(f"Could not hard link {source}: {error}")
+
+    temporary_file = destination.with_name(f".{destination.name}.tmp")
+    try:
+        copy_file_data(source, temporary_file)
+        shutil.copystat(source, temporary_file)
+        if temporary_file.stat().st_size != source.stat().st_size:
+            raise OSError(f"Size of {temporary_file} differs from the one of {source}")
+        rename(temporary_file, destination)
+    finally:
+        temporary_file.unlink(missing_ok=True)
+
+    return destination
+
+
+def transfer_files(
+    files: Iterable[pathlib.Path], destination_dir: pathlib.Path, max_workers: int = 4
+) -> List[pathlib.Path]:
+    """
+    Transfer files into a directory (see `transfer_file`), copying
+    at most `max_workers` files at the same time.
+
+    Returns
+    -------
+    destinations: list of pathlib.Path
+        Path of the transferred files.
+    """
+    files = list(dict.fromkeys(pathlib.Path(file) for file in files))
+    if not files:
+        return []
+
+    pathlib.Path(destination_dir).mkdir(parents=True, exist_ok=True)
+    log.info(f"Transferring {len(files)} files to {destination_dir}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda file: transfer_file(file, destination_dir), files))
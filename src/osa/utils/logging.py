@@ -8,6 +8,10 @@ DEFAULT_LOGGING_FORMAT = (
 
 __all__ = ["myLogger"]
 
+# Heavy dependencies are imported lazily, i.e. once the osa handlers are set.
+# Keep their informative messages out of the output of the scripts.
+logging.getLogger("numexpr").setLevel(logging.WARNING)
+
 
 class MyFormatter(logging.Formatter):
     """Customize formatter of info logging level."""
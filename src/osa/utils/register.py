@@ -1,9 +1,14 @@
 """Identify files to be moved to their final destination directories"""
 
+import json
 import logging
+import os
 import re
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable
 
 from osa.configs import options
 from osa.configs.config import cfg
@@ -13,6 +18,9 @@ from osa.veto import set_closed_sequence
 
 __all__ = [
     "register_files",
+    "register_file",
+    "register_concept_files",
+    "resume_registration",
     "register_run_concept_files",
     "register_found_pattern",
     "register_non_existing_file",
@@ -20,6 +28,9 @@ __all__ = [
 
 log = myLogger(logging.getLogger(__name__))
 
+# Manifest (in the log directory) of the files moved to the final data directories
+REGISTER_MANIFEST = "register_manifest.jsonl"
+
 ANALYSIS_PRODUCTS = [
     "DL1AB",
     "DATACHECK",
@@ -54,12 +65,170 @@ def register_files(run_str, analysis_dir, prefix, suffix, output_dir) -> None:
     file_list = analysis_dir.rglob(f"{prefix}*{run_str}*{suffix}")
 
     for input_file in file_list:
-        output_file = output_dir / input_file.name
-        if not output_file.exists():
-            log.debug(f"Moving file {input_file} to {output_dir}")
-            shutil.move(input_file, output_file)
-            # Keep DL1 and muons symlink in running_analysis
-            create_symlinks(input_file, output_file, prefix, suffix)
+        register_file(input_file, output_dir, prefix, suffix)
+
+
+def register_file(input_file: Path, output_dir: Path, prefix: str, suffix: str) -> bool:
+    """
+    Move a file into its final data directory unless it is already there.
+
+    Returns
+    -------
+    bool
+        True if the file was moved.
+    """
+    output_file = output_dir / input_file.name
+    if output_file.exists():
+        return False
+
+    log.debug(f"Moving file {input_file} to {output_dir}")
+    shutil.move(input_file, output_file)
+    # Keep DL1 and muons symlink in running_analysis
+    create_symlinks(input_file, output_file, prefix, suffix)
+    return True
+
+
+def register_manifest_file() -> Path:
+    """Path of the manifest keeping track of the files moved by the closer."""
+    return Path(options.directory) / "log" / REGISTER_MANIFEST
+
+
+def write_manifest_entries(manifest: Path, entries: list) -> None:
+    """Append a list of entries to the manifest in a single write."""
+    with open(manifest, "a") as file:
+        file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def pending_manifest_entries(manifest: Path) -> list:
+    """Return the entries of the manifest of the moves not finished yet."""
+    if not manifest.exists():
+        return []
+
+    entries = {}
+    with open(manifest, "r") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted write
+                continue
+            if entry["status"] == "pending":
+                entries[entry["src"]] = entry
+            else:
+                entries.pop(entry["src"], None)
+
+    return list(entries.values())
+
+
+def resume_registration(manifest: Path) -> None:
+    """
+    Finish the moves left pending by an interrupted closer, i.e. move the
+    file if it is still in running_analysis or else create its symlinks.
+    A destination file whose size does not match the one in the manifest
+    is the partial copy of an interrupted move, so it is moved again.
+    """
+    entries = pending_manifest_entries(manifest)
+    if not entries:
+        return
+
+    log.info(f"Resuming the registration of {len(entries)} files from {manifest}")
+
+    for entry in entries:
+        input_file, output_file = Path(entry["src"]), Path(entry["dst"])
+        prefix = cfg.get("PATTERN", f"{entry['concept']}PREFIX")
+        suffix = cfg.get("PATTERN", f"{entry['concept']}SUFFIX")
+
+        if (
+            output_file.exists()
+            and input_file.exists()
+            and not input_file.is_symlink()
+            and output_file.stat().st_size != entry["size"]
+        ):
+            # Truncated destination of an interrupted cross-filesystem move
+            log.warning(f"Removing incomplete file {output_file}, moving it again")
+            output_file.unlink()
+
+        if output_file.exists():
+            if input_file.exists() and not input_file.is_symlink():
+                # Remove the leftover copy of a cross-filesystem move
+                input_file.unlink()
+            if not input_file.is_symlink():
+                create_symlinks(input_file, output_file, prefix, suffix)
+        elif input_file.exists():
+            register_file(input_file, output_file.parent, prefix, suffix)
+        else:
+            log.warning(f"File {input_file} not found, it cannot be registered")
+
+    write_manifest_entries(manifest, [{**entry, "status": "done"} for entry in entries])
+
+
+def register_concept_files(file_list: Iterable[Path], concept: str, output_dir: Path) -> int:
+    """
+    Move a list of files of a given data level (concept) into their
+    final data directory in one go, e.g. using the index of files
+    obtained with `osa.paths.scan_output_files`.
+
+    The files are moved concurrently by a pool of threads. Every move is
+    recorded in a manifest before and after it is done, so that the moves
+    interrupted in a previous execution can be finished by `resume_registration`
+    before registering the files of all the data levels.
+
+    Parameters
+    ----------
+    file_list: Iterable[pathlib.Path]
+    concept: str
+    output_dir: pathlib.Path
+
+    Returns
+    -------
+    n_files: int
+        Number of files moved.
+    """
+    prefix = cfg.get("PATTERN", f"{concept}PREFIX")
+    suffix = cfg.get("PATTERN", f"{concept}SUFFIX")
+
+    manifest = register_manifest_file()
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+
+    file_list = [file for file in file_list if not (output_dir / file.name).exists()]
+    if not file_list:
+        return 0
+
+    entries = [
+        {
+            "concept": concept,
+            "src": str(file),
+            "dst": str(output_dir / file.name),
+            "size": file.stat().st_size,
+            "status": "pending",
+        }
+        for file in file_list
+    ]
+    write_manifest_entries(manifest, entries)
+
+    n_threads = cfg.getint("LSTOSA", "REGISTER_THREADS", fallback=8)
+    t_start = time.perf_counter()
+
+    def register(entry):
+        register_file(Path(entry["src"]), output_dir, prefix, suffix)
+        return {**entry, "status": "done"}
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        finished = list(executor.map(register, entries))
+
+    write_manifest_entries(manifest, finished)
+
+    elapsed = max(time.perf_counter() - t_start, 1e-6)
+    n_bytes = sum(entry["size"] for entry in finished)
+    log.info(
+        f"{len(finished)} {concept} files ({n_bytes / 1e9:.2f} GB) registered in "
+        f"{elapsed:.1f} s: {len(finished) / elapsed:.1f} files/s, "
+        f"{n_bytes / 1e6 / elapsed:.1f} MB/s"
+    )
+
+    return len(finished)
 
 
 def create_symlinks(input_file, output_file, prefix, suffix):
@@ -9,3 +9,60 @@ def test_write_and_append_to_file(txt_file_test):
     append_to_file(txt_file_test, "\nAnother line")
     options.simulate = True
     assert txt_file_test.read_text() == "This is a test\nAnother line"
+
+
+def test_transfer_files(tmp_path):
+    from osa.utils.iofile import transfer_files
+
+    source_dir = tmp_path / "R0"
+    source_dir.mkdir()
+    files = []
+    for stream in range(1, 5):
+        file = source_dir / f"LST-1.{stream}.Run01807.0000.fits.fz"
+        file.write_bytes(bytes(range(256)) * stream)
+        files.append(file)
+
+    destination_dir = tmp_path / "R0G"
+    transferred = transfer_files(files, destination_dir, max_workers=2)
+    assert transferred == [destination_dir / file.name for file in files]
+    for source, destination in zip(files, transferred):
+        assert destination.read_bytes() == source.read_bytes()
+        assert int(destination.stat().st_mtime) == int(source.stat().st_mtime)
+
+    # Files already transferred are skipped
+    assert transfer_files(files, destination_dir) == transferred
+    assert not list(destination_dir.glob(".*.tmp"))
+
+
+def test_transfer_file_copy(tmp_path, monkeypatch):
+    from osa.utils.iofile import transfer_file
+
+    source = tmp_path / "LST-1.1.Run01807.0000.fits.fz"
+    source.write_bytes(b"R0 data" * 1000)
+    destination_dir = tmp_path / "R0G"
+    destination_dir.mkdir()
+
+    # Force the copy as if the destination were in another filesystem
+    def link(*args):
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr("os.link", link)
+    destination = transfer_file(source, destination_dir)
+    assert destination.read_bytes() == source.read_bytes()
+    assert destination.stat().st_ino != source.stat().st_ino
+
+
+def test_append_in_single_write(tmp_path, monkeypatch):
+    import os
+
+    from osa.utils.iofile import append_in_single_write
+
+    file = tmp_path / "stage_metrics.csv"
+    append_in_single_write(file, "first line\n")
+
+    # Short writes are resumed until the whole content is written
+    write = os.write
+    monkeypatch.setattr(os, "write", lambda fd, data: write(fd, data[:3]))
+    append_in_single_write(file, "second line\n")
+
+    assert file.read_text() == "first line\nsecond line\n"
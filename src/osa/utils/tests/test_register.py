@@ -0,0 +1,108 @@
+import json
+
+from osa.configs import options
+
+
+def test_register_concept_files(tmp_path, monkeypatch):
+    from osa.utils.register import register_concept_files, register_manifest_file
+
+    analysis_dir = tmp_path / "running_analysis"
+    output_dir = tmp_path / "DL1" / "muons"
+    analysis_dir.mkdir()
+    output_dir.mkdir(parents=True)
+    monkeypatch.setattr(options, "directory", analysis_dir)
+
+    muon_files = [analysis_dir / f"muons_LST-1.Run01808.{subrun:04d}.fits" for subrun in range(5)]
+    for file in muon_files:
+        file.write_text("muons")
+
+    assert register_concept_files(muon_files, "MUON", output_dir) == 5
+
+    for file in muon_files:
+        assert (output_dir / file.name).is_file()
+        assert file.is_symlink()
+
+    # Files already registered are not moved again
+    assert register_concept_files(muon_files, "MUON", output_dir) == 0
+
+    entries = [json.loads(line) for line in register_manifest_file().read_text().splitlines()]
+    assert len(entries) == 10
+    assert {entry["status"] for entry in entries[5:]} == {"done"}
+
+
+def test_resume_registration(tmp_path, monkeypatch):
+    from osa.utils.register import (
+        register_manifest_file,
+        resume_registration,
+        write_manifest_entries,
+    )
+
+    analysis_dir = tmp_path / "running_analysis"
+    output_dir = tmp_path / "DL1" / "muons"
+    analysis_dir.mkdir()
+    output_dir.mkdir(parents=True)
+    monkeypatch.setattr(options, "directory", analysis_dir)
+    register_manifest_file().parent.mkdir()
+
+    # Closer interrupted after moving the first file but before linking it,
+    # and before moving the second one.
+    moved_file = analysis_dir / "muons_LST-1.Run01808.0000.fits"
+    not_moved_file = analysis_dir / "muons_LST-1.Run01808.0001.fits"
+    (output_dir / moved_file.name).write_text("muons")
+    not_moved_file.write_text("muons")
+    write_manifest_entries(
+        register_manifest_file(),
+        [
+            {
+                "concept": "MUON",
+                "src": str(file),
+                "dst": str(output_dir / file.name),
+                "size": 5,
+                "status": "pending",
+            }
+            for file in (moved_file, not_moved_file)
+        ],
+    )
+
+    resume_registration(register_manifest_file())
+
+    for file in (moved_file, not_moved_file):
+        assert (output_dir / file.name).is_file()
+        assert file.is_symlink()
+
+
+def test_resume_registration_truncated_destination(tmp_path, monkeypatch):
+    from osa.utils.register import (
+        register_manifest_file,
+        resume_registration,
+        write_manifest_entries,
+    )
+
+    analysis_dir = tmp_path / "running_analysis"
+    output_dir = tmp_path / "DL1" / "muons"
+    analysis_dir.mkdir()
+    output_dir.mkdir(parents=True)
+    monkeypatch.setattr(options, "directory", analysis_dir)
+    register_manifest_file().parent.mkdir()
+
+    # Cross-filesystem move interrupted in the middle of the copy
+    input_file = analysis_dir / "muons_LST-1.Run01808.0000.fits"
+    input_file.write_text("muons")
+    (output_dir / input_file.name).write_text("mu")
+    write_manifest_entries(
+        register_manifest_file(),
+        [
+            {
+                "concept": "MUON",
+                "src": str(input_file),
+                "dst": str(output_dir / input_file.name),
+                "size": 5,
+                "status": "pending",
+            }
+        ],
+    )
+
+    resume_registration(register_manifest_file())
+
+    assert (output_dir / input_file.name).read_text() == "muons"
+    assert input_file.is_symlink()
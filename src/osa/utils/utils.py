@@ -6,6 +6,7 @@ import logging
 import os
 import time
 from datetime import datetime, timedelta
+from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 from socket import gethostname
 
@@ -36,6 +37,8 @@ __all__ = [
     "cron_lock",
     "example_seq",
     "wait_for_daytime",
+    "get_process_start_time",
+    "get_process_io",
 ]
 
 log = myLogger(logging.getLogger(__name__))
@@ -60,9 +63,13 @@ def get_lstchain_version():
     -------
     lstchain_version: string
     """
-    from lstchain import __version__
+    # Read it from the package metadata to avoid importing lstchain
+    try:
+        lstchain_version = version("lstchain")
+    except PackageNotFoundError:
+        from lstchain import __version__ as lstchain_version
 
-    return f"v{__version__}"
+    return f"v{lstchain_version}"
 
 
 def get_prod_id():
@@ -285,3 +292,59 @@ def wait_for_daytime(start=8, end=18):
     while time.localtime().tm_hour <= start or time.localtime().tm_hour >= end:
         log.info("Waiting for sunrise to not interfere with the data-taking. Sleeping.")
         time.sleep(3600)
+
+
+def get_process_start_time(pid: int):
+    """
+    Get the start time of a process from the /proc filesystem.
+
+    Parameters
+    ----------
+    pid: int
+        Process ID.
+
+    Returns
+    -------
+    start_time: float or None
+        Start time of the process in seconds since the epoch,
+        or None if it cannot be determined (e.g. not in Linux).
+    """
+    try:
+        process_stat = Path(f"/proc/{pid}/stat").read_text()
+        boot_time = next(
+            float(line.split()[1])
+            for line in Path("/proc/stat").read_text().splitlines()
+            if line.startswith("btime")
+        )
+    except (OSError, StopIteration):
+        return None
+
+    # The command name (2nd field) may contain spaces, so the fields are
+    # counted after it. The start time in clock ticks is the 22nd field.
+    start_ticks = int(process_stat.rsplit(")", 1)[1].split()[19])
+    return boot_time + start_ticks / os.sysconf("SC_CLK_TCK")
+
+
+def get_process_io(pid: int):
+    """
+    Get the I/O counters of a process from the /proc filesystem.
+
+    Parameters
+    ----------
+    pid: int
+        Process ID.
+
+    Returns
+    -------
+    io_counters: dict or None
+        Counters of /proc/<pid>/io (rchar, wchar, read_bytes, ...),
+        or None if they cannot be read (e.g. not in Linux).
+    """
+    try:
+        process_io = Path(f"/proc/{pid}/io").read_text()
+    except OSError:
+        return None
+
+    return {
+        key: int(value) for key, value in (line.split(":") for line in process_io.splitlines())
+    }
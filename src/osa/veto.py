@@ -2,9 +2,11 @@
 
 import logging
 import os
+import sqlite3
 from pathlib import Path
 
 from osa.configs import options
+from osa.history import get_failed_twice, get_history_sizes, history_db_file
 from osa.utils.logging import myLogger
 
 __all__ = [
@@ -44,12 +46,29 @@ def set_veto_action(name, sequence_list):
 
 def update_vetoes(sequence_list):
     """Create a .veto file for a given sequence if reached maximum number of trials."""
+    # Get the sequences failed twice with a single query if the history database exists
+    history_db = history_db_file()
+    failed_sequences, history_sizes = set(), {}
+    if history_db.exists():
+        try:
+            failed_sequences = set(get_failed_twice(history_db))
+            history_sizes = get_history_sizes(history_db)
+        except sqlite3.Error as error:
+            log.warning(f"Could not read the history database, using the history files: {error}")
+            failed_sequences, history_sizes = set(), {}
+
     for sequence in sequence_list:
-        if (
-            not os.path.exists(sequence.veto)
-            and os.path.exists(sequence.history)
-            and failed_history(sequence.history)
-        ):
+        if os.path.exists(sequence.veto) or not os.path.exists(sequence.history):
+            continue
+
+        # The history file is the reference if the database does not match it
+        name = Path(sequence.history).stem
+        if history_sizes.get(name) == os.path.getsize(sequence.history):
+            failed = name in failed_sequences
+        else:
+            failed = failed_history(Path(sequence.history))
+
+        if failed:
             Path(sequence.veto).touch()
             log.debug(f"Created veto file {sequence.veto}")
 
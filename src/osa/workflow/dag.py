@@ -0,0 +1,233 @@
+"""
+Directed acyclic graph (DAG) of workflow steps.
+
+Each step declares its command, its input and output files and the steps it
+depends on. The DAG is either submitted to SLURM, chaining the steps with
+afterok dependencies, or run locally with a pool of processes (e.g. for testing).
+Independent steps are submitted or run at the same time, and steps whose outputs
+are up to date with respect to their inputs are skipped.
+"""
+
+import logging
+import subprocess as sp
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from glob import glob
+from graphlib import CycleError, TopologicalSorter
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+from osa.utils.iofile import write_to_file
+from osa.utils.logging import myLogger
+from osa.utils.utils import stringify
+
+__all__ = ["Step", "WorkflowDAG", "expand_files"]
+
+log = myLogger(logging.getLogger(__name__))
+
+
+def expand_files(files: Iterable[Union[Path, str]]) -> List[Path]:
+    """Expand the glob patterns of a list of files, keeping the plain paths as they are."""
+    expanded = []
+    for file in files:
+        if any(char in str(file) for char in "*?["):
+            expanded.extend(Path(path) for path in sorted(glob(str(file))))
+        else:
+            expanded.append(Path(file))
+    return expanded
+
+
+@dataclass
+class Step:
+    """
+    Step of a workflow.
+
+    Parameters
+    ----------
+    name: str
+        Unique name of the step in the DAG.
+    command: list
+        Program and arguments to be executed.
+    depends_on: list
+        Names of the steps which must succeed before this one starts.
+    inputs: list
+        Input files (glob patterns allowed) of the step.
+    outputs: list
+        Output files of the step. A step without outputs is always executed.
+    directory: pathlib.Path, optional
+        Working directory of the step.
+    sbatch_options: list
+        Additional sbatch options (e.g. memory, job name or log file).
+    after_jobs: list
+        IDs of SLURM jobs, not part of the DAG, the step also waits for.
+    scripts: dict
+        Contents of the files (e.g. job scripts) the step needs, written
+        only when the step is submitted or run.
+    """
+
+    name: str
+    command: List[str]
+    depends_on: List[str] = field(default_factory=list)
+    inputs: List[Union[Path, str]] = field(default_factory=list)
+    outputs: List[Path] = field(default_factory=list)
+    directory: Union[Path, None] = None
+    sbatch_options: List[str] = field(default_factory=list)
+    after_jobs: List[str] = field(default_factory=list)
+    scripts: Dict[Path, str] = field(default_factory=dict)
+
+    def is_up_to_date(self) -> bool:
+        """
+        Whether all the outputs exist and are newer than all the inputs. A step waiting
+        for other jobs is never up to date, since those jobs may still rewrite its inputs.
+        """
+        if self.after_jobs:
+            return False
+
+        if not self.outputs or not all(Path(file).exists() for file in self.outputs):
+            return False
+
+        inputs = expand_files(self.inputs)
+        if not all(file.exists() for file in inputs):
+            return False
+
+        oldest_output = min(Path(file).stat().st_mtime for file in self.outputs)
+        return all(file.stat().st_mtime <= oldest_output for file in inputs)
+
+    def write_scripts(self) -> None:
+        """Write the files the step needs before submitting or running it."""
+        for file, content in self.scripts.items():
+            Path(file).parent.mkdir(parents=True, exist_ok=True)
+            write_to_file(Path(file), content)
+
+    def batch_command(self, dependency: Iterable[str] = (), batch_command: str = "sbatch"):
+        """Command submitting the step with sbatch after the given jobs."""
+        cmd = [batch_command, "--parsable"]
+        if self.directory is not None:
+            cmd.extend(["-D", self.directory])
+        cmd.extend(self.sbatch_options)
+        if dependency:
+            cmd.append(f"--dependency=afterok:{','.join(dependency)}")
+        return cmd + self.command
+
+
+class WorkflowDAG:
+    """Collection of steps to be executed in the order given by their dependencies."""
+
+    def __init__(self, steps: Iterable[Step] = ()):
+        self.steps: Dict[str, Step] = {}
+        for step in steps:
+            self.add(step)
+
+    def add(self, step: Step) -> Step:
+        """Add a step to the DAG."""
+        if step.name in self.steps:
+            raise ValueError(f"Step {step.name} already in the workflow")
+        self.steps[step.name] = step
+        return step
+
+    def order(self) -> List[Step]:
+        """Steps sorted so that every step comes after the ones it depends on."""
+        for step in self.steps.values():
+            missing = set(step.depends_on) - self.steps.keys()
+            if missing:
+                raise ValueError(f"Step {step.name} depends on unknown steps {sorted(missing)}")
+        try:
+            names = TopologicalSorter(
+                {name: step.depends_on for name, step in self.steps.items()}
+            ).static_order()
+            return [self.steps[name] for name in names]
+        except CycleError as error:
+            raise ValueError(f"Cyclic dependencies in the workflow: {error.args[1]}") from error
+
+    def outdated_steps(self) -> List[Step]:
+        """
+        Steps to be executed, i.e. those whose outputs are not up to date
+        or that depend on a step to be executed, in dependency order.
+        """
+        outdated = []
+        names = set()
+        for step in self.order():
+            if names.intersection(step.depends_on) or not step.is_up_to_date():
+                outdated.append(step)
+                names.add(step.name)
+            else:
+                log.debug(f"Skipping step {step.name}: outputs are up to date")
+        return outdated
+
+    def submit(self, batch_command: str = "sbatch") -> Dict[str, str]:
+        """
+        Submit the outdated steps to SLURM, each one depending only on the
+        jobs of the steps it needs, so that independent steps run in parallel.
+
+        Returns
+        -------
+        job_ids: dict
+            SLURM job ID of each submitted step.
+        """
+        job_ids = {}
+        # Jobs to wait for instead of a skipped step, i.e. those it would have waited for
+        skipped_after_jobs = {}
+        outdated = {step.name for step in self.outdated_steps()}
+        for step in self.order():
+            inherited_jobs = [
+                job for name in step.depends_on for job in skipped_after_jobs.get(name, [])
+            ]
+            if step.name not in outdated:
+                skipped_after_jobs[step.name] = step.after_jobs + inherited_jobs
+                continue
+
+            dependency = list(
+                dict.fromkeys(
+                    step.after_jobs
+                    + inherited_jobs
+                    + [job_ids[name] for name in step.depends_on if name in job_ids]
+                )
+            )
+            cmd = step.batch_command(dependency, batch_command)
+            log.debug(f"Submitting step {step.name}: {stringify(cmd)}")
+            step.write_scripts()
+            job = sp.run(cmd, encoding="utf-8", capture_output=True, check=True)
+            job_ids[step.name] = job.stdout.strip().split(";")[0]
+        return job_ids
+
+    def run_local(self, max_workers: int = None) -> Dict[str, Union[int, None]]:
+        """
+        Run the outdated steps locally, starting every step as soon as the ones it
+        depends on have succeeded. Steps depending on a failed step are not run.
+
+        Returns
+        -------
+        return_codes: dict
+            Return code of each outdated step, None for the steps not run.
+        """
+        pending = {step.name: step for step in self.outdated_steps()}
+        return_codes = {name: None for name in pending}
+        failed = set()
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    dependencies = set(step.depends_on).intersection(return_codes)
+                    if dependencies & failed:
+                        log.warning(f"Step {name} not run: a step it depends on failed")
+                        failed.add(name)
+                        del pending[name]
+                    elif all(return_codes[dep] == 0 for dep in dependencies):
+                        log.debug(f"Running step {name}: {stringify(step.command)}")
+                        step.write_scripts()
+                        running[executor.submit(sp.run, step.command, cwd=step.directory)] = name
+                        del pending[name]
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    return_codes[name] = future.result().returncode
+                    if return_codes[name] != 0:
+                        log.warning(f"Step {name} failed with return code {return_codes[name]}")
+                        failed.add(name)
+
+        return return_codes
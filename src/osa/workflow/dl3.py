@@ -3,16 +3,16 @@
 """
 Script to handle the production of DL3 files.
 
-It uses the lstchain Tools:
+It uses the lstchain Tools, chained as a workflow DAG:
  - lstchain_create_irf_files
  - lstchain_create_dl3_file
  - lstchain_create_dl3_index_files
 """
 
 import logging
-import subprocess as sp
 from datetime import datetime
 from pathlib import Path
+from typing import List
 
 import click
 from astropy.utils import iers
@@ -24,225 +24,146 @@ from osa.paths import destination_dir, DEFAULT_CFG, create_source_directories, a
 from osa.utils.cliopts import get_prod_id, get_dl2_prod_id
 from osa.utils.logging import myLogger
 from osa.utils.utils import stringify, YESTERDAY
+from osa.workflow.dag import Step, WorkflowDAG
 
 iers.conf.auto_download = False
 
 __all__ = [
-    "batch_cmd_create_irf",
-    "batch_cmd_create_dl3",
-    "batch_cmd_create_index_dl3",
-    "get_irf_file",
-    "create_irf",
-    "produce_dl3_files",
+    "irf_step",
+    "dl3_step",
+    "index_dl3_step",
+    "dl3_workflow",
+    "run_dl3_workflow",
     "setup_global_options",
     "cuts_subdirectory",
-    "create_obs_index",
 ]
 
 log = myLogger(logging.getLogger(__name__))
 
 
-def batch_cmd_create_irf(cwd, mc_gamma, mc_proton, mc_electron, output_irf_file, dl3_config):
-    """Create batch command to create IRF file with sbatch."""
-    return [
-        "sbatch",
-        "--parsable",
-        "--mem=6GB",
-        "--job-name=irf",
-        "-D",
-        cwd,
-        "-o",
-        "log/create_irf_%j.log",
-        "lstchain_create_irf_files",
-        "--point-like",
-        f"--input-gamma-dl2={mc_gamma}",
-        f"--input-proton-dl2={mc_proton}",
-        f"--input-electron-dl2={mc_electron}",
-        f"--output-irf-file={output_irf_file}",
-        f"--config={dl3_config}",
-        "--overwrite",
-    ]
+def irf_step(directory: Path, dl3_config: Path) -> Step:
+    """Workflow step creating the IRF file for a given set of selection cuts."""
+    mc_gamma = cfg.get("MC", "gamma")
+    mc_proton = cfg.get("MC", "proton")
+    mc_electron = cfg.get("MC", "electron")
+    irf_file = directory / "irf.fits.gz"
 
+    return Step(
+        name="irf",
+        command=[
+            "lstchain_create_irf_files",
+            "--point-like",
+            f"--input-gamma-dl2={mc_gamma}",
+            f"--input-proton-dl2={mc_proton}",
+            f"--input-electron-dl2={mc_electron}",
+            f"--output-irf-file={irf_file}",
+            f"--config={dl3_config}",
+            "--overwrite",
+        ],
+        inputs=[mc_gamma, mc_proton, mc_electron, dl3_config],
+        outputs=[irf_file],
+        directory=directory,
+        sbatch_options=["--mem=6GB", "--job-name=irf", "-o", "log/create_irf_%j.log"],
+    )
 
-def batch_cmd_create_dl3(
-    dl2_file, dl3_dir, run, source_name, source_ra, source_dec, irf, dl3_config, job_irf
-):
-    """Create batch command to create DL3 files with sbatch."""
+
+def dl3_step(sequence, dl2_dir: Path, cuts_dir: Path, irf_file: Path, dl3_config: Path) -> Step:
+    """Workflow step creating the DL3 file of a DATA sequence."""
+    dl2_file = dl2_dir / f"dl2_LST-1.Run{sequence.run:05d}.h5"
+    dl3_dir = cuts_dir / f"{sequence.source_name}"
     log_dir = dl3_dir / "log"
     log_dir.mkdir(exist_ok=True, parents=True)
-    log_file = log_dir / f"dl2_to_dl3_Run{run:05d}_{source_name}_%j.log"
-    sbatch_cmd = [
-        "sbatch",
-        "--mem=10GB",
-        "--job-name=dl2dl3",
-        "-D",
-        dl3_dir,
-        "-o",
-        log_file,
-        "--parsable",
-    ]
-    if job_irf is not None:
-        sbatch_cmd.append(f"--dependency=afterok:{job_irf}")
+    log_file = log_dir / f"dl2_to_dl3_Run{sequence.run:05d}_{sequence.source_name}_%j.log"
 
-    dl3_cmd = [
+    command = [
         "lstchain_create_dl3_file",
         f"-d={dl2_file}",
         f"-o={dl3_dir}",
-        f"--input-irf={irf}",
-        f"--source-name={source_name}",
-        f"--source-ra={source_ra}deg",
-        f"--source-dec={source_dec}deg",
+        f"--input-irf={irf_file}",
+        f"--source-name={sequence.source_name}",
+        f"--source-ra={sequence.source_ra}deg",
+        f"--source-dec={sequence.source_dec}deg",
         "--overwrite",
     ]
     if dl3_config:
-        dl3_cmd.append(f"--config={dl3_config}")
-
-    return sbatch_cmd + dl3_cmd
+        command.append(f"--config={dl3_config}")
+
+    return Step(
+        name=f"dl3_{sequence.run:05d}",
+        command=command,
+        inputs=[dl2_file, irf_file],
+        outputs=[dl3_dir / f"dl3_LST-1.Run{sequence.run:05d}.fits.gz"],
+        directory=dl3_dir,
+        sbatch_options=["--mem=10GB", "--job-name=dl2dl3", "-o", log_file],
+    )
 
 
-def batch_cmd_create_index_dl3(dl3_dir, parent_job_list):
-    """Build batch command to create the observations index."""
-    parent_job_list_str = ",".join(parent_job_list)
+def index_dl3_step(dl3_dir: Path, dl3_steps: List[Step]) -> Step:
+    """Workflow step creating the observation index of the DL3 files of a source."""
     log_dir = dl3_dir / "log"
     log_dir.mkdir(exist_ok=True, parents=True)
-    log_file = log_dir / "create_index_dl3_%j.log"
-
-    return [
-        "sbatch",
-        "--parsable",
-        "--mem=8GB",
-        "--job-name=dl3_index",
-        f"--dependency=afterok:{parent_job_list_str}",
-        "-D",
-        dl3_dir,
-        "-o",
-        log_file,
-        "lstchain_create_dl3_index_files",
-        f"-d={dl3_dir}",
-        f"-o={dl3_dir}",
-        "-p=dl3*.fits.gz",
-        "--overwrite",
-    ]
 
+    return Step(
+        name=f"index_{dl3_dir.name}",
+        command=[
+            "lstchain_create_dl3_index_files",
+            f"-d={dl3_dir}",
+            f"-o={dl3_dir}",
+            "-p=dl3*.fits.gz",
+            "--overwrite",
+        ],
+        depends_on=[step.name for step in dl3_steps],
+        inputs=[file for step in dl3_steps for file in step.outputs],
+        outputs=[dl3_dir / "obs-index.fits.gz", dl3_dir / "hdu-index.fits.gz"],
+        directory=dl3_dir,
+        sbatch_options=["--mem=8GB", "--job-name=dl3_index", "-o", log_dir / "create_index_dl3_%j.log"],
+    )
+
+
+def dl3_workflow(sequence_list, dl2_dir: Path, cuts_dir: Path) -> WorkflowDAG:
+    """
+    Build the DAG producing the IRF file (unless an existing one is configured),
+    the DL3 file of every DATA sequence and the observation index of every source.
+    The index of a source only waits for the DL3 files of that source.
+    """
+    workflow = WorkflowDAG()
 
-def get_irf_file(directory: Path, simulate: bool = False):
-    """Return the irf file. Create it if not existing."""
-    if cfg.get("MC", "IRF_file") is not None:
-        irf_file = Path(cfg.get("MC", "IRF_file"))
+    irf_file = cfg.get("MC", "IRF_file", fallback=None)
+    if irf_file:
+        irf_file = Path(irf_file)
         log.info(f"Using existing IRF file:\n{irf_file}")
         dl3_config = None  # Uses default settings
-        job_id_irf = None
     else:
         dl3_config = Path(cfg.get("lstchain", "DL3_CONFIG"))
-        irf_file, job_id_irf = create_irf(directory, dl3_config, simulate)
-
-    return irf_file, dl3_config, job_id_irf
+        irf_file = workflow.add(irf_step(cuts_dir, dl3_config)).outputs[0]
 
-
-def create_irf(directory: Path, config: Path, simulate: bool = False):
-    """Create the IRF file for a given set of selection cuts."""
-    log.info("Creating the IRFs.")
-
-    mc_gamma = cfg.get("MC", "gamma")
-    mc_proton = cfg.get("MC", "proton")
-    mc_electron = cfg.get("MC", "electron")
-    irf_file = directory / "irf.fits.gz"
-
-    cmd1 = batch_cmd_create_irf(
-        cwd=directory,
-        mc_gamma=mc_gamma,
-        mc_proton=mc_proton,
-        mc_electron=mc_electron,
-        output_irf_file=irf_file,
-        dl3_config=config,
-    )
-
-    if simulate:
-        return None
-
-    log.info("Submitting the IRF job.")
-    log.debug(stringify(cmd1))
-    job_irf = sp.run(
-        cmd1,
-        encoding="utf-8",
-        capture_output=True,
-        text=True,
-    )
-    return irf_file, job_irf.stdout.strip()
-
-
-def produce_dl3_files(
-    sequence_list,
-    irf_file: Path,
-    dl2_dir: Path,
-    cuts_dir: Path,
-    dl3_config: Path,
-    job_id_irf: int,
-    simulate: bool = False,
-):
-    """Produce the DL3 files for a given list of sequences."""
-    list_of_job_id = []
-
-    log.info("Looping over the runs to produce the DL3 files.")
+    dl3_steps = {}
     for sequence in sequence_list:
-
         if sequence.type == "DATA":
+            step = workflow.add(dl3_step(sequence, dl2_dir, cuts_dir, irf_file, dl3_config))
+            if "irf" in workflow.steps:
+                step.depends_on.append("irf")
+            dl3_steps.setdefault(step.directory, []).append(step)
 
-            dl2_file = dl2_dir / f"dl2_LST-1.Run{sequence.run:05d}.h5"
-            dl3_subdir = cuts_dir / f"{sequence.source_name}"
-
-            cmd2 = batch_cmd_create_dl3(
-                dl2_file=dl2_file,
-                dl3_dir=dl3_subdir,
-                run=sequence.run,
-                source_name=sequence.source_name,
-                source_ra=sequence.source_ra,
-                source_dec=sequence.source_dec,
-                irf=irf_file,
-                dl3_config=dl3_config,
-                job_irf=job_id_irf,
-            )
+    for dl3_dir, steps in dl3_steps.items():
+        workflow.add(index_dl3_step(dl3_dir, steps))
 
-            if not simulate:
-                log.info(f"Producing DL3 file for run {sequence.run:05d}")
-                job_id = sp.run(
-                    cmd2,
-                    encoding="utf-8",
-                    capture_output=True,
-                    text=True,
-                )
+    return workflow
 
-                list_of_job_id.append(job_id.stdout.strip())
 
-            else:
-                log.debug("Simulate launching scripts")
+def run_dl3_workflow(workflow: WorkflowDAG, simulate: bool = False):
+    """Submit the DL3 workflow to SLURM, or run it locally in test mode."""
+    steps = workflow.outdated_steps()
+    log.info(f"Producing the DL3 files and observation indexes ({len(steps)} steps).")
 
-            log.debug(f"Executing {stringify(cmd2)}")
-
-    return list_of_job_id
-
-
-def create_obs_index(source_list: list, cuts_dir: Path, parent_jobs: list, simulate: bool = False):
-    """Creating observation index for each source."""
-    log.info("Creating observation index for each source.")
-
-    for source in source_list:
-        dl3_subdir = cuts_dir / source
-
-        cmd3 = batch_cmd_create_index_dl3(dl3_subdir, parent_jobs)
-
-        if not simulate:
-            log.info("Scheduling DL3 index job")
-            sp.run(
-                cmd3,
-                encoding="utf-8",
-                capture_output=True,
-                text=True,
-            )
-        else:
-            log.debug("Simulate creating DL3 index")
-
-        log.debug(f"Executing {stringify(cmd3)}")
+    if simulate:
+        for step in steps:
+            log.debug(f"Executing {stringify(step.batch_command())}")
+        log.debug("Simulate launching scripts")
+    elif options.test:
+        workflow.run_local()
+    else:
+        workflow.submit()
 
 
 def setup_global_options(date_obs, telescope):
@@ -320,27 +241,10 @@ def main(
     # Create a subdirectory for each source
     create_source_directories(source_list, std_cuts_dir)
 
-    # Get IRF file
-    irf_file, dl3_config, job_id_irf = get_irf_file(directory=std_cuts_dir, simulate=simulate)
-
-    # Create the DL3 files
-    list_of_job_id = produce_dl3_files(
-        sequence_list=sequence_list,
-        irf_file=irf_file,
-        dl2_dir=dl2_dir,
-        cuts_dir=std_cuts_dir,
-        dl3_config=dl3_config,
-        job_id_irf=job_id_irf,
-        simulate=simulate,
-    )
-
-    # Creating an observation file index for each source
-    create_obs_index(
-        source_list=source_list,
-        cuts_dir=std_cuts_dir,
-        parent_jobs=list_of_job_id,
-        simulate=simulate,
-    )
+    # Create the IRF, DL3 and observation index files
+    log.info("Creating IRF, DL3 and observation index files for each source.")
+    workflow = dl3_workflow(sequence_list, dl2_dir=dl2_dir, cuts_dir=std_cuts_dir)
+    run_dl3_workflow(workflow, simulate=simulate)
 
 
 if __name__ == "__main__":
@@ -6,22 +6,198 @@ retry in case of failure, and keep track of the history of the stages.
 """
 
 import logging
+import os
+import re
+import shutil
+import signal
 import subprocess as sp
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
 from pathlib import Path
-from typing import List, Union
+from typing import Iterable, List, Union
 
-from tenacity import retry, stop_after_attempt
-import lstchain
+from tenacity import retry, stop_after_attempt, wait_random_exponential
 
 from osa.configs import options
 from osa.configs.config import cfg
-from osa.report import history
+from osa.report import STAGE_METRICS_FILE, history, stage_metrics
 from osa.utils.logging import myLogger
-from osa.utils.utils import stringify, date_to_dir
+from osa.utils.utils import stringify, date_to_dir, get_lstchain_version, get_process_io
 from osa.paths import get_run_date
+from osa.raw import R0_FILENAME
 
 log = myLogger(logging.getLogger(__name__))
 
+# Output signatures of the failures of the programs. Transient failures (e.g. I/O
+# errors of the shared filesystem) are retried after a random exponential backoff,
+# whereas permanent ones (e.g. missing input files or wrong arguments) are not
+# retried at all. Failures not identified are retried immediately.
+TRANSIENT_FAILURES = re.compile(
+    "|".join(
+        [
+            r"Input/output error",
+            r"Resource temporarily unavailable",
+            r"Stale file handle",
+            r"Device or resource busy",
+            r"unable to lock file",
+            r"Connection (reset|refused|timed out)",
+            r"BlockingIOError",
+            r"TimeoutError",
+        ]
+    )
+)
+PERMANENT_FAILURES = re.compile(
+    "|".join(
+        [
+            r"FileNotFoundError",
+            r"No such file or directory",
+            r"command not found",
+            r"IsADirectoryError",
+            r"Permission denied",
+            r"ModuleNotFoundError",
+            r"ImportError",
+            r"error: (unrecognized arguments|the following arguments are required)",
+        ]
+    )
+)
+
+
+def classify_failure(return_code: int, output_lines: Iterable[str]):
+    """
+    Classify the failure of a program as transient, permanent or unknown
+    according to its return code and the last lines of its output, looking
+    for the failure signatures from the last line backwards.
+
+    Returns
+    -------
+    failure: str or None
+        None if the program did not fail.
+    """
+    if return_code == 0:
+        return None
+
+    # Bus error, e.g. when a memory-mapped file becomes unavailable
+    if return_code == -signal.SIGBUS:
+        return "transient"
+
+    for line in reversed(list(output_lines)):
+        if TRANSIENT_FAILURES.search(line):
+            return "transient"
+        if PERMANENT_FAILURES.search(line):
+            return "permanent"
+
+    return "unknown"
+
+
+def stop_on_permanent_failure(retry_state) -> bool:
+    """Stop retrying a stage whose last attempt failed permanently."""
+    return retry_state.args[0].failure == "permanent"
+
+
+def retry_backoff(retry_state) -> float:
+    """Jittered exponential backoff with the parameters of the [lstchain] section."""
+    backoff = wait_random_exponential(
+        multiplier=cfg.getfloat("lstchain", "retry_wait", fallback=30),
+        max=cfg.getfloat("lstchain", "retry_max_wait", fallback=600),
+    )
+    return backoff(retry_state)
+
+
+def wait_on_transient_failure(retry_state) -> float:
+    """Wait before retrying a stage only if its last attempt failed transiently."""
+    if retry_state.args[0].failure != "transient":
+        return 0
+    return retry_backoff(retry_state)
+
+
+def log_retry(retry_state) -> None:
+    """Log the decision of retrying a stage."""
+    stage = retry_state.args[0]
+    log.warning(
+        f"Retrying {stage.command} in {retry_state.next_action.sleep:.0f} s "
+        f"after {stage.failure} failure (attempt {retry_state.attempt_number})"
+    )
+
+
+# Return code of a stage whose outputs could not be published (EX_TEMPFAIL)
+PUBLISH_ERROR_RC = 75
+
+
+def staging_dir() -> Union[Path, None]:
+    """
+    Node-local scratch directory where the stages read their input and write their
+    outputs, as given by [lstchain] staging_dir (environment variables such as
+    $TMPDIR are expanded). None if staging is disabled or the directory is not set.
+    """
+    directory = os.path.expandvars(cfg.get("lstchain", "staging_dir", fallback=""))
+    if not directory or "$" in directory:
+        return None
+    return Path(directory)
+
+
+def stage_input(file: Path, directory: Path) -> Path:
+    """
+    Hard link the input file into the scratch directory, or copy it if not possible.
+    The input of a R0 file is the subrun, whose streams are read from the directory
+    of the input file, so all the streams of the subrun are staged.
+
+    Returns
+    -------
+    staged_file: pathlib.Path
+        Path of the input file in the scratch directory.
+    """
+    files = {file}
+    if match := R0_FILENAME.match(file.name):
+        files.update(file.parent.glob(f"LST-1.?.Run{match['run']}.{match['subrun']}.fits.fz"))
+
+    for input_file in sorted(files):
+        staged_file = directory / input_file.name
+        try:
+            os.link(input_file, staged_file)
+        except OSError:
+            shutil.copyfile(input_file, staged_file)
+
+    return directory / file.name
+
+
+def publish_outputs(source_dir: Path, destination_dir: Path) -> List[Path]:
+    """
+    Move the files written by a stage in the scratch directory to their final
+    directory, keeping their paths relative to it (e.g. interleaved/). Each file
+    is copied next to its destination under a hidden temporary name and then
+    renamed, so that no partial file is ever seen there.
+
+    Returns
+    -------
+    published: list of pathlib.Path
+        Final path of the published files.
+    """
+    destination_dir.mkdir(parents=True, exist_ok=True)
+    published = []
+    for file in sorted(source_dir.rglob("*")):
+        if not file.is_file():
+            continue
+        destination = destination_dir / file.relative_to(source_dir)
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        temporary_file = destination.with_name(f".{file.name}.staging")
+        try:
+            shutil.copyfile(file, temporary_file)
+            os.replace(temporary_file, destination)
+        finally:
+            temporary_file.unlink(missing_ok=True)
+        published.append(destination)
+    return published
+
+
+def file_size(file: Union[Path, None]):
+    """Size in bytes of a file, or None if it does not exist."""
+    try:
+        return file.stat().st_size
+    except (AttributeError, OSError):
+        return None
+
 
 class AnalysisStage:
     """Run a given analysis stage keeping track of checkpoints in a history file.
@@ -34,6 +210,9 @@ class AnalysisStage:
         Complete command line arguments to be executed in the shell as a list
     config_file: str, optional
         Path to the config file used for the stage
+    output_file: pathlib.Path, optional
+        Output file of the stage, to report its size in the stage metrics
+        if it is not given as --output-file argument.
     """
 
     def __init__(
@@ -41,28 +220,215 @@ class AnalysisStage:
         run: str,
         command_args: List[str],
         config_file: Union[str, None] = None,
+        output_file: Union[Path, None] = None,
+        staged: bool = False,
     ):
         self.run = run
         self.command_args = command_args
         self.config_file = config_file
+        self.staged = staged
+        self.output_file = output_file or self._file_argument("--output-file")
+        self.input_file = self._file_argument("--input-file")
         self.command = self.command_args[0]
         self.rc = None
+        self.failure = None
+        self.metrics = {}
         self.history_file = (
             Path(options.directory) / f"sequence_{options.tel_id}_{self.run}.history"
         )
+        self.log_file = (
+            Path(options.directory) / "log" / f"{Path(self.command).name}_{self.run}.log"
+        )
 
-    @retry(stop=stop_after_attempt(int(cfg.get("lstchain", "max_tries"))))
+    @retry(
+        stop=stop_after_attempt(int(cfg.get("lstchain", "max_tries"))) | stop_on_permanent_failure,
+        wait=wait_on_transient_failure,
+        before_sleep=log_retry,
+    )
     def execute(self):
-        """Run the program and retry if it fails."""
+        """
+        Run the program and retry if it fails, unless the failure is permanent.
+        Transient failures are retried after a random exponential backoff.
+        Staged stages run in a scratch directory of the node ([lstchain] staging_dir)
+        and their outputs are published in their final directory only if they succeed.
+        """
         log.info(f"Executing {stringify(self.command_args)}")
-        output = sp.run(self.command_args, stdout=sp.PIPE, stderr=sp.STDOUT, encoding="utf-8")
-        self.rc = output.returncode
+        scratch = self._create_scratch()
+        published = True
+        try:
+            if scratch is None:
+                self.rc, last_lines = self._run_command(self.command_args)
+            else:
+                command_args, output_dir = self._staged_command(scratch)
+                self.rc, last_lines = self._run_command(command_args)
+                if self.rc == 0 and output_dir is not None:
+                    published = self._publish(scratch / "output", output_dir, last_lines)
+        finally:
+            if scratch is not None:
+                shutil.rmtree(scratch, ignore_errors=True)
+
+        # Errors publishing the outputs are retried as any I/O error
+        self.failure = classify_failure(self.rc, last_lines) if published else "transient"
         self._write_checkpoint()
+        stage_metrics(self.run, self.command, self.rc, self.metrics, self.metrics_file)
 
         # If fails, remove products from the directory for subsequent trials
         if self.rc != 0:
             self._clean_up()
-            raise ValueError(f"{self.command} failed with output: \n {output.stdout}")
+            if self.failure == "permanent":
+                log.error(f"{self.command} failed permanently, it will not be retried")
+            raise ValueError(
+                f"{self.command} failed ({self.failure} failure, full output in "
+                f"{self.log_file}), last {len(last_lines)} lines of output: \n "
+                f"{''.join(last_lines)}"
+            )
+
+    def _create_scratch(self) -> Union[Path, None]:
+        """Create the scratch directory of an attempt of a staged stage, if enabled."""
+        directory = staging_dir()
+        if not self.staged or directory is None:
+            return None
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            return Path(
+                tempfile.mkdtemp(prefix=f"{Path(self.command).name}_{self.run}_", dir=directory)
+            )
+        except OSError as error:
+            log.warning(f"Could not create scratch directory in {directory}: {error}")
+            return None
+
+    def _staged_command(self, scratch: Path):
+        """
+        Command line of the program reading its input file from the scratch directory
+        and writing its outputs in the output subdirectory of the scratch directory.
+
+        Returns
+        -------
+        command_args: list
+            Command line of the program running in the scratch directory.
+        output_dir: pathlib.Path
+            Final directory of the outputs of the program.
+        """
+        staged_output_dir = scratch / "output"
+        staged_output_dir.mkdir()
+        command_args = [self.command]
+        output_dir = None
+
+        for arg in self.command_args[1:]:
+            option, _, value = arg.partition("=")
+            if option == "--input-file":
+                arg = f"{option}={stage_input(Path(value), scratch)}"
+            elif option == "--output-dir":
+                output_dir = Path(value)
+                arg = f"{option}={staged_output_dir}"
+            elif option == "--output-file":
+                output_dir = Path(value).parent
+                arg = f"{option}={staged_output_dir / Path(value).name}"
+            command_args.append(arg)
+
+        log.debug(f"Running {self.command} in scratch directory {scratch}")
+        return command_args, output_dir
+
+    def _publish(self, staged_output_dir: Path, output_dir: Path, last_lines: deque) -> bool:
+        """
+        Publish the outputs of a successful staged attempt in their final directory.
+        If it fails, the attempt is considered failed, so that neither the history
+        checkpoint nor the provenance checksums refer to missing outputs.
+
+        Returns
+        -------
+        published: bool
+            Whether all the outputs were published.
+        """
+        try:
+            published = publish_outputs(staged_output_dir, output_dir)
+        except OSError as error:
+            log.warning(f"Could not publish the outputs of {self.command}: {error}")
+            last_lines.append(f"Failed to publish the outputs in {output_dir}: {error}\n")
+            self.rc = PUBLISH_ERROR_RC
+            return False
+
+        self.metrics["output_size"] = file_size(self.output_file)
+        log.debug(f"Published {len(published)} files in {output_dir}")
+        return True
+
+    def _run_command(self, command_args: List[str]):
+        """
+        Run the program streaming its output line by line into the log file of the
+        stage, keeping only its last lines in memory for the error report, and
+        measure its wall time, CPU time and maximum resident set size.
+
+        Returns
+        -------
+        rc: int
+            Return code of the program.
+        last_lines: collections.deque
+            Last lines of the output of the program.
+        """
+        last_lines = deque(maxlen=cfg.getint("lstchain", "output_lines", fallback=100))
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(self.log_file, "a") as log_file:
+            log_file.write(
+                f"# {datetime.utcnow().isoformat(sep=' ', timespec='seconds')} "
+                f"{stringify(command_args)}\n"
+            )
+            t_start = time.perf_counter()
+            process = sp.Popen(
+                command_args,
+                stdout=sp.PIPE,
+                stderr=sp.STDOUT,
+                encoding="utf-8",
+                errors="replace",
+            )
+            for line in process.stdout:
+                log_file.write(line)
+                last_lines.append(line)
+            process.stdout.close()
+
+            # Read the I/O counters of the finished child before reaping it
+            # (it is not possible afterwards), getting then its resource usage
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+            io_counters = get_process_io(process.pid) or {}
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+
+        self.metrics = {
+            "wall_time": round(time.perf_counter() - t_start, 3),
+            "user_time": round(usage.ru_utime, 3),
+            "sys_time": round(usage.ru_stime, 3),
+            "cpu_time": round(usage.ru_utime + usage.ru_stime, 3),
+            "max_rss": usage.ru_maxrss,
+            # rchar/wchar also account for the I/O on network filesystems
+            "read_bytes": io_counters.get("rchar"),
+            "write_bytes": io_counters.get("wchar"),
+            "input_size": file_size(self.input_file),
+            "output_size": file_size(self.output_file),
+        }
+        log.info(
+            f"{self.command} finished with return code {process.returncode} in "
+            f"{self.metrics['wall_time']:.1f} s (CPU time {self.metrics['cpu_time']:.1f} s, "
+            f"max RSS {self.metrics['max_rss'] / 1024:.0f} MB)"
+        )
+
+        return process.returncode, last_lines
+
+    @property
+    def metrics_file(self) -> Path:
+        """Per-night table of the resource usage of the analysis stages."""
+        return Path(options.directory) / "log" / STAGE_METRICS_FILE
+
+    def _history_record(self) -> dict:
+        """Resource usage and failure class of the stage stored in the history database."""
+        record = {key: self.metrics.get(key) for key in ("wall_time", "cpu_time", "max_rss")}
+        return {**record, "failure": self.failure}
+
+    def _file_argument(self, argument: str):
+        """Get the path given as --argument=path in the command line, if any."""
+        for arg in self.command_args[1:]:
+            if arg.startswith(f"{argument}="):
+                return Path(arg.split("=", 1)[1])
+        return None
 
     def show_command(self):
         """Show the command to be executed."""
@@ -89,7 +455,7 @@ class AnalysisStage:
     def _remove_drs4_baseline(self):
         drs4_pedestal_basedir = Path(cfg.get("LST1", "PEDESTAL_DIR"))
         date = date_to_dir(get_run_date(self.run))
-        drs4_pedestal_dir = drs4_pedestal_basedir / date / lstchain.__version__
+        drs4_pedestal_dir = drs4_pedestal_basedir / date / get_lstchain_version()[1:]
         file = drs4_pedestal_dir / "drs4_pedestal.Run{self.run}.0000.h5"
         file.unlink(missing_ok=True)
         # Also remove the link to "pro" directory
@@ -99,7 +465,7 @@ class AnalysisStage:
     def _remove_calibration(self):
         calib_basedir = Path(cfg.get("LST1", "CALIB_DIR"))
         date = date_to_dir(get_run_date(self.run))
-        calib_dir = file = calib_basedir / date / lstchain.__version__
+        calib_dir = file = calib_basedir / date / get_lstchain_version()[1:]
         file = calib_dir / f"calibration_filters_{options.filters}.Run{self.run}.0000.h5"
         file.unlink(missing_ok=True)
         # Also remove the link to "pro" directory
@@ -128,6 +494,7 @@ class AnalysisStage:
             return_code=self.rc,
             history_file=self.history_file,
             config_file=self.config_file,
+            **self._history_record(),
         )
 
 
@@ -163,6 +530,7 @@ class DRS4PedestalStage(AnalysisStage):
             stage=self.command,
             return_code=self.rc,
             history_file=self.history_file,
+            **self._history_record(),
         )
 
 
@@ -188,4 +556,5 @@ class ChargeCalibrationStage(AnalysisStage):
             stage=self.command,
             return_code=self.rc,
             history_file=self.history_file,
+            **self._history_record(),
         )
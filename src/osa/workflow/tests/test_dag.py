@@ -0,0 +1,125 @@
+import os
+import sys
+
+import pytest
+
+
+def touch(file, mtime):
+    file.write_text("")
+    os.utime(file, (mtime, mtime))
+
+
+def test_dag_order_and_up_to_date(tmp_path):
+    from osa.workflow.dag import Step, WorkflowDAG
+
+    dl2_file = tmp_path / "dl2.h5"
+    dl3_file = tmp_path / "dl3.fits.gz"
+    index_file = tmp_path / "obs-index.fits.gz"
+    touch(dl2_file, 1000)
+    touch(dl3_file, 2000)
+    touch(index_file, 3000)
+
+    workflow = WorkflowDAG(
+        [
+            Step("index", ["true"], depends_on=["dl3"], inputs=[dl3_file], outputs=[index_file]),
+            Step("dl3", ["true"], inputs=[tmp_path / "dl2*.h5"], outputs=[dl3_file]),
+        ]
+    )
+    assert [step.name for step in workflow.order()] == ["dl3", "index"]
+    assert workflow.outdated_steps() == []
+
+    # A newer input makes the step and the ones depending on it outdated
+    touch(dl2_file, 2500)
+    assert [step.name for step in workflow.outdated_steps()] == ["dl3", "index"]
+
+    workflow.add(Step("cycle", ["true"], depends_on=["cycle"]))
+    with pytest.raises(ValueError):
+        workflow.order()
+
+
+def test_dag_run_local(tmp_path):
+    from osa.workflow.dag import Step, WorkflowDAG
+
+    output = tmp_path / "output.txt"
+    write = [sys.executable, "-c", f"open('{output}', 'a').write('done')"]
+    workflow = WorkflowDAG(
+        [
+            Step("first", write, outputs=[output]),
+            Step("fail", [sys.executable, "-c", "import sys; sys.exit(2)"]),
+            Step("after_first", ["true"], depends_on=["first"]),
+            Step("after_fail", ["true"], depends_on=["fail"]),
+        ]
+    )
+    return_codes = workflow.run_local(max_workers=2)
+
+    assert return_codes == {"first": 0, "fail": 2, "after_first": 0, "after_fail": None}
+    # The step with up-to-date outputs is not run again
+    assert "first" not in workflow.run_local()
+    assert output.read_text() == "done"
+
+
+def test_dag_submit(tmp_path):
+    from osa.workflow.dag import Step, WorkflowDAG
+
+    # Fake sbatch storing its arguments and returning the program as job ID
+    submitted = tmp_path / "submitted"
+    fake_sbatch = tmp_path / "sbatch"
+    fake_sbatch.write_text(f'#!/bin/bash\necho "$*" >> {submitted}\necho "${{@: -1}};cluster"\n')
+    fake_sbatch.chmod(0o755)
+
+    script = tmp_path / "log" / "job_b.sh"
+    workflow = WorkflowDAG(
+        [
+            Step("a", ["job_a"], sbatch_options=["-o", "a.log"], after_jobs=["100"]),
+            Step("b", ["job_b"], sbatch_options=["-o", "b.log"], scripts={script: "echo b\n"}),
+            Step("c", ["job_c"], depends_on=["a", "b"], sbatch_options=["-o", "c.log"]),
+        ]
+    )
+    # The scripts of the steps are only written when they are submitted
+    assert not script.parent.exists()
+    job_ids = workflow.submit(batch_command=str(fake_sbatch))
+    assert script.read_text() == "echo b\n"
+
+    assert job_ids == {"a": "job_a", "b": "job_b", "c": "job_c"}
+    assert submitted.read_text().splitlines() == [
+        "--parsable -o a.log --dependency=afterok:100 job_a",
+        "--parsable -o b.log job_b",
+        "--parsable -o c.log --dependency=afterok:job_a,job_b job_c",
+    ]
+
+
+def test_dag_submit_after_jobs_with_outputs(tmp_path):
+    from osa.workflow.dag import Step, WorkflowDAG
+
+    submitted = tmp_path / "submitted"
+    fake_sbatch = tmp_path / "sbatch"
+    fake_sbatch.write_text(f'#!/bin/bash\necho "$*" >> {submitted}\necho "${{@: -1}};cluster"\n')
+    fake_sbatch.chmod(0o755)
+
+    # Outputs up to date, but the inputs may still be rewritten by job 999
+    datacheck_file = tmp_path / "datacheck.h5"
+    longterm_file = tmp_path / "longterm.h5"
+    touch(datacheck_file, 1000)
+    touch(longterm_file, 2000)
+
+    workflow = WorkflowDAG(
+        [
+            Step(
+                "longterm",
+                ["lt"],
+                inputs=[datacheck_file],
+                outputs=[longterm_file],
+                after_jobs=["999"],
+            ),
+            Step("cherenkov_transparency", ["ch"], depends_on=["longterm"]),
+        ]
+    )
+    assert [step.name for step in workflow.outdated_steps()] == [
+        "longterm",
+        "cherenkov_transparency",
+    ]
+    workflow.submit(batch_command=str(fake_sbatch))
+    assert submitted.read_text().splitlines() == [
+        "--parsable --dependency=afterok:999 lt",
+        "--parsable --dependency=afterok:lt ch",
+    ]
@@ -6,4 +6,4 @@ def test_dl3_stage():
         ["dl3_stage", "-d", "2020-01-17", "-s", "LST1"], text=True, stdout=sp.PIPE, stderr=sp.PIPE
     )
     assert output.returncode == 0
-    assert "Creating observation index for each source." in output.stderr.splitlines()[-1]
+    assert "Producing the DL3 files and observation indexes" in output.stderr.splitlines()[-1]
@@ -1,3 +1,5 @@
+import sys
+
 import pytest
 import tenacity
 
@@ -29,10 +31,12 @@ def test_analysis_stage(running_analysis_dir):
     with pytest.raises(tenacity.RetryError):
         stage.execute()
     assert stage.rc == 2
+    # Wrong arguments, not retried
+    assert stage.failure == "permanent"
     # Check that the stage is marked as failed in the history file
     with open(stage.history_file, "r") as f:
         lines = f.readlines()
-        assert len(lines) >= 3
+        assert len(lines) >= 1
     # Check that the last element in the last line is the rc 2
     assert lines[-1].split(" ")[0] == stage.run
     assert lines[-1].split(" ")[1] == cmd[0]
@@ -50,10 +54,12 @@ def test_analysis_stage(running_analysis_dir):
     with pytest.raises(tenacity.RetryError):
         stage.execute()
     assert stage.rc == 1
+    # Missing input file, not retried
+    assert stage.failure == "permanent"
     # Check that the stage is marked as failed in the history file
     with open(stage.history_file, "r") as f:
         lines = f.readlines()
-        assert len(lines) >= 6
+        assert len(lines) >= 2
     # Check that the last element in the last line is the step rc
     assert lines[-1].split(" ")[0] == stage.run
     assert lines[-1].split(" ")[1] == cmd[0]
@@ -67,20 +73,23 @@ def test_analysis_stage(running_analysis_dir):
     with pytest.raises(tenacity.RetryError):
         stage.execute()
     assert stage.rc == 255
+    assert stage.failure == "permanent"
     # Check that the stage is marked as failed in the history file
     with open(stage.history_file, "r") as f:
         lines = f.readlines()
-        assert len(lines) >= 9
+        assert len(lines) >= 3
     # Check that the last element in the last line is the step rc
     assert lines[-1].split(" ")[0] == stage.run
     assert lines[-1].split(" ")[1] == cmd[0]
     assert lines[-1].split(" ")[-1] == "255\n"
 
 
-def test_calibration_steps(running_analysis_dir):
-    from osa.workflow.stages import DRS4PedestalStage, ChargeCalibrationStage
+def test_calibration_steps(running_analysis_dir, monkeypatch):
+    from osa.workflow.stages import AnalysisStage, DRS4PedestalStage, ChargeCalibrationStage
     from osa.scripts.calibration_pipeline import drs4_pedestal_command, calibration_file_command
 
+    # Do not wait before retrying after a transient failure
+    monkeypatch.setattr(AnalysisStage.execute.retry, "sleep", lambda seconds: None)
     options.simulate = False
     options.directory = running_analysis_dir
 
@@ -96,10 +105,13 @@ def test_calibration_steps(running_analysis_dir):
         step2.execute()
 
     assert step1.history_file == step2.history_file
-    # Check that the error is in the history file
+    # The missing R0 file of the DRS4 pedestal run is a permanent failure, whereas
+    # the charge calibration (failing to connect to the filter wheel DB) is retried
+    assert step1.failure == "permanent"
+    assert step2.failure != "permanent"
     with open(step1.history_file, "r") as f:
         lines = f.readlines()
-        assert len(lines) == 6
+        assert len(lines) == 4
     # Check that the last element in the last line is the rc
     assert lines[0].split(" ")[0] == step1.run
     assert lines[-1].split(" ")[0] == step2.run
@@ -107,3 +119,165 @@ def test_calibration_steps(running_analysis_dir):
     assert lines[-1].split(" ")[1] == cmd2[0]
     assert lines[0].split(" ")[-1] == "1\n"
     assert lines[-1].split(" ")[-1] == "1\n"
+
+
+def test_stage_output_and_metrics(running_analysis_dir):
+    from osa.history import get_history_entries, history_db_file
+    from osa.workflow.stages import AnalysisStage
+
+    options.simulate = False
+    options.directory = running_analysis_dir
+
+    cmd = [
+        sys.executable,
+        "-c",
+        "import sys; [print(f'line {i}') for i in range(1000)]; sys.exit(3)",
+    ]
+    stage = AnalysisStage(run="01000.0002", command_args=cmd)
+    with pytest.raises(tenacity.RetryError) as error:
+        stage.execute()
+
+    assert stage.rc == 3
+    # The whole output of every attempt is kept in the log file of the stage
+    assert stage.log_file.parent == running_analysis_dir / "log"
+    output = stage.log_file.read_text().splitlines()
+    assert len(output) == 3 * 1001
+    assert output[-1] == "line 999"
+
+    # Only the last lines are reported in the error
+    message = str(error.value.last_attempt.exception())
+    assert "line 999" in message
+    assert "line 899\n" not in message
+
+    assert stage.metrics["max_rss"] > 0
+    assert stage.metrics["write_bytes"] >= sum(len(f"line {i}\n") for i in range(1000))
+
+    # One line per attempt in the stage metrics table of the night
+    metrics = [line.split(",") for line in stage.metrics_file.read_text().splitlines()]
+    assert [line[1:4] for line in metrics if line[1] == stage.run] == 3 * [
+        [stage.run, sys.executable, "3"]
+    ]
+
+    entries = get_history_entries(history_db_file())
+    assert entries[1000]["sequence_LST1_01000.0002"] == 3 * [(sys.executable, options.prod_id, 3)]
+
+
+@pytest.mark.parametrize(
+    "return_code, output, failure",
+    [
+        (0, [], None),
+        (1, ["OSError: [Errno 5] Input/output error\n"], "transient"),
+        (-7, [], "transient"),
+        (2, ["usage: ...\n", "prog: error: unrecognized arguments: --foo\n"], "permanent"),
+        (1, ["FileNotFoundError: dl1.h5\n", "Stale file handle\n"], "transient"),
+        (1, ["Resource temporarily unavailable\n", "FileNotFoundError: dl1.h5\n"], "permanent"),
+        (3, ["Traceback\n", "ValueError: bad value\n"], "unknown"),
+        (127, ["lstchain_data_r0_to_dl1: command not found\n"], "permanent"),
+        (1, ["OSError: bad value\n", "WARNING: pointing not found, using default\n"], "unknown"),
+    ],
+)
+def test_classify_failure(return_code, output, failure):
+    from osa.workflow.stages import classify_failure
+
+    assert classify_failure(return_code, output) == failure
+
+
+def test_transient_failure_retry(running_analysis_dir, monkeypatch):
+    import osa.workflow.stages
+    from osa.history import history_db_file, open_history_db
+    from osa.workflow.stages import AnalysisStage
+
+    options.simulate = False
+    options.directory = running_analysis_dir
+
+    sleeps = []
+    monkeypatch.setattr(osa.workflow.stages, "retry_backoff", lambda retry_state: 5)
+    monkeypatch.setattr(AnalysisStage.execute.retry, "sleep", sleeps.append)
+
+    cmd = [sys.executable, "-c", "import sys; print('Input/output error'); sys.exit(1)"]
+    stage = AnalysisStage(run="01000.0003", command_args=cmd)
+    with pytest.raises(tenacity.RetryError):
+        stage.execute()
+
+    # Backoff before each of the retries
+    assert sleeps == [5, 5]
+
+    # The class of the failure is recorded in the history of each attempt
+    with open_history_db(history_db_file()) as connection:
+        failures = connection.execute(
+            "SELECT failure FROM history WHERE sequence = ?", (stage.history_file.stem,)
+        ).fetchall()
+    assert failures == 3 * [("transient",)]
+
+
+def test_staged_analysis_stage(running_analysis_dir, tmp_path):
+    from osa.configs.config import cfg
+    from osa.workflow.stages import AnalysisStage
+
+    options.simulate = False
+    options.directory = running_analysis_dir
+
+    input_file = tmp_path / "input.h5"
+    input_file.write_text("dl1")
+    output_file = running_analysis_dir / "staged_LST-1.Run01000.0004.h5"
+    scratch = tmp_path / "scratch"
+
+    # Copy the input file into the output file, checking it runs in the scratch directory
+    script = (
+        "import sys; args = dict(arg.split('=') for arg in sys.argv[1:]); "
+        f"assert args['--input-file'].startswith('{scratch}'); "
+        f"assert args['--output-file'].startswith('{scratch}'); "
+        "open(args['--output-file'], 'w').write(open(args['--input-file']).read())"
+    )
+    cmd = [sys.executable, "-c", script, f"--input-file={input_file}", f"--output-file={output_file}"]
+    cfg.set("lstchain", "staging_dir", str(scratch))
+    try:
+        stage = AnalysisStage(run="01000.0004", command_args=cmd, staged=True)
+        stage.execute()
+    finally:
+        cfg.set("lstchain", "staging_dir", "")
+
+    assert stage.rc == 0
+    assert output_file.read_text() == "dl1"
+    assert stage.metrics["output_size"] == 3
+    # The scratch directory of the stage is removed
+    assert list(scratch.iterdir()) == []
+
+
+def test_stage_input_streams(tmp_path):
+    from osa.workflow.stages import stage_input
+
+    r0_dir = tmp_path / "R0"
+    r0_dir.mkdir()
+    for stream in range(1, 5):
+        for subrun in (11, 12):
+            (r0_dir / f"LST-1.{stream}.Run01807.{subrun:04d}.fits.fz").write_text("r0")
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    staged_file = stage_input(r0_dir / "LST-1.1.Run01807.0011.fits.fz", scratch)
+
+    # The event source reads all the streams of the subrun
+    assert staged_file == scratch / "LST-1.1.Run01807.0011.fits.fz"
+    assert sorted(file.name for file in scratch.iterdir()) == [
+        f"LST-1.{stream}.Run01807.0011.fits.fz" for stream in range(1, 5)
+    ]
+
+
+def test_publish_outputs_subdirectories(tmp_path):
+    from osa.workflow.stages import publish_outputs
+
+    staged_output_dir = tmp_path / "scratch" / "output"
+    (staged_output_dir / "interleaved").mkdir(parents=True)
+    (staged_output_dir / "dl1_LST-1.Run01807.0011.h5").write_text("dl1")
+    (staged_output_dir / "interleaved" / "interleaved_LST-1.Run01807.0011.h5").write_text("ped")
+
+    output_dir = tmp_path / "running_analysis"
+    published = publish_outputs(staged_output_dir, output_dir)
+
+    assert sorted(published) == [
+        output_dir / "dl1_LST-1.Run01807.0011.h5",
+        output_dir / "interleaved" / "interleaved_LST-1.Run01807.0011.h5",
+    ]
+    assert (output_dir / "interleaved" / "interleaved_LST-1.Run01807.0011.h5").read_text() == "ped"
+    assert not list(output_dir.rglob(".*.staging"))